@@ -15,12 +15,15 @@
     You should have received a copy of the GNU Lesser General Public License
     along with ethereum-consensus-abm.  If not, see <http://www.gnu.org/licenses/>.
 """
-import random as rnd
-import logging
-import networkx as nx
 import numpy as np
 import math
 import pickle as pkl
+import heapq
+from collections import OrderedDict
+
+# kinds of the events of an EventTrace
+(TRACE_BLOCK_GOSSIP, TRACE_ATTESTATION_GOSSIP, TRACE_SLOT, TRACE_EPOCH,
+ TRACE_PROPOSAL, TRACE_ATTESTATION, TRACE_FINALIZATION) = range(7)
 
 
 class Process:
@@ -46,41 +49,189 @@ class Process:
     def lam(self):
         return self.__lam
 
+    def refresh(self):
+        """Recompute the rate after a change of the model."""
+        pass
+
     def event(self):
         pass
 
 
+class AliasTable:
+    """Walker alias table of a discrete distribution: a draw costs one
+    uniform number and two lookups whatever the number of outcomes,
+    building the table is linear.
+    INPUT:
+    - weights,  array of non-negative weights, not all zero
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        if n == 0 or not np.isfinite(weights).all() or (weights < 0).any():
+            raise ValueError("weights must be finite and non-negative")
+        if not weights.sum() > 0:
+            raise ValueError("weights must not be all zero")
+        scaled = (weights*(n/weights.sum())).tolist()
+        prob = [1.]*n
+        alias = list(range(n))
+        small = [i for i, w in enumerate(scaled) if w < 1]
+        large = [i for i, w in enumerate(scaled) if w >= 1]
+        # Vose: each small column is topped up by a large one
+        while small and large:
+            s = small.pop()
+            l = large[-1]
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            if scaled[l] < 1:
+                small.append(large.pop())
+        # leftovers are full columns up to rounding errors
+        self.n = n
+        self.prob = prob
+        self.alias = alias
+
+    def sample(self, rng, size=None):
+        """Draw an outcome, or an array of size outcomes."""
+        if size is None:
+            x = rng.random()*self.n
+            i = int(x)
+            return i if x - i < self.prob[i] else self.alias[i]
+        x = rng.random(size)*self.n
+        i = x.astype(np.int64)
+        return np.where(x - i < np.take(self.prob, i), i, np.take(self.alias, i))
+
+
 class BlockGossipProcess(Process):
     """The process to manage block gossiping
+    Each directed edge gossips with latency tau times its entry of
+    network.latencies (tau if None), edges are drawn from an alias table
+    of their rates, or by rejection on a DynamicNetwork.
     INPUT:
-    - nodes,    list of Nodes obejct
     - tau,      float, process latency
+    - network,  Network object, edges are read from its CSR arrays
+    - nodes,    list of Nodes obejct
     """
 
-    def __init__(self, tau, edges, rng=np.random.default_rng()):
-        self.edges = edges
-        self.num_edges = len(edges)
-
-        super().__init__((tau/self.num_edges))
+    def __init__(self, tau, network, nodes, rng=np.random.default_rng()):
+        self.network = network
+        self.nodes = nodes
+        self.num_edges = network.num_edges
+        self.edge_tau = tau
         self.rng = rng
+        self.dynamic = isinstance(network, DynamicNetwork)
+        if self.dynamic:
+            self.alias_table = None
+            self.refresh()
+        else:
+            self.set_latencies(network.latencies)
+
+    def refresh(self):
+        """Recompute the rate after the edges of the DynamicNetwork
+        changed. Gillespie.update_lambdas must be called afterwards.
+        """
+        self.num_edges = self.network.num_edges
+        rate_sum = self.network.rate_sum
+        self.tau = self.edge_tau/rate_sum if rate_sum > 0 else np.inf
+
+    def set_latencies(self, latencies):
+        """Set the latency multipliers of the edges (uniform if None) and
+        rebuild the alias table. Gillespie.update_lambdas must be called
+        afterwards if the process is already scheduled.
+        """
+        if latencies is None:
+            self.alias_table = None
+            self.tau = self.edge_tau/self.num_edges
+        else:
+            rates = 1/np.asarray(latencies, dtype=np.float64)
+            self.alias_table = AliasTable(rates)
+            self.tau = self.edge_tau/rates.sum()
+
+    def draw_edge(self):
+        """Draw a directed edge proportionally to its rate."""
+        if self.dynamic:
+            return self.network.sample_edge(self.rng)
+        elif self.alias_table is None:
+            return self.rng.integers(self.num_edges)
+        return self.alias_table.sample(self.rng)
+
+    def sample_edge(self):
+        """Draw a directed edge proportionally to its rate, returns the
+        gossiping and listening peers.
+        """
+        edge = self.draw_edge()
+        network = self.network
+        return self.nodes[network.sources[edge]], self.nodes[network.indices[edge]]
+
+    def deliver(self):
+        """Draw an edge, returns its peers, or None if the message is
+        lost to a fault of the edge (see Network.delivers).
+        """
+        edge = self.draw_edge()
+        network = self.network
+        if network.faulty and not network.delivers(edge, self.rng):
+            return None
+        return self.nodes[network.sources[edge]], self.nodes[network.indices[edge]]
 
     def event(self):
-        gossiping_node, listening_node = self.rng.choice(self.edges)
-        gossiping_node.gossip(listening_node)
+        edge = self.deliver()
+        if edge is not None:
+            gossiping_node, listening_node = edge
+            gossiping_node.gossip(listening_node)
         return
 
 
 class AttestationGossipProcess(BlockGossipProcess):
-    def __init__(self, tau, edges, rng=np.random.default_rng()):
-        super().__init__(tau, edges, rng)
+    def __init__(self, tau, network, nodes, rng=np.random.default_rng()):
+        super().__init__(tau, network, nodes, rng)
 
     def event(self):
-        gossiping_node, listening_node = self.rng.choice(self.edges)
-        listening_node.receive_attestations(gossiping_node.attestations.copy())
+        edge = self.deliver()
+        if edge is not None:
+            gossiping_node, listening_node = edge
+            gossiping_node.gossip_attestations(listening_node)
         return
 
 
+class ChurnProcess(Process):
+    """Peers of a DynamicNetwork leave and join: an online peer leaves
+    with rate 1/tau_online, an offline peer joins with rate 1/tau_offline.
+    INPUT:
+    - tau_online,   float, mean time a peer stays online
+    - tau_offline,  float, mean time a peer stays offline
+    - model,        Model object, its network is a DynamicNetwork
+    """
+
+    def __init__(self, tau_online, tau_offline, model, rng=np.random.default_rng()):
+        self.tau_online = tau_online
+        self.tau_offline = tau_offline
+        self.model = model
+        self.rng = rng
+        self.refresh()
+
+    def refresh(self):
+        """Recompute the rate after peers left or joined."""
+        network = self.model.network
+        self.leave_rate = network.n_online/self.tau_online
+        self.join_rate = (len(network) - network.n_online)/self.tau_offline
+        rate = self.leave_rate + self.join_rate
+        self.tau = 1/rate if rate > 0 else np.inf
+
+    def event(self):
+        network = self.model.network
+        if self.rng.random()*(self.leave_rate + self.join_rate) < self.leave_rate:
+            self.model.leave(network.online_order[
+                self.rng.integers(network.n_online)])
+        else:
+            self.model.join(network.online_order[
+                network.n_online + self.rng.integers(len(network) - network.n_online)])
+
+
 class FixedTimeEvent():
+    # events of the kind trace_kind are written to trace, if set
+    trace = None
+    trace_kind = None
+
     def __init__(self, interval, time=0, offset=0, rng=None):
         if not interval >= 0:
             raise ValueError("Interval must be positive")
@@ -101,6 +252,9 @@ class FixedTimeEvent():
         """
         while next_time >= self.next_event:
             self.counter += 1
+            if self.trace is not None and self.trace_kind is not None:
+                self.trace.record(self.next_event, self.trace_kind,
+                                  self.counter)
             self.event()
             self.next_event += self.interval
 
@@ -133,26 +287,93 @@ class LateProposal(FixedTimeEvent):
         self.proposer.propose_block()
 
 
+class ChurnSchedule(FixedTimeEvent):
+    """Changes of the topology at given times. Entries are tuples
+    (time, action, *args), action being a method of Model among
+    "leave" (peer), "join" (peer), "add_edge" (u, v[, latency]) and
+    "remove_edge" (u, v).
+    """
+    ACTIONS = ("leave", "join", "add_edge", "remove_edge")
+
+    def __init__(self, schedule, model, rng=None):
+        schedule = sorted(schedule, key=lambda entry: entry[0])
+        for entry in schedule:
+            if entry[1] not in self.ACTIONS:
+                raise ValueError("Unknown churn action {}".format(entry[1]))
+        super().__init__(0, rng=rng)
+        self.schedule = schedule
+        self.model = model
+        self.position = 0
+        self.next_event = schedule[0][0] if schedule else np.inf
+
+    def target(self):
+        """Object whose methods are the actions."""
+        return self.model
+
+    def event(self):
+        schedule = self.schedule
+        while (self.position < len(schedule)
+               and schedule[self.position][0] <= self.next_event):
+            _, action, *args = schedule[self.position]
+            getattr(self.target(), action)(*args)
+            self.position += 1
+        self.next_event = (schedule[self.position][0]
+                           if self.position < len(schedule) else np.inf)
+
+
+class FaultSchedule(ChurnSchedule):
+    """Faults of the network at given times. Entries are tuples
+    (time, action, *args), action being a method of Network among
+    "partition" (groups), "heal" (), "disable" (links), "enable" (links),
+    "drop" (links, probability) and "delay" (links, factor).
+    """
+    ACTIONS = ("partition", "heal", "disable", "enable", "drop", "delay")
+
+    def target(self):
+        return self.model.network
+
+
 class SlotBoundary(FixedTimeEvent):
     """Event to start new slot.
     - Assign slot validators.
     - Assign epoch of the slot.
     - Enable attesters.
-    - Select block proposer and release slot block.
+    - Expire cached attestations to blocks never received.
+    - Select block proposer and release slot block, the slot is missed
+      if the proposer is offline.
     """
-    def __init__(self, interval, validators, epoch_boundary, late_proposal, rng=None):
+    trace_kind = TRACE_SLOT
+
+    def __init__(self, interval, nodes, validator_node, is_attesting,
+                 epoch_boundary, late_proposal, stake=None,
+                 expire_cached=None, rng=None):
         super().__init__(interval, rng=rng)
-        self.validators = validators
+        self.nodes = nodes
+        self.expire_cached = expire_cached
+        self.validator_node = validator_node
+        self.is_attesting = is_attesting
+        if stake is None:
+            stake = np.ones(len(validator_node))
+        self.proposer_weights = stake/stake.sum()
         self.epoch_boundary = epoch_boundary
         self.late_proposal = late_proposal
 
     def event(self):
 
-        for v in self.epoch_boundary.committees[
-                self.counter % self.epoch_boundary.slots_per_epoch]:
-            v.is_attesting = True
+        self.is_attesting[self.epoch_boundary.committee(
+            self.counter % self.epoch_boundary.slots_per_epoch)] = True
 
-        proposer = self.rng.choice(self.validators)
+        # give up on the attestations waiting for blocks too old
+        if self.expire_cached is not None:
+            self.expire_cached()
+
+        # proposers are sampled proportionally to their stake,
+        # the block is released by the peer hosting the validator
+        validator = self.rng.choice(len(self.validator_node),
+                                    p=self.proposer_weights)
+        proposer = self.nodes[self.validator_node[validator]]
+        if not proposer.online:
+            return
         if proposer.delayer:
             self.late_proposal.set_proposer(proposer)
             self.late_proposal.set_next_time(self.next_event)
@@ -166,43 +387,188 @@ class SlotBoundary(FixedTimeEvent):
 
 
 class EpochBoundary(FixedTimeEvent):
-    def __init__(self, slot_interval, validators, slots_per_epoch, rng=None):
+    """Event to start new epoch.
+    - Shuffle the validators into one committee per slot.
+    - Disable attesters.
+    Committees are stored as a permutation of the validator ids, committee c
+    being permutation[offsets[c]:offsets[c+1]].
+    """
+    trace_kind = TRACE_EPOCH
+
+    def __init__(self, slot_interval, validators, slots_per_epoch,
+                 is_attesting, rng=None):
         super().__init__(slot_interval*slots_per_epoch, rng=rng)
-        self.validators = validators
-        self.committees = []
+        self.is_attesting = is_attesting
 
         self.slots_per_epoch = slots_per_epoch
-        self.v_n = len(self.validators)
+        self.v_n = len(validators)
         self.committee_size = int(self.v_n/self.slots_per_epoch)
         self.leftover = self.v_n - (self.committee_size * self.slots_per_epoch)
 
+        self.permutation = np.arange(self.v_n)
+        self.offsets = np.zeros(self.slots_per_epoch + 1, dtype=np.int64)
+
+    def committee(self, slot):
+        """Returns the ids of the validators attesting in the slot-th
+        slot of the epoch.
+        """
+        return self.permutation[self.offsets[slot]:self.offsets[slot+1]]
+
     def event(self):
-        # print(self.validators)
-        self.rng.shuffle(self.validators)
-        self.committees = [[self.validators[v+c*self.committee_size]
-                            for v in range(self.committee_size)]
-                           for c in range(self.slots_per_epoch)]
-        j = list(range(self.slots_per_epoch))
-        self.rng.shuffle(j)
-        if self.leftover != 0:
-            for i in range(1, self.leftover+1):
-                self.committees[j[i-1]].append(self.validators[-i])
-
-        for v in self.validators:
-            v.is_attesting = False
+        self.permutation = self.rng.permutation(self.v_n)
+        # the leftover validators join randomly chosen committees
+        sizes = np.full(self.slots_per_epoch, self.committee_size)
+        sizes[self.rng.permutation(self.slots_per_epoch)[:self.leftover]] += 1
+        self.offsets[1:] = np.cumsum(sizes)
+
+        self.is_attesting[:] = False
 
         #print('New Epoch: Committees formed')
- 
+
 
 class AttestationBoundary(FixedTimeEvent):
-    def __init__(self, interval, offset, validators, rng=None):
+    def __init__(self, interval, offset, nodes, validator_node,
+                 is_attesting, rng=None):
         super().__init__(interval, offset, rng=rng)
-        self.validators = validators
+        self.nodes = nodes
+        self.validator_node = validator_node
+        self.is_attesting = is_attesting
 
     def event(self):
-        for v in self.validators:
-            if v.is_attesting is True:
-                v.issue_attestation()
+        # peers hosting at least one attesting validator,
+        # fork choice is evaluated once per distinct view (see HeadCache)
+        for i in np.unique(self.validator_node[self.is_attesting]):
+            if self.nodes[i].online:
+                self.nodes[i].issue_attestation()
+
+
+class AttestationLeap(FixedTimeEvent):
+    """Approximate attestation gossip by tau-leaping. At each leap, the
+    number of gossip events on each edge is drawn from a Poisson
+    distribution and the fired edges merge the tables the gossiping
+    peers had at the start of the leap, in a random order, all at the
+    time of the leap. An attestation thus crosses at most one hop per
+    leap, as it would in the exact engine for a small step.
+    The step is chosen after each leap, in the spirit of the Cao-Gillespie
+    selection: the tables the leap reads must change little over it.
+    A peer table changes at the rate at which the peer hears gossip from
+    peers with a different table, the step is tolerance over the largest
+    such rate, i.e. the expected number of changes of any gossiping table
+    within a leap is at most tolerance. The step is at most
+    max_step = tolerance*tau, the step of a peer with one neighbour.
+    Leaps are skipped while all the peers have the same table, see skip_to.
+    INPUT:
+    - tau,          float, attestation gossip latency
+    - tolerance,    float, see above
+    - model,        Model object
+    """
+    def __init__(self, tau, tolerance, model, rng=None):
+        if not tolerance > 0:
+            raise ValueError("tolerance must be positive")
+        super().__init__(tolerance*tau, offset=tolerance*tau, rng=rng)
+        self.tau = tau
+        self.tolerance = tolerance
+        self.max_step = tolerance*tau
+        self.model = model
+
+    def skip_to(self, time):
+        """Drop the leaps before time, the tables agree until then."""
+        if self.next_event < time:
+            self.next_event = time
+
+    def edge_rates(self):
+        """Rate of the gossip delivered by each edge."""
+        network = self.model.network
+        n_edges = network.num_edges
+        rate = np.full(n_edges, 1/self.tau)
+        if network.latencies is not None:
+            rate = rate/network.latencies[:n_edges]
+        if network.faulty:
+            rate = rate*network.delivery_probability()
+        return rate
+
+    def step(self, rate):
+        """Step of the next leap, tolerance over the largest rate at which
+        a peer hears gossip from peers with a different table."""
+        model = self.model
+        network = model.network
+        n_edges = network.num_edges
+        sources = network.sources[:n_edges]
+        indices = network.indices[:n_edges]
+        active = model.table_row[sources] != model.table_row[indices]
+        if not active.any():
+            return self.max_step
+        heard = np.bincount(indices[active], weights=rate[active],
+                            minlength=model.N).max()
+        if heard <= 0:
+            return self.max_step
+        return min(self.tolerance/heard, self.max_step)
+
+    def event(self):
+        model = self.model
+        # gossip changes nothing while the peers have the same table
+        if model.attestations_agree():
+            self.interval = self.max_step
+            return
+        network = model.network
+        n_edges = network.num_edges
+        rate = self.edge_rates()
+        # expected gossip events of each edge in one leap
+        counts = self.rng.poisson(rate*self.interval, size=n_edges)
+        fired = np.flatnonzero(counts)
+        self.rng.shuffle(fired)
+        gossiping = network.sources[fired]
+        # tables of the gossiping peers at the start of the leap, one
+        # copy per distinct table
+        rows, table = np.unique(model.table_row[gossiping], return_inverse=True)
+        blocks = model.table_blocks[rows]
+        slots = model.table_slots[rows]
+        keys = model.row_hash[rows]
+        for g, l, i in zip(gossiping.tolist(), network.indices[fired].tolist(),
+                           table.tolist()):
+            model.nodes[g].gossip_attestations(model.nodes[l],
+                                               (blocks[i], slots[i], keys[i]))
+        self.interval = self.step(rate)
+
+
+class Finalization(FixedTimeEvent):
+    """Casper FFG-like finality at epoch boundaries, from a god view of the
+    latest attestations. Rules:
+    - "ffg", the deepest block of the canonical chain backed by 2/3 of the
+      stake is justified. A justified checkpoint still backed at the next
+      epoch boundary is finalized.
+    - "depth", the canonical block depth blocks below the head is finalized.
+    """
+    def __init__(self, interval, model, rule="ffg", depth=32, rng=None):
+        super().__init__(interval, rng=rng)
+        if rule not in ("ffg", "depth"):
+            raise ValueError("Unknown finality rule {}".format(rule))
+        self.model = model
+        self.rule = rule
+        self.depth = depth
+        self.justified = model.finalized
+
+    def event(self):
+        model = self.model
+        root = model.finalized
+        weight = model.calculate_weights(model.god_view_attestation_block())
+        canonical = [block for block in model.blockchain[root.id:]
+                     if not model.settled[block.id]]
+        head = find_lmd_ghost_head(root, set(canonical),
+                                   lambda block: weight[block.id - root.id])
+        if self.rule == "depth":
+            if head.height - self.depth <= root.height:
+                return
+            model.finalize(get_ancestor(head, head.height - self.depth))
+            return
+        # deepest ancestor of the head backed by a supermajority
+        threshold = 2/3*model.stake.sum()
+        justified = head
+        while weight[justified.id - root.id] < threshold and justified is not root:
+            justified = justified.parent
+        if is_ancestor(self.justified, justified):
+            model.finalize(self.justified)
+        self.justified = justified
 
 
 class Block:
@@ -216,10 +582,14 @@ class Block:
         Parent of the block
     transactions : integer
         Number of transactions in the block
+    id : integer
+        Position of the block in the model blockchain list
     '''
 
-    def __init__(self, emitter="genesis", parent=None, slot_no=0, attestations={}):
+    def __init__(self, emitter="genesis", parent=None, slot_no=0, attestations={},
+                 id=0):
 
+        self.id = id
         self.slot_no = slot_no
 
         self.children = set()
@@ -229,20 +599,28 @@ class Block:
             self.parent = None
             self.height = 0
             self.emitter = "genesis"
-            self.predecessors = {self}
 
         else:
             self.parent = parent
             self.height = self.parent.height + 1
             self.emitter = emitter
             parent.children.add(self)
-            self.predecessors = parent.predecessors.copy()
-            self.predecessors.add(self)
             self.attestations = attestations
 
     def __repr__(self):
         return '<Block {} (h={})>'.format(self.slot_no, self.height)
 
+    def __iter__(self):
+        """Iterate lazily over the block and its ancestors, newest first."""
+        return iter_chain(self)
+
+    @property
+    def predecessors(self):
+        """Set of the block and all its ancestors, built in O(height)
+        on each access. Prefer iter_chain, which stops early.
+        """
+        return set(iter_chain(self))
+
     def __next__(self):
         if self.parent:
             return self.parent
@@ -250,146 +628,1062 @@ class Block:
             raise StopIteration
 
 
+class BlockTree:
+    """Array export of a blocktree, no networkx needed.
+    Block i of the tree is blocks[i], parents come before children.
+    INPUT:
+    - blocks,   list of Block objects, see blockchain_to_tree
+    - parent,   array, parent[i] index of the parent of blocks[i],
+                -1 if it is not in the tree
+    """
+
+    def __init__(self, blocks, parent):
+        self.blocks = blocks
+        self.parent = parent
+        self.height = np.fromiter((b.height for b in blocks), dtype=np.int64,
+                                  count=len(blocks))
+        self.slot = np.fromiter((b.slot_no for b in blocks), dtype=np.int64,
+                                count=len(blocks))
+        self._digraph = None
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def edges(self):
+        """Returns an array of shape (E, 2), rows (child, parent)."""
+        children = np.flatnonzero(self.parent >= 0)
+        return np.column_stack((children, self.parent[children]))
+
+    def adjacency(self):
+        """Returns the child -> parent adjacency as a scipy.sparse CSR
+        matrix. Needs scipy.
+        """
+        import scipy.sparse
+        edges = self.edges()
+        return scipy.sparse.csr_array(
+            (np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])),
+            shape=(len(self), len(self)))
+
+    def to_networkx(self):
+        """networkx.DiGraph of the blocks, edges go from child to parent.
+        Built on the first call only.
+        """
+        if self._digraph is None:
+            import networkx as nx
+            digraph = nx.DiGraph()
+            digraph.add_nodes_from(self.blocks)
+            digraph.add_edges_from((self.blocks[c], self.blocks[p])
+                                   for c, p in self.edges())
+            self._digraph = digraph
+        return self._digraph
+
+
 class Node:
-    '''Class for the validator.
+    '''Class for the peer, hosting a batch of validators sharing its view.
 
     INPUT:
     - blockchain,   list of Block objects,
+    - validators,   array of the ids of the validators hosted by the peer
     '''
 
-    def __init__(self, blockchain, rng, id, model):
+    def __init__(self, blockchain, rng, id, model, validators=None):
         self.id = id
         self.model = model
 
+        if validators is None:
+            validators = np.array([id])
+        self.validators = validators
+        self.reset(blockchain, rng)
+
+    def reset(self, blockchain, rng):
+        """Reset the state of the peer to a new blocktree, keeping its
+        neighbours and validators.
+        """
         self.rng = rng
 
         self.local_blockchain = {blockchain[0]}
         self.global_blockchain = blockchain
 
-        self.neighbors = set()  # set of neighbours peers on the p2p network
-
-        self.attestations = {}
+        n_validators = len(self.model.validators)
+        # attestations to blocks not received yet, indexed by the id of
+        # the missing block: cached_attestations[b] lists arrays of the
+        # validators waiting on b. cached_block and cached_slot hold the
+        # cached entry of each validator (cached_slot is -1 if none),
+        # entries overwritten since are skipped when b is released.
+        # cache_heap holds (slot, b) for the blocks waiting, oldest first,
+        # entries of blocks released since are skipped.
         self.cached_attestations = {}
-        self.is_attesting = True
+        self.cache_heap = []
+        self.cached_block = np.zeros(n_validators, dtype=np.int64)
+        self.cached_slot = np.full(n_validators, -1, dtype=np.int64)
+        self.n_cached = 0
         self.delayer = False
 
+    @property
+    def attestation_block(self):
+        """Latest messages table, id of the block attested by each
+        validator (row of the model tables, read only)."""
+        return self.model.table_blocks[self.model.table_row[self.id]]
+
+    @property
+    def attestation_slot(self):
+        """Latest messages table, slot of the attestation of each
+        validator (-1 if none)."""
+        return self.model.table_slots[self.model.table_row[self.id]]
+
+    @property
+    def neighbors(self):
+        """Neighbour peers on the p2p network."""
+        return [self.model.nodes[k]
+                for k in self.model.network.neighbors(self.id)]
+
+    @property
+    def online(self):
+        """False while the peer is off the network."""
+        return self.model.network.online[self.id]
+
+    @property
+    def is_attesting(self):
+        """True if any of the hosted validators is attesting."""
+        return self.model.is_attesting[self.validators].any()
+
     def propose_block(self):
         head_of_chain = self.use_lmd_ghost()
         #print('this is head', head_of_chain, ' by ', self)
         #print('Block predecessors', head_of_chain.predecessors)
         # compute attestation share of head_of_chain
+        self.release_block(head_of_chain)
 
-        new_block = Block(emitter=self, parent=head_of_chain,
+    def release_block(self, parent):
+        """Create a block of the current slot on top of parent."""
+        new_block = Block(emitter=self, parent=parent,
                           slot_no=self.model.slot_boundary.counter,
-                          attestations=self.attestations.copy())
+                          id=len(self.global_blockchain))
         #print('new_block pre', new_block.predecessors)
 
         self.local_blockchain.add(new_block)
-        self.global_blockchain.append(new_block)
+        self.model.add_block(new_block, self)
+        if self.model.trace is not None:
+            self.model.trace.record(self.model.time, TRACE_PROPOSAL, self.id,
+                                    parent.id, new_block.id)
         return
 
     def issue_attestation(self):
-        self.attestations[self] = (self.use_lmd_ghost(),
-                                   self.model.slot_boundary.counter)
-
-    def receive_attestations(self, attestations):
-        attestations_old = self.attestations.copy()
-        attestations_with_known_blocks = {}
-
-        for k, v in attestations.items():
-            # check if block is known
-            if v[0] not in self.local_blockchain:
-                if k in self.cached_attestations.keys():
-                    # check if slot is higher of the new attestation
-                    if self.cached_attestations[k][1]<v[1]:
-                        self.cached_attestations[k] = v
-                else:
-                    self.cached_attestations[k]=v
-            else:
-                attestations_with_known_blocks[k]=v
-
-        self.attestations.update(attestations_with_known_blocks)
-        
-        # check for whether all the attestations belong to a newer slot
-        for k, v in attestations_old.items():
-            if attestations_old[k][1] > self.attestations[k][1]:
-                self.attestations[k] = attestations_old[k]
-
-    def check_cached_attestations(self):
-        _cached_attestations = self.cached_attestations.copy()
-        for k,v in _cached_attestations.items():
-            if v[0] in self.local_blockchain:
-                # delete from cache
-                _ = self.cached_attestations.pop(k, 'None')
-                #check if other attest from validator
-                if k in self.attestations.keys():
-                    # check issuing slot
-                    if self.attestations[k][1]<v[1]:
-                        self.attestations[k]=v
-                else:
-                    self.attestations[k]=v
+        """All the attesting validators hosted by the peer attest
+        to the head of its local view.
+        """
+        validators = self.validators[self.model.is_attesting[self.validators]]
+        self.attest(validators, self.use_lmd_ghost().id,
+                    self.model.slot_boundary.counter)
+
+    def attest(self, validators, block_id, slot):
+        """Hosted validators attest to block_id in slot."""
+        if slot + 1 >= len(self.model.slot_keys):
+            # double the slot keys, see Model.entries_key
+            self.model.slot_keys = np.concatenate(
+                (self.model.slot_keys,
+                 self.model.random_keys(len(self.model.slot_keys))))
+        self.set_attestations(validators, block_id, slot)
+        self.model.recorder.record_attestation_issue(self.id, slot,
+                                                     self.model.time)
+        if self.model.trace is not None:
+            for v in validators.tolist():
+                self.model.trace.record(self.model.time, TRACE_ATTESTATION,
+                                        v, slot, block_id)
+
+    def receive_attestations(self, attestation_block, attestation_slot):
+        # only entries of a newer slot, or of the same slot and a different
+        # block, can change the local table
+        local_block = self.attestation_block
+        local_slot = self.attestation_slot
+        candidates = np.flatnonzero(
+            (attestation_slot > local_slot)
+            | ((attestation_slot == local_slot)
+               & (attestation_block != local_block)))
+        if len(candidates) == 0:
+            return
+        blocks = attestation_block[candidates]
+        slots = attestation_slot[candidates]
+        known = self.model.known_blocks(blocks, self.id)
+        # first arrival of a newer attestation
+        arrived = ((slots > local_slot[candidates])
+                   & (slots > self.cached_slot[candidates]))
+        if arrived.any():
+            self.model.recorder.record_attestation_arrivals(
+                self.model.validator_node[candidates[arrived]], slots[arrived],
+                self.id, self.model.time)
+        # attestations to unknown blocks are cached
+        cached = arrived & ~known
+        if cached.any():
+            self.cache_attestations(candidates[cached], blocks[cached],
+                                    slots[cached])
+        # attestations of a newer (or the same) slot replace the old ones
+        self.set_attestations(candidates[known], blocks[known], slots[known])
+
+    def set_attestations(self, validators, blocks, slots):
+        """Write entries of the latest messages table and update the
+        view fingerprint accordingly.
+        """
+        self.model.write_attestations(self.id, validators, blocks, slots)
+
+    def cache_attestations(self, validators, blocks, slots):
+        """Keep attestations to blocks not received yet until the block
+        arrives. Past model.attestation_cache_size entries, the ones
+        waiting on the oldest blocks are dropped.
+        """
+        self.n_cached += np.count_nonzero(self.cached_slot[validators] < 0)
+        self.cached_block[validators] = blocks
+        self.cached_slot[validators] = slots
+        for b in np.unique(blocks):
+            b = int(b)
+            if b not in self.cached_attestations:
+                self.cached_attestations[b] = []
+                slot_no = self.global_blockchain[b].slot_no
+                heapq.heappush(self.cache_heap, (slot_no, b))
+                self.model.index_cached_attestations(self.id, slot_no)
+            self.cached_attestations[b].append(validators[blocks == b])
+        if len(self.cache_heap) > 2*len(self.cached_attestations) + 16:
+            self.cache_heap = [(slot_no, b) for slot_no, b in self.cache_heap
+                               if b in self.cached_attestations]
+            heapq.heapify(self.cache_heap)
+        max_size = self.model.attestation_cache_size
+        while (max_size is not None and self.n_cached > max_size
+               and self.cache_heap):
+            _, b = heapq.heappop(self.cache_heap)
+            if b in self.cached_attestations:
+                self.pop_cached_attestations(b)
+
+    def pop_cached_attestations(self, block_id):
+        """Remove from the cache the attestations waiting on block_id.
+        OUTPUT:
+        - validators,   array of the validator ids
+        - slots,        array of the slots of their attestations
+        """
+        validators = np.unique(np.concatenate(
+            self.cached_attestations.pop(block_id)))
+        validators = validators[(self.cached_slot[validators] >= 0)
+                                & (self.cached_block[validators] == block_id)]
+        slots = self.cached_slot[validators]
+        self.cached_slot[validators] = -1
+        self.n_cached -= len(validators)
+        return validators, slots
+
+    def release_cached_attestations(self, block_ids):
+        """Apply the cached attestations waiting on the blocks just
+        received (or settled).
+        """
+        for b in block_ids:
+            if b not in self.cached_attestations:
+                continue
+            validators, slots = self.pop_cached_attestations(b)
+            # check issuing slot
+            newer = slots > self.attestation_slot[validators]
+            self.set_attestations(validators[newer], b, slots[newer])
+
+    def expire_cached_attestations(self):
+        """Drop the attestations waiting on blocks proposed more than
+        model.attestation_cache_expiry slots ago.
+        """
+        expiry = self.model.attestation_cache_expiry
+        if expiry is None:
+            return
+        min_slot = self.model.slot_boundary.counter - expiry
+        while self.cache_heap and self.cache_heap[0][0] < min_slot:
+            _, b = heapq.heappop(self.cache_heap)
+            if b in self.cached_attestations:
+                self.pop_cached_attestations(b)
 
     def update_local_blockchain(self, block):
         """
         When self.Node receive a new block,
         update the local copy of the blockchain.
         """
-        self.local_blockchain = self.local_blockchain.union(block)
-        self.check_cached_attestations()
+        new_blocks = block - self.local_blockchain
+        if not new_blocks:
+            return
+        self.local_blockchain |= new_blocks
+        new_ids = [b.id for b in new_blocks]
+        self.model.views[np.subtract(new_ids, self.model.block_offset), self.id] = True
+        self.model.fingerprints[self.id] ^= np.bitwise_xor.reduce(
+            self.model.block_keys[new_ids])
+        self.model.recorder.record_block_arrival(new_blocks, self.id,
+                                                 self.model.time)
+        self.release_cached_attestations(new_ids)
 
     # TODO: gossip blocks, naming should be changed accordingly
     def gossip(self, listening_node):
         # self.non_gossiped_to.remove(listening_node)
+        if self.model.trace is not None:
+            self.model.trace.record(self.model.time, TRACE_BLOCK_GOSSIP,
+                                    self.id, listening_node.id)
         listening_node.listen(self)
 
+    def gossip_attestations(self, listening_node, table=None):
+        """Gossip the latest messages table, or table (blocks, slots, key),
+        a snapshot of it (see AttestationLeap), to listening_node.
+        """
+        model = self.model
+        if model.trace is not None:
+            model.trace.record(model.time, TRACE_ATTESTATION_GOSSIP,
+                               self.id, listening_node.id)
+        if table is None:
+            row = model.table_row[self.id]
+            table = (model.table_blocks[row], model.table_slots[row],
+                     model.row_hash[row])
+        blocks, slots, key = table
+        # the listening peer already has this very table
+        if model.row_hash[model.table_row[listening_node.id]] == key:
+            return
+        listening_node.receive_attestations(blocks, slots)
+
     # TODO: listen blocks, naming should be changed accordingly
     def listen(self, gossiping_node):
         """Receive new block and update local information accordingly.
         """
         #block = gossiping_node.use_lmd_ghost()
-        self.update_local_blockchain(gossiping_node.local_blockchain)
+        self.receive_blocks(gossiping_node.local_blockchain)
 
-        if self.is_attesting is True:
-            for b in self.local_blockchain:
-                if b.slot_no == self.model.slot_boundary.counter:
+    def receive_blocks(self, blocks):
+        """Merge the gossiped blocks into the local view, attesting
+        validators attest once the block of the current slot arrives.
+        """
+        self.update_local_blockchain(blocks)
+
+        if self.is_attesting:
+            # blocks of the current slot are the last ones created
+            slot = self.model.slot_boundary.counter
+            for b in reversed(self.global_blockchain):
+                if b.slot_no != slot:
+                    break
+                if b in self.local_blockchain:
                     self.issue_attestation()
+                    break
 
     def use_lmd_ghost(self):
-        return lmd_ghost(self.local_blockchain, self.attestations)
+        """Returns the head of the local view.
+        Heads are memoized on the view fingerprint, peers sharing a view
+        and repeated calls on an unchanged view are cache hits.
+        Head changes are passed to model.reorg_recorder.
+        """
+        fingerprint = self.model.fingerprints[self.id]
+        head = self.model.head_cache.get(fingerprint)
+        if head is None:
+            # the walk starts from the finalized checkpoint
+            root = self.model.finalized
+            weight = self.model.calculate_weights(self.attestation_block)
+            head = find_lmd_ghost_head(root, self.local_blockchain,
+                                       lambda block: weight[block.id - root.id])
+            self.model.head_cache.put(fingerprint, head)
+        self.model.reorg_recorder.observe(self.id, head, self.global_blockchain)
+        return head
 
     def __repr__(self):
         return '<Node {}>'.format(self.id)
 
 
+class PropagationRecorder:
+    """Records first-arrival times of blocks and attestations at each node.
+    Arrivals are written into preallocated arrays, rows are doubled when
+    the number of blocks outgrows them.
+    The attestations issued by the validators of a peer in a slot are
+    gossiped together, hence they are tracked as a single row.
+    INPUT:
+    - n_nodes,          int, number of peers
+    - capacity,         int, initial number of block rows
+    """
+
+    def __init__(self, n_nodes, capacity=64):
+        self.n_nodes = n_nodes
+        # block_arrival[b - block_offset, n]: time node n first received
+        # block b. Rows of finalized blocks are archived (see archive_blocks)
+        self.block_offset = 0
+        self.block_created = np.full(capacity, np.nan)
+        self.block_arrival = np.full((capacity, n_nodes), np.nan)
+        self.archived_block_coverage = np.empty(0)
+        # attestation_arrival[m, n]: time node n first received the
+        # latest attestations issued by peer m (at attestation_slot[m])
+        self.attestation_slot = np.full(n_nodes, -1, dtype=np.int64)
+        self.attestation_issued = np.full(n_nodes, np.nan)
+        self.attestation_arrival = np.full((n_nodes, n_nodes), np.nan)
+        self.attestation_reached = np.zeros(n_nodes, dtype=np.int64)
+        # time-to-full-coverage of attestations that reached every node
+        self.attestation_coverage = np.empty(capacity)
+        self.n_attestation_coverage = 0
+
+    def _grow_blocks(self, row):
+        capacity = len(self.block_created)
+        while capacity <= row:
+            capacity *= 2
+        created = np.full(capacity, np.nan)
+        created[:len(self.block_created)] = self.block_created
+        arrival = np.full((capacity, self.n_nodes), np.nan)
+        arrival[:len(self.block_arrival)] = self.block_arrival
+        self.block_created = created
+        self.block_arrival = arrival
+
+    def record_block_creation(self, block, node_id, time):
+        row = block.id - self.block_offset
+        if row >= len(self.block_created):
+            self._grow_blocks(row)
+        self.block_created[row] = time
+        self.block_arrival[row, node_id] = time
+
+    def record_block_arrival(self, blocks, node_id, time):
+        arrival = self.block_arrival
+        for block in blocks:
+            row = block.id - self.block_offset
+            if np.isnan(arrival[row, node_id]):
+                arrival[row, node_id] = time
+
+    def _coverage_times(self, start, stop):
+        """Time-to-full-coverage of the blocks in rows start:stop that
+        reached every node. The genesis block is excluded.
+        """
+        if self.block_offset == 0:
+            start = max(start, 1)
+        rows = slice(start, stop)
+        arrival = self.block_arrival[rows]
+        covered = ~np.isnan(arrival).any(axis=1)
+        return arrival[covered].max(axis=1) - self.block_created[rows][covered]
+
+    def archive_blocks(self, block_offset):
+        """Summarize the rows of the blocks with id below block_offset
+        into coverage times and drop them.
+        """
+        shift = block_offset - self.block_offset
+        self.archived_block_coverage = np.concatenate(
+            (self.archived_block_coverage, self._coverage_times(0, shift)))
+        created = np.full(len(self.block_created), np.nan)
+        created[:len(created) - shift] = self.block_created[shift:]
+        arrival = np.full(self.block_arrival.shape, np.nan)
+        arrival[:len(arrival) - shift] = self.block_arrival[shift:]
+        self.block_created = created
+        self.block_arrival = arrival
+        self.block_offset = block_offset
+
+    def record_attestation_issue(self, node_id, slot, time):
+        if self.attestation_slot[node_id] == slot:
+            return
+        self.attestation_slot[node_id] = slot
+        self.attestation_issued[node_id] = time
+        self.attestation_arrival[node_id] = np.nan
+        self.attestation_reached[node_id] = 0
+        self.record_attestation_arrivals(np.array([node_id]), slot, node_id,
+                                         time)
+
+    def record_attestation_arrivals(self, issuers, slots, node_id, time):
+        """Record the arrival at node_id of attestations issued by the
+        peers issuers in slots.
+        """
+        # only the latest attestations of each peer are tracked
+        issuers = issuers[self.attestation_slot[issuers] == slots]
+        issuers = np.unique(issuers)
+        issuers = issuers[np.isnan(self.attestation_arrival[issuers, node_id])]
+        if len(issuers) == 0:
+            return
+        self.attestation_arrival[issuers, node_id] = time
+        self.attestation_reached[issuers] += 1
+        covered = issuers[self.attestation_reached[issuers] == self.n_nodes]
+        n_covered = self.n_attestation_coverage + len(covered)
+        while n_covered > len(self.attestation_coverage):
+            self.attestation_coverage = np.concatenate(
+                (self.attestation_coverage,
+                 np.empty(len(self.attestation_coverage))))
+        self.attestation_coverage[self.n_attestation_coverage:n_covered] = (
+            time - self.attestation_issued[covered])
+        self.n_attestation_coverage = n_covered
+
+    def block_coverage_times(self, n_blocks):
+        """Time-to-full-coverage of the blocks that reached every node.
+        The genesis block is excluded.
+        """
+        return np.concatenate(
+            (self.archived_block_coverage,
+             self._coverage_times(0, n_blocks - self.block_offset)))
+
+    def attestation_coverage_times(self):
+        return self.attestation_coverage[:self.n_attestation_coverage]
+
+
+class EventTrace:
+    """Compact binary log of the events of a run, one fixed-width record
+    per event (see TRACE_DTYPE), buffered and written in chunks.
+    Records of the kind:
+    - TRACE_BLOCK_GOSSIP,       a gossips its blocks to b
+    - TRACE_ATTESTATION_GOSSIP, a gossips its attestations to b
+    - TRACE_SLOT,               slot a starts
+    - TRACE_EPOCH,              epoch a starts
+    - TRACE_PROPOSAL,           peer a proposes block on top of b
+    - TRACE_ATTESTATION,        validator a attests to block in slot b
+    - TRACE_FINALIZATION,       block is finalized
+    The file starts with a header of the magic string, the format version,
+    the number of peers and the number of validators.
+    INPUT:
+    - path,         str, trace file, overwritten
+    - model,        Model object being traced
+    - buffer_size,  int, records kept in memory before a write
+    """
+    MAGIC = b"ETHTRACE"
+    VERSION = 1
+    HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"),
+                             ("n_nodes", "<i4"), ("n_validators", "<i4")])
+    TRACE_DTYPE = np.dtype([("time", "<f8"), ("kind", "u1"), ("a", "<i4"),
+                            ("b", "<i4"), ("block", "<i4")])
+
+    def __init__(self, path, model, buffer_size=1 << 16):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.n_records = 0
+        self.file = open(path, "wb")
+        header = np.array([(self.MAGIC, self.VERSION, model.N,
+                            len(model.validators))], dtype=self.HEADER_DTYPE)
+        self.file.write(header.tobytes())
+
+    def record(self, time, kind, a=-1, b=-1, block=-1):
+        self.buffer.append((time, kind, a, b, block))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records to the file."""
+        if self.buffer:
+            self.file.write(
+                np.array(self.buffer, dtype=self.TRACE_DTYPE).tobytes())
+            self.n_records += len(self.buffer)
+            self.buffer = []
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HeadCache:
+    """Bounded LRU cache mapping view fingerprints to fork-choice heads.
+    INPUT:
+    - maxsize,  int, maximum number of stored heads
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.heads = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fingerprint):
+        head = self.heads.get(fingerprint)
+        if head is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.heads.move_to_end(fingerprint)
+        return head
+
+    def clear(self):
+        self.heads.clear()
+
+    def put(self, fingerprint, head):
+        if self.maxsize <= 0:
+            return
+        self.heads[fingerprint] = head
+        if len(self.heads) > self.maxsize:
+            self.heads.popitem(last=False)
+
+    def stats(self):
+        """Returns hits, misses, hit rate and occupancy of the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits/lookups if lookups else np.nan,
+            "size": len(self.heads),
+            "maxsize": self.maxsize,
+            }
+
+
+class ChildrenHistogram:
+    """Number of blocks of the blocktree per number of children, updated
+    as blocks are appended. The entropy of the blocktree is computed from
+    it in O(max number of children).
+    INPUT:
+    - capacity,     int, initial number of bins, doubled when needed
+    """
+
+    def __init__(self, capacity=8):
+        self.counts = np.zeros(capacity, dtype=np.int64)
+
+    def add_block(self, block):
+        """Account for block, just appended to the blocktree."""
+        self.counts[0] += 1
+        if block.parent is not None:
+            n_children = len(block.parent.children)
+            if n_children >= len(self.counts):
+                self.counts = np.concatenate(
+                    (self.counts, np.zeros(len(self.counts), dtype=np.int64)))
+            self.counts[n_children - 1] -= 1
+            self.counts[n_children] += 1
+
+    def entropy(self):
+        """Entropy of the children-count distribution, see calculate_entropy."""
+        return histogram_entropy(self.counts)
+
+
+class ReorgRecorder:
+    """Head changes of the peers, observed whenever they run fork choice.
+    A new head that does not descend from the previous one is a reorg,
+    its depth is the number of blocks of the old chain above their common
+    ancestor. Depths are counted in a histogram, doubled when needed.
+    INPUT:
+    - n_nodes,      int, number of peers
+    - capacity,     int, initial number of depth bins
+    """
+
+    def __init__(self, n_nodes, capacity=8):
+        # id of the last head of each peer, initially the genesis
+        self.heads = np.zeros(n_nodes, dtype=np.int64)
+        # depth_counts[d]: number of reorgs of depth d
+        self.depth_counts = np.zeros(capacity, dtype=np.int64)
+
+    def observe(self, node_id, head, blockchain):
+        """node_id chose head, blockchain[b] is the block of id b."""
+        old_id = self.heads[node_id]
+        if old_id == head.id:
+            return
+        self.heads[node_id] = head.id
+        old = blockchain[old_id]
+        depth = old.height - common_ancestor(old, head).height
+        if depth > 0:
+            self.record(depth)
+
+    def record(self, depths, counts=1):
+        """Count reorgs of the given depths (scalars or arrays)."""
+        max_depth = np.max(depths)
+        if max_depth >= len(self.depth_counts):
+            capacity = len(self.depth_counts)
+            while capacity <= max_depth:
+                capacity *= 2
+            grown = np.zeros(capacity, dtype=np.int64)
+            grown[:len(self.depth_counts)] = self.depth_counts
+            self.depth_counts = grown
+        np.add.at(self.depth_counts, depths, counts)
+
+
+class SharedTopology:
+    """CSR adjacency of the peer network in shared memory. Worker
+    processes attach to the arrays zero-copy: pickling a SharedTopology
+    only passes the names of its shared memory blocks.
+    The process that created it calls unlink() once the workers are done.
+    INPUT
+    - indptr,   array, see Network.graph_to_csr
+    - indices,  array, see Network.graph_to_csr
+    """
+
+    def __init__(self, indptr, indices):
+        self.blocks = []
+        self.owner = True
+        self.indptr = self._share(indptr)
+        self.indices = self._share(indices)
+
+    @classmethod
+    def from_graph(cls, G):
+        return cls(*Network.graph_to_csr(G))
+
+    def _share(self, array):
+        from multiprocessing.shared_memory import SharedMemory
+        block = SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[:] = array
+        self.blocks.append(block)
+        return shared
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getstate__(self):
+        return [(block.name, array.shape, array.dtype.str)
+                for block, array in zip(self.blocks,
+                                        (self.indptr, self.indices))]
+
+    def __setstate__(self, state):
+        from multiprocessing.shared_memory import SharedMemory
+        self.blocks = []
+        self.owner = False
+        arrays = []
+        for name, shape, dtype in state:
+            try:
+                block = SharedMemory(name=name, track=False)
+            except TypeError:
+                # python < 3.13 has no track argument
+                block = SharedMemory(name=name)
+            self.blocks.append(block)
+            arrays.append(np.ndarray(shape, dtype=dtype, buffer=block.buf))
+        self.indptr, self.indices = arrays
+
+    def close(self):
+        """Detach from the shared memory, the arrays are no longer
+        usable."""
+        self.indptr = self.indices = None
+        for block in self.blocks:
+            block.close()
+
+    def unlink(self):
+        """Detach and free the shared memory."""
+        self.close()
+        if self.owner:
+            for block in self.blocks:
+                block.unlink()
+
+
 class Network:
     """
     Object to manage the peer-to-peer network.
-    It is a wrapper of networkx.Graph right now.
+    Neighbours are read from the CSR adjacency (indptr, indices),
+    the networkx.Graph is only needed for the network metrics and is
+    rebuilt from the arrays when the network comes from a SharedTopology.
+    Edges may have latency multipliers, latencies[e] scales the gossip
+    latency of the directed edge e of the CSR arrays.
     INPUT
-    - G,    a networkx.Graph object
+    - G,        a networkx.Graph object, or a SharedTopology
+    - latency,  None for uniform latencies, or name of an edge attribute of
+                G (1 where missing), or an N x N latency matrix, or an
+                array with one entry per directed edge
     """
 
-    import networkx as nx
+    def __init__(self, G, latency=None):
+        if isinstance(G, SharedTopology):
+            if isinstance(latency, str):
+                raise ValueError("a SharedTopology has no edge attributes, "
+                                 "latency must be an array")
+            self._network = None
+            self.indptr, self.indices = G.indptr, G.indices
+        else:
+            # G is a networkx Graph
+            self._network = G
+            self.indptr, self.indices = self.graph_to_csr(G)
+        self._init_edges()
+        self.latencies = None
+        if latency is not None:
+            self.latencies = self.edge_latencies(latency)
+
+    def _init_edges(self):
+        # gossiping peer of each directed edge, and peers on the network
+        self.sources = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        self.num_edges = len(self.indices)
+        self.online = np.ones(len(self), dtype=bool)
+        self._init_faults(len(self.indices))
+
+    def _init_faults(self, capacity):
+        # masks of the faults of the edges, see heal
+        self.enabled = np.ones(capacity, dtype=bool)
+        self.loss = np.zeros(capacity)
+        self.slowdown = np.ones(capacity)
+        self.part = None
+        self.faulty = False
 
-    def __init__(self, G):
-        # G is a networkx Graph
-        self.network = G
+    @property
+    def network(self):
+        """networkx.Graph of the peers, indexed from 0 to N-1 if rebuilt."""
+        if self._network is None:
+            import networkx as nx
+            graph = nx.Graph()
+            graph.add_nodes_from(range(len(self)))
+            graph.add_edges_from(zip(self.sources.tolist(), self.indices.tolist()))
+            self._network = graph
+        return self._network
+
+    @classmethod
+    def from_csr(cls, indptr, indices, latencies=None):
+        """Network on the CSR adjacency (indptr, indices)."""
+        network = cls.__new__(cls)
+        network._network = None
+        network.indptr, network.indices = indptr, indices
+        network.latencies = latencies
+        network._init_edges()
+        return network
+
+    def find_edge(self, u, v):
+        """Index of the directed edge u -> v, -1 if missing."""
+        start = self.indptr[u]
+        hit = np.flatnonzero(self.indices[start:self.indptr[u + 1]] == v)
+        return start + hit[0] if len(hit) else -1
+
+    def link_edges(self, links):
+        """Indices of the directed edges of the links (u, v), both ways.
+        Missing links are skipped.
+        """
+        edges = [self.find_edge(a, b) for u, v in links
+                 for a, b in ((u, v), (v, u))]
+        return np.array([e for e in edges if e >= 0], dtype=np.int64)
+
+    # Faults: gossip over a disabled edge is lost, a gossip over an edge
+    # with loss p is lost with probability p, and an edge slowed down by
+    # factor gossips factor times slower. Faults act as a thinning of the
+    # gossip events, the arrays are never reallocated.
+
+    def partition(self, groups):
+        """Disable the edges between groups of peers. groups is either a
+        list of lists of peers or the group label of each peer. With a
+        list, the peers listed in none of the groups all get the label -1:
+        together they form one extra group and stay connected to each
+        other.
+        """
+        if len(groups) and np.ndim(groups[0]) == 0:
+            part = np.asarray(groups)
+        else:
+            part = np.full(len(self), -1, dtype=np.int64)
+            for label, group in enumerate(groups):
+                part[list(group)] = label
+        self.part = part
+        n = self.num_edges
+        self.enabled[:n] &= part[self.sources[:n]] == part[self.indices[:n]]
+        self.faulty = True
+
+    def heal(self):
+        """Clear every fault of the network."""
+        self.enabled[:] = True
+        self.loss[:] = 0
+        self.slowdown[:] = 1
+        self.part = None
+        self.faulty = False
+
+    def disable(self, links):
+        self.enabled[self.link_edges(links)] = False
+        self.faulty = True
+
+    def enable(self, links):
+        self.enabled[self.link_edges(links)] = True
+
+    def drop(self, links, probability):
+        """Gossip over the links is lost with probability."""
+        if not 0 <= probability <= 1:
+            raise ValueError("probability must be in [0, 1]")
+        self.loss[self.link_edges(links)] = probability
+        self.faulty = True
+
+    def delay(self, links, factor):
+        """Gossip over the links is factor (>= 1) times slower."""
+        if not factor >= 1:
+            raise ValueError("factor must be at least 1")
+        self.slowdown[self.link_edges(links)] = factor
+        self.faulty = True
+
+    def delivers(self, edge, rng):
+        """False if a gossip event drawn on edge is lost to a fault."""
+        if not self.enabled[edge]:
+            return False
+        if self.loss[edge] == 0 and self.slowdown[edge] == 1:
+            return True
+        return rng.random()*self.slowdown[edge] < 1 - self.loss[edge]
+
+    def delivery_probability(self):
+        """Probability that gossip over each edge goes through."""
+        n = self.num_edges
+        return self.enabled[:n]*(1 - self.loss[:n])/self.slowdown[:n]
+
+    def edge_latencies(self, latency):
+        """Latency multipliers of the directed edges, see Network."""
+        if isinstance(latency, str):
+            G = self.network
+            latencies = np.fromiter((G[n][k].get(latency, 1.)
+                                     for n in G.nodes()
+                                     for k in G.neighbors(n)),
+                                    dtype=np.float64, count=len(self.indices))
+        else:
+            latency = np.asarray(latency, dtype=np.float64)
+            if latency.shape == (len(self), len(self)):
+                latencies = latency[self.sources, self.indices]
+            elif latency.shape == self.indices.shape:
+                latencies = latency.copy()
+            else:
+                raise ValueError("latency must be an N x N matrix or have "
+                                 "one entry per directed edge")
+        if not (np.isfinite(latencies).all() and (latencies > 0).all()):
+            raise ValueError("latencies must be positive and finite")
+        return latencies
 
     def __len__(self):
-        return len(self.network)
-
-    # TODO: nodes -> peers
-    def set_neighborhood(self, nodes):
-        # dict map nodes in the nx.graph to nodes on p2p network
-        nodes_dict = dict(zip(self.network.nodes(), nodes))
-        # save peer node object as an attribute of nx node
-        nx.set_node_attributes(self.network, values=nodes_dict, name='name')
+        return len(self.indptr) - 1
+
+    def neighbors(self, i):
+        """Ids of the neighbours of peer i."""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    @staticmethod
+    def graph_to_csr(G):
+        """Adjacency of a networkx.Graph in CSR form, peers are indexed in
+        the order of the graph nodes.
+        OUTPUT:
+        - indptr,   array, neighbours of peer i are indices[indptr[i]:indptr[i+1]]
+        - indices,  array of peer ids
+        """
+        index = {n: i for i, n in enumerate(G.nodes())}
+        indptr = np.zeros(len(index) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(G[n]) for n in G.nodes()])
+        indices = np.fromiter((index[k] for n in G.nodes()
+                               for k in G.neighbors(n)),
+                              dtype=np.int64, count=indptr[-1])
+        return indptr, indices
+
+
+class DynamicNetwork(Network):
+    """Network whose peers leave and join, and whose edges are added and
+    removed, during a run. The live directed edges are stored unordered
+    in sources[:num_edges], indices[:num_edges] and latencies[:num_edges],
+    a removed edge is overwritten by the last one: every update costs
+    O(degree) of the peers involved, the arrays are doubled when full.
+    The online peers are online_order[:n_online].
+    A joining peer connects to its online neighbours in the initial
+    topology, whose CSR arrays are kept (base_indices, base_latencies).
+    INPUT
+    - G, latency,   see Network
+    """
 
-        for n in self.network.nodes():
-            m = self.network.nodes[n]['name']
-            # save each neighbour in the nx.Graph inside the peer node object
-            for k in self.network.neighbors(n):
-                m.neighbors.add(self.network.nodes[k]['name'])
+    def __init__(self, G, latency=None):
+        super().__init__(G, latency)
+        # the metrics are computed on the initial topology
+        self.network
+        self.base_indices = self.indices
+        self.base_latencies = self.latencies
+        self.weighted = self.latencies is not None
+        if not self.weighted:
+            self.base_latencies = np.ones(len(self.base_indices))
+        self.reset()
+
+    def reset(self):
+        """Back to the initial topology, every peer online."""
+        capacity = max(len(self.base_indices), 16)
+        self.sources = np.zeros(capacity, dtype=np.int64)
+        self.indices = np.zeros(capacity, dtype=np.int64)
+        self.latencies = np.ones(capacity)
+        self._init_faults(capacity)
+        self.num_edges = 0
+        self.rate_sum = 0.
+        # upper bound of the rates, for rejection sampling
+        self.min_latency = (self.base_latencies.min()
+                            if len(self.base_latencies) else 1.)
+        self.edge_index = {}
+        self.adjacency = [set() for _ in range(len(self))]
+        self.online = np.ones(len(self), dtype=bool)
+        self.online_order = np.arange(len(self))
+        self.online_position = np.arange(len(self))
+        self.n_online = len(self)
+        base_sources = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        for u, v, latency in zip(base_sources.tolist(),
+                                 self.base_indices.tolist(),
+                                 self.base_latencies.tolist()):
+            self._add_directed(u, v, latency)
+
+    def neighbors(self, i):
+        """Ids of the current neighbours of peer i."""
+        return np.fromiter(self.adjacency[i], dtype=np.int64,
+                           count=len(self.adjacency[i]))
+
+    def find_edge(self, u, v):
+        return self.edge_index.get((u, v), -1)
+
+    def _add_directed(self, u, v, latency):
+        if (u, v) in self.edge_index:
+            return
+        e = self.num_edges
+        if e == len(self.sources):
+            self.sources = np.concatenate((self.sources, np.zeros_like(self.sources)))
+            self.indices = np.concatenate((self.indices, np.zeros_like(self.indices)))
+            self.latencies = np.concatenate((self.latencies, np.ones(e)))
+            self.enabled = np.concatenate((self.enabled, np.ones(e, dtype=bool)))
+            self.loss = np.concatenate((self.loss, np.zeros(e)))
+            self.slowdown = np.concatenate((self.slowdown, np.ones(e)))
+        self.sources[e] = u
+        self.indices[e] = v
+        self.latencies[e] = latency
+        # new edges across a partition are cut as well
+        self.enabled[e] = self.part is None or self.part[u] == self.part[v]
+        self.loss[e] = 0
+        self.slowdown[e] = 1
+        self.edge_index[(u, v)] = e
+        self.adjacency[u].add(v)
+        self.num_edges += 1
+        self.rate_sum += 1/latency
+        self.min_latency = min(self.min_latency, latency)
+
+    def _remove_directed(self, u, v):
+        e = self.edge_index.pop((u, v), None)
+        if e is None:
+            return
+        self.adjacency[u].discard(v)
+        self.rate_sum -= 1/self.latencies[e]
+        last = self.num_edges - 1
+        if e != last:
+            for array in (self.sources, self.indices, self.latencies,
+                          self.enabled, self.loss, self.slowdown):
+                array[e] = array[last]
+            self.edge_index[(int(self.sources[e]), int(self.indices[e]))] = e
+        self.num_edges = last
+        if last == 0:
+            # no rounding residue
+            self.rate_sum = 0.
+
+    def add_edge(self, u, v, latency=1.):
+        """Connect the online peers u and v."""
+        if not latency > 0:
+            raise ValueError("latency must be positive")
+        if u == v or not (self.online[u] and self.online[v]):
+            return
+        self._add_directed(u, v, latency)
+        self._add_directed(v, u, latency)
+
+    def remove_edge(self, u, v):
+        self._remove_directed(u, v)
+        self._remove_directed(v, u)
+
+    def _set_online(self, i, online):
+        # swap i across the boundary of the online peers
+        if online:
+            j = self.online_order[self.n_online]
+            self.n_online += 1
+        else:
+            self.n_online -= 1
+            j = self.online_order[self.n_online]
+        pi, pj = self.online_position[i], self.online_position[j]
+        self.online_order[pi], self.online_order[pj] = j, i
+        self.online_position[i], self.online_position[j] = pj, pi
+        self.online[i] = online
+
+    def leave(self, i):
+        """Peer i goes offline and loses its edges."""
+        if not self.online[i]:
+            return
+        for v in list(self.adjacency[i]):
+            self.remove_edge(i, v)
+        self._set_online(i, False)
+
+    def join(self, i):
+        """Peer i comes back online, connected to its online neighbours
+        of the initial topology."""
+        if self.online[i]:
+            return
+        self._set_online(i, True)
+        start, stop = self.indptr[i], self.indptr[i + 1]
+        for v, latency in zip(self.base_indices[start:stop].tolist(),
+                              self.base_latencies[start:stop].tolist()):
+            self.add_edge(i, v, latency)
+
+    def sample_edge(self, rng):
+        """Draw a live edge proportionally to its rate, by rejection
+        against the largest rate."""
+        while True:
+            edge = rng.integers(self.num_edges)
+            if not self.weighted or (rng.random()*self.latencies[edge]
+                                     < self.min_latency):
+                return edge
 
 
 class Gillespie:
@@ -414,24 +1708,27 @@ class Gillespie:
         self.rng = rng
 
         self.processes = processes
-
-        self.lambdas = [process.lam for process in self.processes]
-        self.lambda_sum = np.sum(self.lambdas)
-        self.lambda_weighted = [process.lam/self.lambda_sum
-                                for process in self.processes]
+        self.update_lambdas()
 
     def update_lambdas(self):
-        '''Lambdas are recauculated after each time increment
+        '''Lambdas are recauculated after each time increment.
+        With a zero total rate (no live edge) no process is weighted.
         '''
         self.lambdas = [process.lam for process in self.processes]
         self.lambda_sum = np.sum(self.lambdas)
-        self.lambda_weighted = [process.lam/self.lambda_sum
-                                for process in self.processes]
+        if self.lambda_sum > 0:
+            self.lambda_weighted = [process.lam/self.lambda_sum
+                                    for process in self.processes]
+        else:
+            self.lambda_weighted = [0. for _ in self.processes]
 
     def calculate_time_increment(self):
         '''Function to generate the random time increment
-            from an exponential random distribution.
+            from an exponential random distribution,
+            infinite if no process can fire.
         '''
+        if self.lambda_sum <= 0:
+            return np.inf
         increment = (-np.log(self.rng.random())
                      / self.lambda_sum).astype('float64')
         return increment
@@ -445,7 +1742,81 @@ class Gillespie:
         return select_process
 
 
-class Model:
+class Simulation:
+    """Base class of the simulation engines, running ensembles of seeds.
+    Subclasses implement reset(seed), run(stoping_time) and results().
+    """
+
+    def run_seed(self, seed, stoping_time):
+        """Reset the model, run it with the given seed and return its
+        results.
+        """
+        self.reset(seed)
+        self.run(stoping_time)
+        return self.results()
+
+    @classmethod
+    def run_ensemble(cls, params, seeds, stoping_time, processes=None,
+                     confidence=0.95):
+        """Run the model once per seed. The topology, the peers and the
+        network metrics are built once and only the dynamic state is
+        reset between runs. With processes > 1 the runs are spread over
+        a process pool, each worker building the model once on the
+        topology shared in memory (see SharedTopology).
+
+        Parameters:
+        -----------
+        params : dict
+            keyword arguments of the model class, but seed. graph can be a
+            networkx.Graph or a SharedTopology
+        seeds : list
+            one run per seed
+        stoping_time : float
+            simulation time of each run
+        processes : int
+            number of worker processes, None to run in this process
+        confidence : float
+            confidence level of the intervals
+
+        Returns:
+        --------
+        table : dictionary
+            aggregated results per metric, see aggregate_results
+        """
+        return aggregate_results(
+            cls.ensemble_runs(params, seeds, stoping_time, processes),
+            confidence)
+
+    @classmethod
+    def ensemble_runs(cls, params, seeds, stoping_time, processes=None):
+        """Results of the runs of run_ensemble, one dictionary per seed.
+        """
+        if processes is None or processes <= 1:
+            model = cls(**params)
+            runs = [model.run_seed(seed, stoping_time) for seed in seeds]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            # workers attach to the topology in shared memory, edge
+            # attributes are read here as the shared graph has none
+            if isinstance(params.get("edge_latency"), str):
+                params = {**params, "edge_latency": Network(
+                    params.get("graph"), params["edge_latency"]).latencies}
+            topology = params.get("graph")
+            if not isinstance(topology, SharedTopology):
+                topology = SharedTopology.from_graph(topology)
+            try:
+                with ProcessPoolExecutor(max_workers=processes,
+                                         initializer=_init_ensemble_worker,
+                                         initargs=(cls, {**params, "graph": topology})) as pool:
+                    runs = list(pool.map(_run_ensemble_worker, seeds,
+                                         [stoping_time]*len(seeds)))
+            finally:
+                if topology is not params.get("graph"):
+                    topology.unlink()
+        return runs
+
+
+class Model(Simulation):
     '''Initiates the model and builds it around the parameters given
     model.gillespie.run to run the simulation.
     All objects are contained in the class.
@@ -460,100 +1831,558 @@ class Model:
                  tau_attest=None,
                  delay_share=0,
                  delay_time=0,
+                 stake=None,
+                 validators_per_node=1,
+                 slots_per_epoch=1,
+                 head_cache_size=4096,
+                 finality=None,
+                 finality_depth=32,
+                 attestation_cache_size=None,
+                 attestation_cache_expiry=None,
+                 attestation_tolerance=None,
+                 edge_latency=None,
+                 tau_online=None,
+                 tau_offline=None,
+                 offline=None,
+                 churn_schedule=None,
+                 fault_schedule=None,
                  seed=None):
-        # set random seed
-        self.rng = np.random.default_rng(seed)
         # set internal variables
         self.tau_block = tau_block
         self.tau_attest = tau_attest
-        self.slots_per_epoch = 1
+        self.slots_per_epoch = slots_per_epoch
         self.delay_share = delay_share
         self.delay_time = delay_time
-        # init the blocktree
-        self.blockchain = [Block()]
+        self.head_cache_size = head_cache_size
+        if finality is not None and finality.lower() == "none":
+            finality = None
+        self.finality = finality
+        self.finality_depth = finality_depth
+        # per-peer bound on the attestations waiting for a missing block,
+        # and number of slots after which such a block is given up on
+        # (None for no bound)
+        self.attestation_cache_size = attestation_cache_size
+        self.attestation_cache_expiry = attestation_cache_expiry
+        # attestation gossip is tau-leaped if a tolerance is given,
+        # see AttestationLeap
+        self.attestation_tolerance = attestation_tolerance
         # set up peers
-        self.network = Network(graph)
+        # churn: peers leave and join after exponential times of mean
+        # tau_online and tau_offline, the peers in offline start off the
+        # network, churn_schedule lists changes at given times
+        # (see ChurnSchedule). The topology is then a DynamicNetwork.
+        if (tau_online is None) != (tau_offline is None):
+            raise ValueError("tau_online and tau_offline go together")
+        self.tau_online = tau_online
+        self.tau_offline = tau_offline
+        self.offline = [] if offline is None else list(offline)
+        self.churn_schedule = churn_schedule
+        # partitions and link faults at given times, see FaultSchedule
+        self.fault_schedule = fault_schedule
+        dynamic = (tau_online is not None or self.offline
+                   or churn_schedule is not None)
+        # edge_latency scales the gossip latency of each edge, see Network
+        if dynamic:
+            self.network = DynamicNetwork(graph, edge_latency)
+        else:
+            self.network = Network(graph, edge_latency)
         self.N = len(self.network)
-        self.nodes = [Node(blockchain=self.blockchain,
-                           rng=self.rng, id=i, model=self)
-                      for i in range(self.N)]
-        # validators == peers
-        self.validators = self.nodes
+        # validators are hosted by peers in batches of validators_per_node,
+        # validator v is hosted by peer validator_node[v]
+        self.validators_per_node = validators_per_node
+        self.validators = list(range(self.N*self.validators_per_node))
+        self.validator_node = np.repeat(np.arange(self.N),
+                                        self.validators_per_node)
+        # effective balance of each validator, indexed by validator id
+        if stake is None:
+            self.stake = np.ones(len(self.validators))
+        else:
+            self.stake = np.asarray(stake, dtype=np.float64)
+            if self.stake.shape != (len(self.validators),):
+                raise ValueError("stake must have one entry per validator")
+        # diameter and average shortest path, computed once
+        self.network_metrics = None
+        # event trace of the running run, see Model.run
+        self.trace = None
+        # the dynamic state is set up by reset
+        self.nodes = []
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """Reset the dynamic state of the model (blocktree, peer views,
+        processes and events) for a new run, keeping the topology,
+        the peers and the validators.
+        """
+        # set random seed, the view fingerprint keys have their own stream
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        seed, key_seed = seed.spawn(2)
+        self.rng = np.random.default_rng(seed)
+        self.network.heal()
+        if isinstance(self.network, DynamicNetwork):
+            self.network.reset()
+            for i in self.offline:
+                self.network.leave(i)
+        # init the blocktree
+        self.blockchain = [Block()]
+        self.children_histogram = ChildrenHistogram()
+        self.children_histogram.add_block(self.blockchain[0])
+        self.is_attesting = np.ones(len(self.validators), dtype=bool)
+        # latest messages tables of the peers, one row per distinct table:
+        # table_row[n] is the row of peer n, row_peers[r] the number of
+        # peers sharing row r, see write_attestations. All the peers
+        # start on the genesis table of row 0.
+        self.table_blocks = np.zeros((4, len(self.validators)), dtype=np.int64)
+        self.table_slots = np.full((4, len(self.validators)), -1, dtype=np.int64)
+        self.table_row = np.zeros(self.N, dtype=np.int64)
+        self.row_peers = np.zeros(4, dtype=np.int64)
+        self.row_peers[0] = self.N
+        self.free_rows = [3, 2, 1]
+        # peers with attestations cached on blocks of each slot,
+        # cache_index_slots is a heap of the slots of cache_index
+        self.cache_index = {}
+        self.cache_index_slots = []
+        if not self.nodes:
+            self.nodes = [Node(blockchain=self.blockchain,
+                               rng=self.rng, id=i, model=self,
+                               validators=np.flatnonzero(self.validator_node == i))
+                          for i in range(self.N)]
+        else:
+            for node in self.nodes:
+                node.reset(self.blockchain, self.rng)
         # set up delayers nodes
         if self.delay_share > 0:
             self.delay_nodes = self.rng.choice(self.nodes, size=math.floor(self.N*self.delay_share))
             for node in self.delay_nodes:
                 node.delayer = True
-        # init attestations
-        for node in self.nodes:
-            node.attestations = {v: (self.blockchain[0], -1)
-                                 for v in self.validators}
-        # set up p2p network
-        self.network.set_neighborhood(self.nodes)
-        self.edges = [(n, k) for n in self.nodes for k in n.neighbors]
+        self.time = 0
+        # finalized checkpoint: node views and fork choice only keep
+        # the checkpoint and its descendants, see Model.finalize
+        self.finalized = self.blockchain[0]
+        self.finalized_checkpoints = [self.finalized]
+        self.block_offset = self.finalized.id
+        # block_parent[b]: id of the parent of block b
+        # settled[b]: True if block b is below the finalized checkpoint or
+        # pruned. Attestations to it are accepted but carry no weight.
+        # views[b - block_offset, n]: True if node n received block b
+        self.block_parent = np.full(64, -1, dtype=np.int64)
+        self.settled = np.zeros(64, dtype=bool)
+        self.views = np.zeros((64, self.N), dtype=bool)
+        self.views[0] = True
+        # view fingerprints: xor of the random keys of the known blocks
+        # and of the (validator, attested block) entries of the table.
+        # Peers with the same fingerprint have the same fork choice.
+        self.key_rng = np.random.default_rng(key_seed)
+        self.block_keys = self.random_keys(64)
+        self.validator_keys = self.random_keys(len(self.validators)) | np.uint64(1)
+        self.fingerprints = np.full(self.N, self.block_keys[0] ^ np.bitwise_xor.reduce(
+            self.validator_keys*self.block_keys[0]))
+        # table keys: xor of the keys of the (validator, block, slot)
+        # entries, row_hash[r] is the key of row r and hash_row maps the
+        # key of each table in use to its row. slot_keys[s + 1] is the
+        # key of slot s, grown with the slots in Node.attest
+        self.slot_keys = self.random_keys(64)
+        validators = np.arange(len(self.validators))
+        self.row_hash = np.zeros(4, dtype=np.uint64)
+        self.row_hash[0] = self.entries_key(validators, self.table_blocks[0],
+                                            self.table_slots[0])
+        self.hash_row = {int(self.row_hash[0]): 0}
+        # memoized fork-choice heads, see head_cache.stats() for hit rates
+        self.head_cache = HeadCache(self.head_cache_size)
+        # first-arrival times of blocks and attestations
+        self.recorder = PropagationRecorder(self.N)
+        self.recorder.record_block_creation(self.blockchain[0], 0, self.time)
+        self.recorder.block_arrival[0] = self.time
+        # head changes and reorgs seen by the peers
+        self.reorg_recorder = ReorgRecorder(self.N)
 
         # set up stochastic processes
         self.block_gossip_process = BlockGossipProcess(tau=self.tau_block,
-                                                       edges=self.edges)
+                                                       network=self.network,
+                                                       nodes=self.nodes,
+                                                       rng=self.rng)
         self.attestation_gossip_process = AttestationGossipProcess(
             tau=self.tau_attest,
-            edges=self.edges)
+            network=self.network,
+            nodes=self.nodes,
+            rng=self.rng)
 
         self.epoch_boundary = EpochBoundary(slot_interval=12,
                                             validators=self.validators,
                                             slots_per_epoch=self.slots_per_epoch,
+                                            is_attesting=self.is_attesting,
                                             rng=self.rng)
         self.late_proposal = LateProposal(np.inf,
                                             delay=self.delay_time,
                                             rng=self.rng)
         self.slot_boundary = SlotBoundary(12,
-                                          self.validators,
+                                          self.nodes,
+                                          self.validator_node,
+                                          self.is_attesting,
                                           self.epoch_boundary,
                                           late_proposal=self.late_proposal,
+                                          stake=self.stake,
+                                          expire_cached=self.expire_cached_attestations,
                                           rng=self.rng)
         self.attestation_boundary = AttestationBoundary(12,
                                                         offset=4,
-                                                        validators=self.validators,
+                                                        nodes=self.nodes,
+                                                        validator_node=self.validator_node,
+                                                        is_attesting=self.is_attesting,
                                                         rng=self.rng)
 
         self.processes = [self.block_gossip_process,
                           self.attestation_gossip_process]
         self.fixed_events = [self.epoch_boundary, self.slot_boundary,
                              self.attestation_boundary, self.late_proposal]
+        self.attestation_leap = None
+        if self.attestation_tolerance is not None:
+            self.attestation_leap = AttestationLeap(self.tau_attest,
+                                                    self.attestation_tolerance,
+                                                    model=self,
+                                                    rng=self.rng)
+            self.processes.remove(self.attestation_gossip_process)
+            self.fixed_events.append(self.attestation_leap)
+        if self.finality is not None:
+            self.finalization = Finalization(12*self.slots_per_epoch,
+                                             model=self,
+                                             rule=self.finality.lower(),
+                                             depth=self.finality_depth,
+                                             rng=self.rng)
+            self.fixed_events.insert(0, self.finalization)
+        self.churn_process = None
+        if self.tau_online is not None:
+            self.churn_process = ChurnProcess(self.tau_online,
+                                              self.tau_offline,
+                                              model=self, rng=self.rng)
+            self.processes.append(self.churn_process)
+        if self.churn_schedule is not None:
+            self.fixed_events.append(ChurnSchedule(self.churn_schedule,
+                                                   model=self, rng=self.rng))
+        if self.fault_schedule is not None:
+            self.fixed_events.append(FaultSchedule(self.fault_schedule,
+                                                   model=self, rng=self.rng))
         # set up gillespie model
         self.gillespie = Gillespie(self.processes, self.rng)
-        self.time = 0
 
-    def run(self, stoping_time):
+    def update_rates(self):
+        """Rates of the processes after a change of the topology."""
+        for process in self.processes:
+            process.refresh()
+        self.gillespie.update_lambdas()
+
+    def leave(self, i):
+        """Peer i goes off the network, keeping its state."""
+        self.network.leave(i)
+        self.update_rates()
+
+    def join(self, i):
+        """Peer i comes back, connected to its online neighbours."""
+        self.network.join(i)
+        self.update_rates()
+
+    def add_edge(self, u, v, latency=1.):
+        self.network.add_edge(u, v, latency)
+        self.update_rates()
+
+    def remove_edge(self, u, v):
+        self.network.remove_edge(u, v)
+        self.update_rates()
+
+    def random_keys(self, size):
+        return self.key_rng.integers(np.iinfo(np.uint64).max, size=size,
+                                     dtype=np.uint64, endpoint=True)
+
+    def entries_key(self, validators, blocks, slots):
+        """Key of the (validator, block, slot) entries of a latest
+        messages table.
+        """
+        return np.bitwise_xor.reduce(
+            self.validator_keys[validators]
+            * (self.block_keys[blocks] ^ self.slot_keys[np.add(slots, 1)]))
+
+    @property
+    def attestation_blocks(self):
+        """Latest messages tables of all the peers (a copy), N x V."""
+        return self.table_blocks[self.table_row]
+
+    @property
+    def attestation_slots(self):
+        """Slots of the latest messages tables (a copy), N x V."""
+        return self.table_slots[self.table_row]
+
+    def attestations_agree(self):
+        """True if all the peers have the same latest messages table."""
+        return len(self.hash_row) == 1
+
+    def write_attestations(self, node_id, validators, blocks, slots):
+        """Write entries of the latest messages table of node_id. A row
+        shared with other peers is copied first (copy on write), and the
+        peer moves to the row of another peer if the tables become equal,
+        so that there is one row per distinct table. Tables are compared
+        by their keys. The view fingerprint of node_id is updated.
+        """
+        row = self.table_row[node_id]
+        keys = self.validator_keys[validators]
+        old_blocks = self.block_keys[self.table_blocks[row, validators]]
+        new_blocks = self.block_keys[blocks]
+        self.fingerprints[node_id] ^= np.bitwise_xor.reduce(
+            (keys*old_blocks) ^ (keys*new_blocks))
+        old_key = int(self.row_hash[row])
+        key = old_key ^ int(np.bitwise_xor.reduce(
+            (keys*(old_blocks ^ self.slot_keys[self.table_slots[row, validators] + 1]))
+            ^ (keys*(new_blocks ^ self.slot_keys[np.add(slots, 1)]))))
+        if key == old_key:
+            return
+        if key in self.hash_row:
+            # another peer has this very table
+            self.release_row(row)
+            self.table_row[node_id] = self.hash_row[key]
+            self.row_peers[self.table_row[node_id]] += 1
+            return
+        if self.row_peers[row] > 1:
+            self.row_peers[row] -= 1
+            shared, row = row, self.allocate_row()
+            self.table_blocks[row] = self.table_blocks[shared]
+            self.table_slots[row] = self.table_slots[shared]
+            self.row_peers[row] = 1
+            self.table_row[node_id] = row
+        else:
+            del self.hash_row[old_key]
+        self.table_blocks[row, validators] = blocks
+        self.table_slots[row, validators] = slots
+        self.row_hash[row] = key
+        self.hash_row[key] = row
+
+    def allocate_row(self):
+        """Index of a free row of the tables, doubling them if needed."""
+        if not self.free_rows:
+            capacity = len(self.row_peers)
+            self.table_blocks = np.concatenate(
+                (self.table_blocks, np.zeros_like(self.table_blocks)))
+            self.table_slots = np.concatenate(
+                (self.table_slots, np.zeros_like(self.table_slots)))
+            self.row_peers = np.concatenate(
+                (self.row_peers, np.zeros_like(self.row_peers)))
+            self.row_hash = np.concatenate(
+                (self.row_hash, np.zeros_like(self.row_hash)))
+            self.free_rows = list(range(2*capacity - 1, capacity - 1, -1))
+        return self.free_rows.pop()
+
+    def release_row(self, row):
+        """A peer leaves row, freed once no peer uses it."""
+        self.row_peers[row] -= 1
+        if self.row_peers[row] == 0:
+            del self.hash_row[int(self.row_hash[row])]
+            self.free_rows.append(row)
+
+    def add_block(self, block, proposer):
+        """Append a newly proposed block to the blocktree.
+        """
+        self.blockchain.append(block)
+        self.children_histogram.add_block(block)
+        if block.id >= len(self.block_parent):
+            # double the capacity
+            extra = len(self.block_parent)
+            self.block_parent = np.concatenate(
+                (self.block_parent, np.full(extra, -1, dtype=np.int64)))
+            self.settled = np.concatenate(
+                (self.settled, np.zeros(extra, dtype=bool)))
+            self.block_keys = np.concatenate(
+                (self.block_keys, self.random_keys(extra)))
+        if block.id - self.block_offset >= len(self.views):
+            self.views = np.concatenate(
+                (self.views, np.zeros((len(self.views), self.N), dtype=bool)))
+        self.block_parent[block.id] = block.parent.id
+        self.views[block.id - self.block_offset, proposer.id] = True
+        self.fingerprints[proposer.id] ^= self.block_keys[block.id]
+        self.recorder.record_block_creation(block, proposer.id, self.time)
+
+    def index_cached_attestations(self, node_id, slot_no):
+        """Record that peer node_id caches attestations waiting on a
+        block of slot slot_no, see expire_cached_attestations.
+        """
+        if self.attestation_cache_expiry is None:
+            return
+        peers = self.cache_index.get(slot_no)
+        if peers is None:
+            peers = self.cache_index[slot_no] = set()
+            heapq.heappush(self.cache_index_slots, slot_no)
+        peers.add(node_id)
+
+    def expire_cached_attestations(self):
+        """Drop the cached attestations waiting on blocks proposed more
+        than attestation_cache_expiry slots ago. Only the peers indexed
+        on such slots are visited.
+        """
+        if self.attestation_cache_expiry is None:
+            return
+        min_slot = self.slot_boundary.counter - self.attestation_cache_expiry
+        expired = set()
+        while self.cache_index_slots and self.cache_index_slots[0] < min_slot:
+            expired |= self.cache_index.pop(heapq.heappop(self.cache_index_slots))
+        for i in sorted(expired):
+            self.nodes[i].expire_cached_attestations()
+
+    def known_blocks(self, blocks, node_id):
+        """Returns a boolean array, True where blocks are known by node_id.
+        Settled blocks count as known.
+        """
+        known = self.settled[blocks]
+        live = ~known
+        known[live] = self.views[blocks[live] - self.block_offset, node_id]
+        return known
+
+    def calculate_weights(self, attestation_block):
+        """LMD weights of the finalized checkpoint and its successors,
+        weight[b - block_offset] is the weight of block b.
+        """
+        votes = attestation_block - self.block_offset
+        stake = self.stake
+        if self.block_offset > 0:
+            live = votes >= 0
+            votes = votes[live]
+            stake = stake[live]
+        return calculate_subtree_weights(
+            self.block_parent[self.block_offset:len(self.blockchain)]
+            - self.block_offset, votes, stake)
+
+    def finalize(self, checkpoint):
+        """Finalize checkpoint. The blocks conflicting with it are pruned,
+        and together with its ancestors they are dropped from node views
+        and fork choice. Model.blockchain keeps all the blocks for the
+        final metrics.
+        """
+        if checkpoint.height <= self.finalized.height:
+            return
+        if self.trace is not None:
+            self.trace.record(self.time, TRACE_FINALIZATION, block=checkpoint.id)
+        previous_offset = self.block_offset
+        # descendants of the checkpoint, parents come before children
+        live = {checkpoint}
+        for b in self.blockchain[checkpoint.id + 1:]:
+            if b.parent in live:
+                live.add(b)
+        archived = [b for b in self.blockchain[previous_offset:]
+                    if b not in live]
+        self.settled[[b.id for b in archived]] = True
+        for node in self.nodes:
+            removed = node.local_blockchain - live
+            node.local_blockchain -= removed
+            self.fingerprints[node.id] ^= np.bitwise_xor.reduce(
+                self.block_keys[[b.id for b in removed]])
+            if checkpoint not in node.local_blockchain:
+                # a lagging peer syncs to the finalized checkpoint
+                node.local_blockchain.add(checkpoint)
+                self.views[checkpoint.id - previous_offset, node.id] = True
+                self.fingerprints[node.id] ^= self.block_keys[checkpoint.id]
+                self.recorder.record_block_arrival({checkpoint}, node.id,
+                                                   self.time)
+        # drop the rows of the archived blocks from the views
+        shift = checkpoint.id - previous_offset
+        views = np.zeros_like(self.views)
+        views[:len(views) - shift] = self.views[shift:]
+        views[[b.id - checkpoint.id for b in archived
+               if b.id > checkpoint.id]] = False
+        self.views = views
+        self.recorder.archive_blocks(checkpoint.id)
+        self.block_offset = checkpoint.id
+        self.finalized = checkpoint
+        self.finalized_checkpoints.append(checkpoint)
+        self.head_cache.clear()
+        # attestations waiting for a block now settled are released
+        for node in self.nodes:
+            node.release_cached_attestations(
+                [b for b in node.cached_attestations if self.settled[b]])
+
+    def god_view_attestation_block(self):
+        """Returns the block id of the latest attestation of each validator,
+        as seen by the peer hosting it.
+        """
+        return self.table_blocks[self.table_row[self.validator_node],
+                                 np.arange(len(self.validators))]
+
+    def god_view_attestations(self):
+        """Returns the latest attestation of each validator, as seen by
+        the peer hosting it.
+        OUTPUT:
+        - attestations, dict, k: validator id, v: (Block, slot)
+        """
+        attestation_block = self.god_view_attestation_block()
+        attestation_slot = self.table_slots[self.table_row[self.validator_node],
+                                            np.arange(len(self.validators))]
+        return {v: (self.blockchain[b], s) for v, b, s in
+                zip(self.validators, attestation_block.tolist(),
+                    attestation_slot.tolist())}
+
+    def run(self, stoping_time, trace=None):
         """Method to run the model. Needs stopping time.
+        The executed events are written to trace if given, an EventTrace
+        or the path of a new one (closed at the end of the run).
         """
+        if isinstance(trace, str):
+            with EventTrace(trace, self) as trace:
+                return self.run(stoping_time, trace)
+        self.trace = trace
+        for fixed in self.fixed_events:
+            fixed.trace = trace
+        try:
+            self._run(stoping_time)
+        finally:
+            self.trace = None
+            for fixed in self.fixed_events:
+                fixed.trace = None
+            if trace is not None:
+                trace.flush()
+
+    def _run(self, stoping_time):
         while self.time < stoping_time:
             # generate next random increment time and save it in self.increment
             increment = self.gillespie.calculate_time_increment()
 
-            # loop over fixed and trigger if time passes fixed event time
-            for fixed in self.fixed_events:
-                fixed.trigger(self.time + increment)
+            next_time = self.time + increment
+            # no process can fire (e.g. every link is down or offline):
+            # only the fixed events move the time
+            idle = np.isinf(next_time)
+            if idle:
+                next_time = min([fixed.next_event for fixed in self.fixed_events])
+                if next_time > stoping_time:
+                    self.time = stoping_time
+                    break
+
+            # trigger the fixed events passed by next_time, in time order
+            while True:
+                fixed = min(self.fixed_events, key=lambda f: f.next_event)
+                if fixed.next_event > next_time:
+                    break
+                self.time = fixed.next_event
+                fixed.trigger(next_time)
 
             # select poisson process and trigger selected process
+            self.time = next_time
+            # a fixed event (e.g. a scheduled edge removal) may have
+            # stopped every process
+            if idle or self.gillespie.lambda_sum <= 0:
+                continue
             next_process = self.gillespie.select_event()
             next_process.event()
 
-            self.time += increment
-
             # to increase performance
-            flag_blocks_are_the_same = True
-            flag_attestations_are_the_same = True
-            for n in self.nodes[1:]:
-                if self.nodes[0].local_blockchain != n.local_blockchain:
-                    flag_blocks_are_the_same = False
-                    break
-                if self.nodes[0].attestations != n.attestations:
-                    flag_attestations_are_the_same = False
-                    break
-
-            if flag_blocks_are_the_same and flag_attestations_are_the_same:
-                self.time = min([fixed.next_event for fixed in self.fixed_events])
+            n_rows = len(self.blockchain) - self.block_offset
+            flag_blocks_are_the_same = (
+                (self.fingerprints == self.fingerprints[0]).all()
+                and (self.views[:n_rows] == self.views[:n_rows, :1]).all())
+            flag_attestations_are_the_same = (flag_blocks_are_the_same
+                                              and self.attestations_agree())
+
+            # churn goes on while the views agree
+            if (flag_blocks_are_the_same and flag_attestations_are_the_same
+                    and self.churn_process is None):
+                # and the leaps have nothing to merge until they differ
+                self.time = min([fixed.next_event for fixed in self.fixed_events
+                                 if fixed is not self.attestation_leap])
+                if self.attestation_leap is not None:
+                    self.attestation_leap.skip_to(self.time)
 
     def results(self):
         """This functions returns a dictionary containing the
@@ -565,17 +2394,28 @@ class Model:
         results : dictionary
         """
         # attestations from a god pov
-        # for each node we have the latest attestations issued by the node
-        god_view_attestations = {node: node.attestations[node] for node in self.validators}
+        # for each validator we have its latest attestation
+        god_view_attestations = self.god_view_attestations()
+        # the topology does not change across runs
+        if self.network_metrics is None:
+            self.network_metrics = {
+                "diameter": calculate_diameter(self.network),
+                "average_shortest_path": calculate_average_shortest_path(self.network),
+                }
 
         results_dict = {
-            "mainchain_rate": calculate_mainchain_rate(self.blockchain, god_view_attestations),
-            "branch_ratio": calculate_branch_ratio(self.blockchain, god_view_attestations),
-            "blocktree_entropy": calculate_entropy(self.blockchain),
-            "diameter": calculate_diameter(self.network),
-            "average_shortest_path": calculate_average_shortest_path(self.network),
-            "delayer_orphan_rate": calculate_delayer_orphan_rate(self.blockchain, god_view_attestations),
+            "mainchain_rate": calculate_mainchain_rate(self.blockchain, god_view_attestations, self.stake, self.finalized),
+            "branch_ratio": calculate_branch_ratio(self.blockchain, god_view_attestations, self.stake, self.finalized),
+            "blocktree_entropy": self.children_histogram.entropy(),
+            **self.network_metrics,
+            "delayer_orphan_rate": calculate_delayer_orphan_rate(self.blockchain, god_view_attestations, self.stake, self.finalized),
             }
+        results_dict.update(calculate_coverage_percentiles(
+            self.recorder.block_coverage_times(len(self.blockchain)), "block"))
+        results_dict.update(calculate_coverage_percentiles(
+            self.recorder.attestation_coverage_times(), "attestation"))
+        results_dict.update(calculate_reorg_metrics(
+            self.reorg_recorder.depth_counts, self.N, self.slot_boundary.counter))
         return results_dict
 
     def dump_blockchain_data(self, path, blockchain=None):
@@ -588,71 +2428,236 @@ class Model:
             pkl.dump(blockchain, pfile)
 
 
+# model of the ensemble runs of a worker process
+_ENSEMBLE_MODEL = None
+
+
+def _init_ensemble_worker(cls, params):
+    global _ENSEMBLE_MODEL
+    _ENSEMBLE_MODEL = cls(**params)
+
+
+def _run_ensemble_worker(seed, stoping_time):
+    return _ENSEMBLE_MODEL.run_seed(seed, stoping_time)
+
+
+def student_t_quantile(confidence, df):
+    """Two-sided quantile of the Student t distribution with df (integer)
+    degrees of freedom: P(|T| < t) = confidence.
+    The distribution function has a closed form for integer df
+    (Abramowitz and Stegun 26.7.3-4), inverted by bisection on the angle
+    theta = atan(t/sqrt(df)).
+    """
+    if df < 1 or not 0 < confidence < 1:
+        raise ValueError("df must be positive and confidence in (0, 1)")
+
+    def central_probability(theta):
+        cos2 = math.cos(theta)**2
+        if df % 2 == 1:
+            term, series = math.cos(theta), 0.
+            for k in range(1, (df - 1)//2 + 1):
+                series += term
+                term *= cos2*(2*k)/(2*k + 1)
+            return 2/math.pi*(theta + math.sin(theta)*series)
+        term, series = 1., 0.
+        for k in range(1, df//2 + 1):
+            series += term
+            term *= cos2*(2*k - 1)/(2*k)
+        return math.sin(theta)*series
+
+    low, high = 0., math.pi/2
+    for _ in range(100):
+        mid = (low + high)/2
+        if central_probability(mid) < confidence:
+            low = mid
+        else:
+            high = mid
+    return math.sqrt(df)*math.tan((low + high)/2)
+
+
+def aggregate_results(runs, confidence=0.95):
+    """Aggregate the results of repeated runs into one table.
+    Confidence intervals of the means use the Student t quantile with
+    n - 1 degrees of freedom, runs with a nan value of a metric are left
+    out for that metric.
+
+    Parameters:
+    -----------
+    runs : list
+        results dictionaries, see Model.results
+    confidence : float
+        confidence level of the intervals
+
+    Returns:
+    --------
+    table : dictionary
+        {metric: {"mean", "std", "ci_low", "ci_high", "n"}}
+    """
+    table = {}
+    for name in runs[0]:
+        values = np.array([run[name] for run in runs], dtype=np.float64)
+        values = values[~np.isnan(values)]
+        n = len(values)
+        mean = values.mean() if n > 0 else np.nan
+        std = values.std(ddof=1) if n > 1 else np.nan
+        half_width = (student_t_quantile(confidence, n - 1)*std/np.sqrt(n)
+                      if n > 1 else np.nan)
+        table[name] = {"mean": float(mean), "std": float(std),
+                       "ci_low": float(mean - half_width),
+                       "ci_high": float(mean + half_width), "n": n}
+    return table
+
+
 # FUNCTIONS
 # LMD Ghost following functions handle LMD Ghost Evaluation of Blocks
 
 
+def read_trace(path):
+    """Read an EventTrace file.
+    OUTPUT:
+    - header,   record of the HEADER_DTYPE of EventTrace
+    - records,  structured array of the TRACE_DTYPE of EventTrace
+    """
+    with open(path, "rb") as trace_file:
+        data = trace_file.read()
+    header_size = EventTrace.HEADER_DTYPE.itemsize
+    header = np.frombuffer(data[:header_size], dtype=EventTrace.HEADER_DTYPE)
+    if len(header) == 0 or header[0]["magic"] != EventTrace.MAGIC:
+        raise ValueError("{} is not an event trace".format(path))
+    if header[0]["version"] != EventTrace.VERSION:
+        raise ValueError("Unsupported trace version {}".format(
+            header[0]["version"]))
+    return header[0], np.frombuffer(data[header_size:],
+                                    dtype=EventTrace.TRACE_DTYPE)
+
+
+def replay_trace(path, model, until=np.inf):
+    """Re-apply the events of a trace to model, without drawing any random
+    number: the blocktree, the views and the attestation tables evolve
+    as in the traced run. Replay stops before the first event after until.
+    INPUT:
+    - path,     str, EventTrace file
+    - model,    Model object, freshly reset with the parameters and the
+                seed of the traced run
+    - until,    float, time up to which the trace is replayed
+    """
+    header, records = read_trace(path)
+    if (header["n_nodes"], header["n_validators"]) != (model.N,
+                                                      len(model.validators)):
+        raise ValueError("The trace was recorded on a different model")
+    records = records[:np.searchsorted(records["time"], until, side="right")]
+    nodes = model.nodes
+    # attestation gossip at the same time (a leap) reads the tables as
+    # they were at that time, see AttestationLeap
+    snapshot_time, snapshot = None, {}
+    for i, (time, kind, a, b, block) in enumerate(records.tolist()):
+        model.time = time
+        if kind == TRACE_BLOCK_GOSSIP:
+            nodes[b].update_local_blockchain(nodes[a].local_blockchain)
+        elif kind == TRACE_ATTESTATION_GOSSIP:
+            if time != snapshot_time:
+                end = i + np.searchsorted(records["time"][i:], time, side="right")
+                gossiping = records["a"][i:end][records["kind"][i:end] == kind]
+                snapshot_time, snapshot = time, {}
+                for g in np.unique(gossiping).tolist():
+                    row = model.table_row[g]
+                    snapshot[g] = (model.table_blocks[row].copy(),
+                                   model.table_slots[row].copy(),
+                                   model.row_hash[row])
+            nodes[a].gossip_attestations(nodes[b], snapshot[a])
+        elif kind == TRACE_ATTESTATION:
+            nodes[model.validator_node[a]].attest(np.array([a]), block, b)
+        elif kind == TRACE_PROPOSAL:
+            nodes[a].release_block(model.blockchain[b])
+        elif kind == TRACE_SLOT:
+            model.slot_boundary.counter = a
+            model.expire_cached_attestations()
+        elif kind == TRACE_EPOCH:
+            model.epoch_boundary.counter = a
+        elif kind == TRACE_FINALIZATION:
+            model.finalize(model.blockchain[block])
+    model.time = records["time"][-1] if len(records) else model.time
+
+
 def find_leaves_of_blockchain(blockchain):
     parent_blocks = {b.parent for b in blockchain}
     return blockchain - parent_blocks
 
 
-def stake_attestation_evaluation(node):
-    """Returns a peer stake.
+def calculate_subtree_weights(block_parent, attestation_block, stake=None):
+    """Returns the LMD weight of each block: the stake of the latest
+    attestations pointing to the block or to one of its descendants.
+
+    INPUT:
+    - block_parent,         array, index of the parent of each block, -1 for
+                            the genesis. Parents come before their children.
+    - attestation_block,    array, index of the block attested by each
+                            validator
+    - stake,                array, stake of each validator.
+                            If None, every validator has unit stake.
+    OUTPUT:
+    - weight,               list, weight[i] is the weight of block i
     """
-    return 1
+    # weight of the votes landing directly on each block
+    weight = np.bincount(attestation_block, weights=stake,
+                         minlength=len(block_parent)).tolist()
+    # diffuse the weight upward the blocktree branches, children first
+    parents = block_parent.tolist()
+    for i in range(len(parents) - 1, 0, -1):
+        if parents[i] >= 0:
+            weight[parents[i]] += weight[i]
+    return weight
 
 
-def lmd_ghost(blockchain, attestations):
-    """Returns the current head of the chain following LMD-GHOST algorithm
-    from [0].
+def calculate_blocks_weight(blocks, attestations, stake=None):
+    """Returns the LMD weight of each block in blocks.
 
-    [0]: Buterin, Vitalik, et al. "Combining GHOST and casper."arXiv preprint arXiv:2003.03052 (2020)."""
+    INPUT:
+    - blocks,       list of Block objects, closed under parenthood
+    - attestations, dict, k: validator id, v[0]: pointer to the attested block
+    - stake,        array, stake of each validator indexed by validator id.
+                    If None, every validator has unit stake.
+    OUTPUT:
+    - weight,       list, weight[i] is the weight of blocks[i]
+    """
+    # parents before children
+    ordered = sorted(blocks, key=lambda block: block.height)
+    index = {block: i for i, block in enumerate(ordered)}
+    block_parent = np.fromiter((index.get(b.parent, -1) for b in ordered),
+                               dtype=np.int64, count=len(ordered))
+    # attested block index of every latest message (-1: unknown block)
+    attested = np.fromiter((index.get(v[0], -1) for v in attestations.values()),
+                           dtype=np.int64, count=len(attestations))
+    known = attested >= 0
+    if stake is not None:
+        stake = stake[np.fromiter(attestations, dtype=np.int64,
+                                  count=len(attestations))][known]
+    weight = calculate_subtree_weights(block_parent, attested[known], stake)
+    return [weight[index[block]] for block in blocks]
+
+
+def find_lmd_ghost_head(genesis, blockchain, block_weight):
+    """Walks the blocktree from genesis, following the heaviest child
+    in blockchain until a leaf is reached.
 
-    # k:peer, v[0]: pointer to the attested block
-    attest = {k: v[0] for k, v in attestations.items()}
-    # blocks with at least one children
-    parent_blocks = {b.parent for b in blockchain if b.parent is not None}
-    # blocks with no children
-    # leaves = blockchain - parent_blocks
-    # for each leave, chain from the genesis to the leaf
-    # chains = {b: b.predecessors for b in leaves}
-    # key: block, item: list of nodes attesting to it
-    inverse_attestations = {}
-    for node, block in attest.items():
-        inverse_attestations[block] = inverse_attestations.get(block, []) + [node]
-
-    # define lambda function to return stake weight of a list of peers
-    sum_stake = lambda node_list : sum([stake_attestation_evaluation(node) for node in node_list])
-    # evaluate leaves weight
-    leaves_weight = {block: sum_stake(item) for block, item in inverse_attestations.items()}
-    # todo: check if it's correct
-    # total_leaves_weight = sum(list(leaves_weight.values()))
-    # assign weight to all blocks in the local blocktree
-    # all blocks have 0 by default
-    blocks_weight = {block: 0 for block in blockchain}
-    # attested leaves have a non-zero weight
-    blocks_weight.update(leaves_weight)
-    # diffuse the non-zero weight upward the blocktree branches
-    for leaf, leaf_weight in leaves_weight.items():
-        for block in leaf.predecessors:
-            blocks_weight[block] += leaf_weight
-    # find lmd ghost head chain
-    # continue until leaf(from local peer pow)
-    # head_chain = blockchain.genesis  # TODO: use a method of Blockchain class
-    head_chain = [block for block in blockchain if block.parent is None].pop()
+    INPUT:
+    - genesis,      Block object
+    - blockchain,   set of Block objects, the local view
+    - block_weight, function, returns the LMD weight of a block
+    """
+    head_chain = genesis
     while len([child for child in head_chain.children if child in blockchain]) > 0:
         local_children = [child for child in head_chain.children if child in blockchain]
         # pop a random item from children set
         list_head_chain = [local_children.pop()]
-        current_max = blocks_weight[list_head_chain[0]]
+        current_max = block_weight(list_head_chain[0])
         while len(local_children) > 0:
             block = local_children.pop()
             # compare children weights
-            if blocks_weight[block] > current_max:
+            if block_weight(block) > current_max:
                 list_head_chain = [block]
-                current_max = blocks_weight[block]
-            elif blocks_weight[block] == current_max:
+                current_max = block_weight(block)
+            elif block_weight(block) == current_max:
                 list_head_chain.append(block)
         # tie-breaks
         sorted(list_head_chain, key=hash)
@@ -662,19 +2667,39 @@ def lmd_ghost(blockchain, attestations):
     return head_chain
 
 
-def blockchain_to_digraph(blockchain):
-    leaves = find_leaves_of_blockchain(blockchain)
+def lmd_ghost(blockchain, attestations, stake=None, root=None):
+    """Returns the current head of the chain following LMD-GHOST algorithm
+    from [0]. The walk starts from root if given, from the genesis otherwise.
+
+    [0]: Buterin, Vitalik, et al. "Combining GHOST and casper."arXiv preprint arXiv:2003.03052 (2020)."""
 
-    d = {}
-    for leaf in leaves:
-        b = leaf
-        while b:
-            d[b] = {b.parent}
-            b = b.parent
-            if b in d.keys():
-                break
+    blocks = list(blockchain)
+    # key: block, item: stake attesting to the block or its descendants
+    blocks_weight = dict(zip(blocks,
+                             calculate_blocks_weight(blocks, attestations,
+                                                     stake)))
+    # find lmd ghost head chain
+    # continue until leaf(from local peer pow)
+    # head_chain = blockchain.genesis  # TODO: use a method of Blockchain class
+    if root is None:
+        root = [block for block in blockchain if block.parent is None].pop()
+    return find_lmd_ghost_head(root, blockchain, blocks_weight.get)
 
-    return nx.from_dict_of_dicts(d, create_using=nx.DiGraph)
+
+def blockchain_to_tree(blockchain):
+    """Export a collection of blocks to a BlockTree.
+    """
+    blocks = sorted(blockchain, key=lambda b: b.height)
+    index = {b: i for i, b in enumerate(blocks)}
+    parent = np.fromiter((index.get(b.parent, -1) for b in blocks),
+                         dtype=np.int64, count=len(blocks))
+    return BlockTree(blocks, parent)
+
+
+def blockchain_to_digraph(blockchain):
+    """networkx.DiGraph of the blocks, edges go from child to parent.
+    """
+    return blockchain_to_tree(blockchain).to_networkx()
 
 
 def get_longest_chain(blockchain):
@@ -686,7 +2711,76 @@ def get_longest_chain(blockchain):
     return bc[0]
 
 
-def calculate_mainchain_rate(blockchain, attestations):
+def get_main_chain(head):
+    """Returns the set of blocks from head back to the genesis.
+    """
+    return set(iter_chain(head))
+
+
+def is_ancestor(ancestor, block):
+    """True if ancestor is block or one of its ancestors, only the
+    chain between them is walked.
+    """
+    return get_ancestor(block, ancestor.height) is ancestor
+
+
+def iter_chain(head, stop_at=None):
+    """Yields head and its ancestors, newest first, down to the genesis
+    or to stop_at (included). Nothing is materialised, the walk stops as
+    soon as the caller does.
+
+    INPUT:
+    - head,     Block object
+    - stop_at,  Block object, ancestor of head where to stop
+    """
+    block = head
+    while block is not None:
+        yield block
+        if block is stop_at:
+            return
+        block = block.parent
+
+
+def chain_slice(head, from_slot, to_slot):
+    """Returns the blocks of the chain of head with
+    from_slot <= slot_no < to_slot, oldest first. The chain is walked
+    back only down to from_slot.
+    """
+    blocks = []
+    for block in iter_chain(head):
+        if block.slot_no < from_slot:
+            break
+        if block.slot_no < to_slot:
+            blocks.append(block)
+    blocks.reverse()
+    return blocks
+
+
+def get_ancestor(block, height):
+    """Returns the ancestor of block at the given height, None if height
+    is above the block.
+    """
+    if height > block.height:
+        return None
+    for ancestor in iter_chain(block):
+        if ancestor.height == height:
+            return ancestor
+
+
+def common_ancestor(block, other):
+    """Returns the deepest block that is an ancestor of both block and
+    other, only the chains above it are walked.
+    """
+    while block.height > other.height:
+        block = block.parent
+    while other.height > block.height:
+        other = other.parent
+    while block is not other:
+        block, other = block.parent, other.parent
+    return block
+
+
+def calculate_mainchain_rate(blockchain, attestations, stake=None, root=None):
     """Compute the ratio of blocks in the mainchain over the total
     number of blocks produced in the simulation.
 
@@ -702,12 +2796,12 @@ def calculate_mainchain_rate(blockchain, attestations):
 
     if isinstance(blockchain, list):
         blockchain = set(blockchain)
-    head_block = lmd_ghost(blockchain, attestations)
-    main_chain = head_block.predecessors
+    head_block = lmd_ghost(blockchain, attestations, stake, root)
+    main_chain = get_main_chain(head_block)
     return len(main_chain)/len(blockchain)
 
 
-def calculate_branch_ratio(blockchain, attestations):
+def calculate_branch_ratio(blockchain, attestations, stake=None, root=None):
     """Compute the branch Ratio, which measures how often forks hap-
     pen
 
@@ -729,7 +2823,7 @@ def calculate_branch_ratio(blockchain, attestations):
     #    blockchain_list = blockchain.copy()
     if isinstance(blockchain, list):
         blockchain = set(blockchain)
-    main_chain= lmd_ghost(blockchain, attestations).predecessors
+    main_chain= get_main_chain(lmd_ghost(blockchain, attestations, stake, root))
     orphan_chain = blockchain - main_chain
 
     counter = 0
@@ -745,37 +2839,44 @@ def calculate_entropy(blockchain):
     """Compute the entropy of the in-degree distribution of the blocktree
     """
     # compute the degree frequency
-    degrees = np.array([len(block.children) for block in blockchain])
-    degrees_unique, degrees_counts = np.unique(degrees, return_counts=True)
-    degrees_frequencies = degrees_counts/degrees_counts.sum()
-    tmp = 0
-    for prob in degrees_frequencies:
-        tmp -= prob*np.log(prob)
-    return tmp
+    degrees = np.fromiter((len(block.children) for block in blockchain),
+                          dtype=np.int64, count=len(blockchain))
+    return histogram_entropy(np.bincount(degrees))
+
+
+def histogram_entropy(counts):
+    """Compute the entropy of the distribution given by a histogram,
+    empty bins are skipped.
+    """
+    frequencies = counts[counts > 0]/counts.sum()
+    return -np.sum(frequencies*np.log(frequencies))
 
 
 def calculate_diameter(net):
     """Compute diameter of the p2p network
     """
+    import networkx as nx
     return nx.diameter(net.network)
 
 
 def calculate_average_shortest_path(net):
     """Compute diameter of the p2p network
     """
+    import networkx as nx
     return nx.average_shortest_path_length(net.network)
 
 
-def calculate_delayer_orphan_rate(blockchain, attestations):
+def calculate_delayer_orphan_rate(blockchain, attestations, stake=None, root=None):
     """Compute the orphan rate for blocks produced by
     delayer nodes.
     The orphan rate is defined as the number of blocks produced by delayers
-    that are orphaned over the total number of blocks produced by delayers.
+    that are orphaned over the total number of blocks produced by delayers,
+    nan if delayers produced no block.
     """
     if isinstance(blockchain, list):
         blockchain = set(blockchain)
-    head_block = lmd_ghost(blockchain, attestations)
-    main_chain = head_block.predecessors
+    head_block = lmd_ghost(blockchain, attestations, stake, root)
+    main_chain = get_main_chain(head_block)
 
     orphan_counter = 0
     block_counter = 0
@@ -786,4 +2887,55 @@ def calculate_delayer_orphan_rate(blockchain, attestations):
                 if block not in main_chain:
                     orphan_counter += 1
 
+    if block_counter == 0:
+        return np.nan
     return orphan_counter/block_counter
+
+
+def calculate_reorg_metrics(depth_counts, n_nodes, n_slots, max_bin=4):
+    """Reorg metrics from the histogram of the reorg depths of the peers.
+
+    Parameters:
+    -----------
+    depth_counts : array
+        depth_counts[d] is the number of reorgs of depth d
+    n_nodes : int
+        number of peers
+    n_slots : int
+        number of slots of the run
+    max_bin : int
+        the last bin of the histogram counts the depths >= max_bin
+
+    Returns:
+    --------
+    metrics : dictionary
+        reorg_rate (reorgs per peer per slot), reorg_depth_max and
+        reorg_depth_<d>, the number of reorgs of each depth d
+    """
+    depth_counts = np.asarray(depth_counts)
+    n_reorgs = int(depth_counts.sum())
+    metrics = {
+        "reorg_rate": n_reorgs/(n_nodes*n_slots) if n_slots > 0 else np.nan,
+        "reorg_depth_max": int(np.flatnonzero(depth_counts).max()) if n_reorgs else 0,
+        }
+    for d in range(1, max_bin):
+        metrics["reorg_depth_{}".format(d)] = int(depth_counts[d:d + 1].sum())
+    metrics["reorg_depth_{}plus".format(max_bin)] = int(depth_counts[max_bin:].sum())
+    return metrics
+
+
+def calculate_coverage_percentiles(coverage_times, name, q=(50, 90, 99)):
+    """Compute the percentiles of the time-to-full-coverage,
+    i.e. the time needed by a block or attestation to reach every node.
+
+    Returns:
+    --------
+    percentiles : dictionary
+        {name_coverage_p50: float, ...}, nan if nothing reached every node
+    """
+    if len(coverage_times) == 0:
+        values = [np.nan for _ in q]
+    else:
+        values = np.percentile(coverage_times, q)
+    return {"{}_coverage_p{}".format(name, p): float(v)
+            for p, v in zip(q, values)}
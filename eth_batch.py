@@ -0,0 +1,451 @@
+"""
+    copyright 2022 uzh
+    This file is part of ethereum-consensus-abm.
+
+    ethereum-consensus-abm is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    ethereum-consensus-abm is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public License
+    along with ethereum-consensus-abm.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import numpy as np
+from eth_base import Network
+from eth_rounds import BatchSimulation
+
+
+class BatchModel(BatchSimulation):
+    '''The exact engine (Model) simulating replicas independent runs at
+    once on the same topology. Every replica has its own Gillespie clock:
+    at each step, each replica draws the time of its next gossip event,
+    the process (block or attestation gossip) and the edge, and the
+    events of all the replicas are applied together as array operations.
+    The slot, attestation, epoch and late proposal boundaries fall at the
+    same times in every replica, replicas run their gossip events up to
+    the next boundary, then the boundary fires in all of them.
+    A replica skips to the next boundary once its peers agree on every
+    view and table, as Model does.
+
+    The state of Model gains a leading replica axis: views[r, n, b],
+    table_blocks[r, n, v] and table_slots[r, n, v] are the block view and
+    the latest messages table of peer n in replica r, attestations to
+    blocks not received yet wait in cached_block and cached_slot
+    (cached_slot is -1 if none) until the block arrives.
+
+    Differences with Model:
+    - no finality, churn, faults, edge latencies nor cache bound.
+    The replicas draw from a single random generator: replica r does not
+    reproduce a Model run, but has the same distribution.
+    results() returns one dictionary per replica.
+    '''
+
+    def __init__(self,
+                 graph=None,
+                 tau_block=None,
+                 tau_attest=None,
+                 delay_share=0,
+                 delay_time=0,
+                 stake=None,
+                 validators_per_node=1,
+                 slots_per_epoch=1,
+                 replicas=1,
+                 seed=None):
+        self.tau_block = tau_block
+        self.tau_attest = tau_attest
+        self.delay_share = delay_share
+        self.delay_time = delay_time
+        self.slots_per_epoch = slots_per_epoch
+        # set up peers
+        self.network = Network(graph)
+        self.N = len(self.network)
+        self.validators_per_node = validators_per_node
+        self.validators = list(range(self.N*self.validators_per_node))
+        self.validator_node = np.repeat(np.arange(self.N),
+                                        self.validators_per_node)
+        if stake is None:
+            self.stake = np.ones(len(self.validators))
+        else:
+            self.stake = np.asarray(stake, dtype=np.float64)
+            if self.stake.shape != (len(self.validators),):
+                raise ValueError("stake must have one entry per validator")
+        # every edge gossips blocks at rate 1/tau_block and attestations
+        # at rate 1/tau_attest
+        n_edges = len(self.network.indices)
+        self.rate = n_edges*(1/tau_block + 1/tau_attest)
+        self.p_block = (1/tau_block)/(1/tau_block + 1/tau_attest)
+        self.network_metrics = None
+        self.replicas = replicas
+        self.reset(seed)
+
+    def reset(self, seed=None, replicas=None):
+        """Reset the dynamic state for a new run of replicas replicas
+        (unchanged if None), keeping the topology.
+        """
+        if replicas is not None:
+            self.replicas = replicas
+        R = self.replicas
+        V = len(self.validators)
+        seed, key_seed = np.random.SeedSequence(seed).spawn(2)
+        self.rng = np.random.default_rng(seed)
+        self.reset_blocktrees()
+        # block_reached[r, b]: number of peers of replica r knowing block b
+        self.block_reached = np.zeros((R, 64), dtype=np.int64)
+        self.block_reached[:, 0] = self.N
+        self.table_blocks = np.zeros((R, self.N, V), dtype=np.int64)
+        self.table_slots = np.full((R, self.N, V), -1, dtype=np.int64)
+        self.cached_block = np.zeros((R, self.N, V), dtype=np.int64)
+        self.cached_slot = np.full((R, self.N, V), -1, dtype=np.int64)
+        # committee of each validator in the current epoch, see
+        # EpochBoundary
+        self.committee = np.zeros((R, V), dtype=np.int64)
+        self.is_attesting = np.ones((R, V), dtype=bool)
+        # latest attestations issued by each peer: slot, time, peers
+        # reached (arrived[r, i, n] if peer n received the ones of peer i)
+        self.issue_slot = np.full((R, self.N), -1, dtype=np.int64)
+        self.issue_time = np.full((R, self.N), np.nan)
+        self.arrived = np.zeros((R, self.N, self.N), dtype=bool)
+        self.issue_reached = np.zeros((R, self.N), dtype=np.int64)
+        self.attestation_coverage = [[] for _ in range(R)]
+        # view and table keys of the peers, xor of the random keys of the
+        # known blocks and of the (validator, block, slot) entries: the
+        # peers of a replica agree if they have the same keys
+        self.key_rng = np.random.default_rng(key_seed)
+        self.block_keys = self.random_keys(64)
+        self.slot_keys = self.random_keys(64)
+        self.validator_keys = self.random_keys(V) | np.uint64(1)
+        self.view_keys = np.full((R, self.N), self.block_keys[0])
+        self.table_keys = np.full((R, self.N), np.bitwise_xor.reduce(
+            self.entry_keys(np.arange(V), 0, -1)))
+        # peers whose head is out of date, see heads_of
+        self.stale = np.ones((R, self.N), dtype=bool)
+        self.time = 0
+        self.slot = 0
+        self.next_epoch = 0
+        self.next_slot = 0
+        self.next_attestation = 4
+        # late proposals are pending in some replicas only
+        self.next_late = np.full(R, np.inf)
+        self.late_proposer = np.zeros(R, dtype=np.int64)
+        self.active = np.zeros(R, dtype=bool)
+
+    def random_keys(self, size):
+        """Random 64-bit keys of the view and table fingerprints."""
+        return self.key_rng.integers(0, 2**64, size=size, dtype=np.uint64)
+
+    def entry_keys(self, validators, blocks, slots):
+        """Keys of the table entries (validators[i], blocks[i], slots[i])."""
+        return self.validator_keys[validators]*(
+            self.block_keys[blocks] ^ self.slot_keys[np.add(slots, 1)])
+
+    def run(self, stoping_time):
+        """Method to run the model. Needs stopping time.
+        """
+        while self.time < stoping_time:
+            self.fire_events()
+            next_event = min(self.next_epoch, self.next_slot,
+                             self.next_attestation, self.next_late.min(),
+                             stoping_time)
+            self.gossip(next_event)
+            self.time = next_event
+
+    def fire_events(self):
+        """Epoch, slot, attestation and late proposal boundaries up to the
+        current time, in the order of the fixed events of Model.
+        """
+        replicas = np.arange(self.replicas)
+        while True:
+            event_time = min(self.next_epoch, self.next_slot,
+                             self.next_attestation, self.next_late.min())
+            if event_time > self.time:
+                break
+            if event_time == self.next_epoch:
+                self.shuffle_committees()
+                self.next_epoch += 12*self.slots_per_epoch
+            elif event_time == self.next_slot:
+                self.slot += 1
+                if self.slot + 1 >= len(self.slot_keys):
+                    self.slot_keys = np.concatenate(
+                        (self.slot_keys, self.random_keys(len(self.slot_keys))))
+                self.is_attesting |= (self.committee
+                                      == self.slot % self.slots_per_epoch)
+                weights = self.stake/self.stake.sum()
+                validators = self.rng.choice(len(self.validators),
+                                             size=self.replicas, p=weights)
+                proposers = self.validator_node[validators]
+                late = self.delayer[replicas, proposers]
+                self.late_proposer[late] = proposers[late]
+                self.next_late[late] = event_time + self.delay_time
+                self.propose_blocks(replicas[~late], proposers[~late],
+                                    event_time)
+                self.next_slot += 12
+            elif event_time == self.next_attestation:
+                attesting = self.is_attesting.reshape(
+                    self.replicas, self.N, self.validators_per_node).any(axis=2)
+                self.attest(*np.nonzero(attesting), event_time)
+                self.next_attestation += 12
+            else:
+                late = np.flatnonzero(self.next_late == event_time)
+                self.next_late[late] = np.inf
+                self.propose_blocks(late, self.late_proposer[late], event_time)
+        self.active = ~self.agree(replicas)
+
+    def shuffle_committees(self):
+        """Shuffle the validators of each replica into one committee per
+        slot, the leftover validators join randomly chosen committees.
+        Disable attesters.
+        """
+        V = len(self.validators)
+        size, leftover = divmod(V, self.slots_per_epoch)
+        for r in range(self.replicas):
+            permutation = self.rng.permutation(V)
+            sizes = np.full(self.slots_per_epoch, size)
+            sizes[self.rng.permutation(self.slots_per_epoch)[:leftover]] += 1
+            self.committee[r, permutation] = np.repeat(
+                np.arange(self.slots_per_epoch), sizes)
+        self.is_attesting[:] = False
+
+    def gossip(self, end):
+        """Gossip events of the active replicas up to time end. Each
+        replica keeps its own clock, the replicas whose peers agree on
+        every view and table stop.
+        """
+        live = np.flatnonzero(self.active)
+        clock = np.full(len(live), float(self.time))
+        n_edges = len(self.network.indices)
+        while len(live) > 0:
+            clock += self.rng.exponential(1/self.rate, size=len(live))
+            running = clock < end
+            live, clock = live[running], clock[running]
+            if len(live) == 0:
+                break
+            blocks = self.rng.random(len(live)) < self.p_block
+            edges = self.rng.integers(n_edges, size=len(live))
+            gossiping = self.network.sources[edges]
+            listening = self.network.indices[edges]
+            self.gossip_blocks(live[blocks], gossiping[blocks],
+                               listening[blocks], clock[blocks])
+            self.gossip_attestations(live[~blocks], gossiping[~blocks],
+                                     listening[~blocks], clock[~blocks])
+            agree = self.agree(live)
+            self.active[live[agree]] = False
+            live, clock = live[~agree], clock[~agree]
+
+    def agree(self, replicas):
+        """True for the replicas whose peers agree on every view and
+        table."""
+        view_keys = self.view_keys[replicas]
+        table_keys = self.table_keys[replicas]
+        return ((view_keys == view_keys[:, :1]).all(axis=1)
+                & (table_keys == table_keys[:, :1]).all(axis=1))
+
+    def gossip_blocks(self, replicas, gossiping, listening, times):
+        """gossiping[i] sends its blocks to listening[i] in replicas[i]
+        at times[i]. Attesting peers attest once the block of the current
+        slot arrives.
+        """
+        if len(replicas) == 0:
+            return
+        n_blocks = self.n_blocks[replicas].max()
+        views = self.views[replicas, listening, :n_blocks]
+        new = self.views[replicas, gossiping, :n_blocks] & ~views
+        received = new.any(axis=1)
+        if received.any():
+            r, n, new = replicas[received], listening[received], new[received]
+            self.views[r, n, :n_blocks] = views[received] | new
+            self.view_keys[r, n] ^= np.bitwise_xor.reduce(
+                np.where(new, self.block_keys[:n_blocks], np.uint64(0)), axis=1)
+            self.stale[r, n] = True
+            # coverage, each replica is in replicas at most once
+            self.block_reached[r, :n_blocks] += new
+            covered = new & (self.block_reached[r, :n_blocks] == self.N)
+            rows, blocks = np.nonzero(covered)
+            self.block_covered[r[rows], blocks] = times[received][rows]
+            self.release_cached_attestations(r, n)
+        # blocks of the current slot are the last ones created
+        current = (self.views[replicas, listening, :n_blocks]
+                   & (self.block_slot[replicas, :n_blocks] == self.slot)).any(axis=1)
+        attesting = self.is_attesting[
+            replicas[:, None], listening[:, None]*self.validators_per_node
+            + np.arange(self.validators_per_node)].any(axis=1)
+        attest = current & attesting
+        if attest.any():
+            self.attest(replicas[attest], listening[attest], times[attest])
+
+    def release_cached_attestations(self, replicas, peers):
+        """Apply the cached attestations of peers[i] in replicas[i]
+        waiting on the blocks just received."""
+        cached_slot = self.cached_slot[replicas, peers]
+        waiting = cached_slot >= 0
+        if not waiting.any():
+            return
+        cached_block = self.cached_block[replicas, peers]
+        ready = waiting & self.views[replicas[:, None], peers[:, None],
+                                     cached_block]
+        if not ready.any():
+            return
+        newer = ready & (cached_slot > self.table_slots[replicas, peers])
+        self.write_attestations(replicas, peers, newer, cached_block,
+                                cached_slot)
+        cached_slot[ready] = -1
+        self.cached_slot[replicas, peers] = cached_slot
+
+    def gossip_attestations(self, replicas, gossiping, listening, times):
+        """gossiping[i] sends its latest messages table to listening[i] in
+        replicas[i] at times[i]. Entries of a newer slot, or of the same
+        slot and a different block, replace the listener ones, entries
+        attesting blocks the listener has not received are cached.
+        """
+        if len(replicas) == 0:
+            return
+        blocks = self.table_blocks[replicas, gossiping]
+        slots = self.table_slots[replicas, gossiping]
+        local_slots = self.table_slots[replicas, listening]
+        newer = slots > local_slots
+        candidates = newer | ((slots == local_slots)
+                              & (blocks != self.table_blocks[replicas, listening]))
+        rows = candidates.any(axis=1)
+        if not rows.any():
+            return
+        r, n, times = replicas[rows], listening[rows], times[rows]
+        blocks, slots = blocks[rows], slots[rows]
+        newer, candidates = newer[rows], candidates[rows]
+        known = self.views[r[:, None], n[:, None], blocks]
+        # first arrival of a newer attestation
+        cached_slot = self.cached_slot[r, n]
+        arrived = newer & (slots > cached_slot)
+        self.record_arrivals(r, n, arrived, slots, times)
+        cached = arrived & ~known
+        if cached.any():
+            self.cached_block[r, n] = np.where(cached, blocks,
+                                               self.cached_block[r, n])
+            self.cached_slot[r, n] = np.where(cached, slots, cached_slot)
+        self.write_attestations(r, n, candidates & known, blocks, slots)
+
+    def write_attestations(self, replicas, peers, entries, blocks, slots):
+        """Write the entries (mask) of the tables of peers[i] in
+        replicas[i], updating their keys. Each (replica, peer) pair
+        appears once.
+        """
+        rows = entries.any(axis=1)
+        if not rows.any():
+            return
+        replicas, peers, entries = replicas[rows], peers[rows], entries[rows]
+        blocks = np.broadcast_to(blocks, rows.shape + entries.shape[1:])[rows]
+        slots = np.broadcast_to(slots, rows.shape + entries.shape[1:])[rows]
+        old_blocks = self.table_blocks[replicas, peers]
+        old_slots = self.table_slots[replicas, peers]
+        new_blocks = np.where(entries, blocks, old_blocks)
+        new_slots = np.where(entries, slots, old_slots)
+        validators = np.arange(len(self.validators))
+        change = (self.entry_keys(validators, old_blocks, old_slots)
+                  ^ self.entry_keys(validators, new_blocks, new_slots))
+        self.table_keys[replicas, peers] ^= np.bitwise_xor.reduce(change, axis=1)
+        self.table_blocks[replicas, peers] = new_blocks
+        self.table_slots[replicas, peers] = new_slots
+        self.stale[replicas, peers] = True
+
+    def record_arrivals(self, replicas, peers, arrived, slots, times):
+        """Record the first arrival at peers[i] of the latest attestations
+        of the other peers, arrived being the mask of the entries of a
+        newer slot, see PropagationRecorder."""
+        issuers = self.validator_node
+        latest = arrived & (slots == self.issue_slot[replicas][:, issuers])
+        latest = latest.reshape(len(replicas), self.N,
+                                self.validators_per_node).any(axis=2)
+        new = latest & ~self.arrived[replicas, :, peers]
+        if not new.any():
+            return
+        self.arrived[replicas, :, peers] = self.arrived[replicas, :, peers] | new
+        self.issue_reached[replicas] += new
+        rows, issuers = np.nonzero(new & (self.issue_reached[replicas] == self.N))
+        for r, t in zip(replicas[rows].tolist(),
+                        (times[rows] - self.issue_time[replicas[rows], issuers]).tolist()):
+            self.attestation_coverage[r].append(t)
+
+    def attest(self, replicas, peers, times):
+        """The attesting validators hosted by peers[i] in replicas[i]
+        attest to the head of its view at times[i]."""
+        if len(replicas) == 0:
+            return
+        heads = self.heads_of(replicas, peers)
+        hosted = (peers[:, None]*self.validators_per_node
+                  + np.arange(self.validators_per_node))
+        # only the entries which change are written
+        rows = np.arange(len(peers))[:, None]
+        entries = np.zeros((len(peers), len(self.validators)), dtype=bool)
+        entries[rows, hosted] = (
+            self.is_attesting[replicas[:, None], hosted]
+            & ((self.table_blocks[replicas[:, None], peers[:, None], hosted]
+                != heads[:, None])
+               | (self.table_slots[replicas[:, None], peers[:, None], hosted]
+                  != self.slot)))
+        self.write_attestations(replicas, peers, entries, heads[:, None],
+                                self.slot)
+        # a new slot starts a new coverage record
+        times = np.broadcast_to(times, replicas.shape)
+        new = self.issue_slot[replicas, peers] != self.slot
+        if not new.any():
+            return
+        replicas, peers = replicas[new], peers[new]
+        self.issue_slot[replicas, peers] = self.slot
+        self.issue_time[replicas, peers] = times[new]
+        self.arrived[replicas, peers] = False
+        self.arrived[replicas, peers, peers] = True
+        self.issue_reached[replicas, peers] = 1
+        if self.N == 1:
+            for r in replicas.tolist():
+                self.attestation_coverage[r].append(0.)
+
+    def heads_of(self, replicas, peers):
+        """Heads of peers[i] in replicas[i]. The fork choice only runs for
+        the peers whose view or table changed since their last head,
+        head changes are counted by observe_heads.
+        """
+        stale = self.stale[replicas, peers]
+        if stale.any():
+            r, n = replicas[stale], peers[stale]
+            self.observe_heads(r, n, self.fork_choice(r, n))
+            self.stale[r, n] = False
+        return self.heads[replicas, peers]
+
+    def propose_blocks(self, replicas, proposers, event_time):
+        """proposers[i] proposes a block in replica replicas[i]."""
+        if len(replicas) == 0:
+            return
+        heads = self.heads_of(replicas, proposers)
+        block_ids = self.add_blocks(replicas, heads, proposers, event_time)
+        self.view_keys[replicas, proposers] ^= self.block_keys[block_ids]
+        self.block_reached[replicas, block_ids] = 1
+        if self.N == 1:
+            self.block_covered[replicas, block_ids] = event_time
+        self.stale[replicas, proposers] = True
+
+    def _grow_blocks(self):
+        capacity = self.views.shape[2]
+        super()._grow_blocks()
+        block_reached = np.zeros((self.replicas, 2*capacity), dtype=np.int64)
+        block_reached[:, :capacity] = self.block_reached
+        self.block_reached = block_reached
+        self.block_keys = np.concatenate((self.block_keys,
+                                          self.random_keys(capacity)))
+
+    def rank_blocks(self, block_ids):
+        """Fork-choice ranks of new blocks, drawn at random: Model breaks
+        ties in the iteration order of the children sets, fixed for a
+        block but unrelated to its id.
+        """
+        return self.rng.random(len(block_ids))
+
+    def vote_blocks(self, replicas, peers):
+        return self.table_blocks[replicas, peers]
+
+    def replica_attestations(self, r):
+        validators = np.arange(len(self.validators))
+        return (self.table_blocks[r, self.validator_node, validators],
+                self.table_slots[r, self.validator_node, validators])
@@ -0,0 +1,106 @@
+"""
+    copyright 2022 uzh
+    This file is part of ethereum-consensus-abm.
+
+    ethereum-consensus-abm is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    ethereum-consensus-abm is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public License
+    along with ethereum-consensus-abm.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+
+# modules whose logic determines the results of a run, ethereum_abm.py
+# maps the parameters to the model arguments and builds the topology
+MODEL_MODULES = ["eth_base.py", "eth_rounds.py", "eth_parallel.py",
+                 "ethereum_abm.py"]
+
+
+def model_version(modules=MODEL_MODULES):
+    """Hash of the syntax trees of the model modules. Comments and
+    formatting do not change it, any change of the code does.
+    """
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        with open(os.path.join(directory, module)) as source:
+            digest.update(ast.dump(ast.parse(source.read())).encode())
+    return digest.hexdigest()
+
+
+def result_key(parameters, seed, version):
+    """Content address of a run: hash of the parameters, the seed and the
+    model version.
+    """
+    content = json.dumps([parameters, seed, version], sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ResultCache:
+    """Results of the runs of run_simulation, stored in a sqlite file and
+    keyed by result_key. Entries of other model versions are dropped when
+    the cache is opened.
+    INPUT:
+    - path,     str, sqlite file, created if missing
+    - version,  str, model version, model_version() if None
+    """
+
+    def __init__(self, path, version=None):
+        self.path = path
+        self.version = model_version() if version is None else version
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, version TEXT, results TEXT)")
+            self.connection.execute(
+                "DELETE FROM results WHERE version != ?", (self.version,))
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, parameters, seed):
+        """Returns the cached results of the run, None if missing."""
+        row = self.connection.execute(
+            "SELECT results FROM results WHERE key = ?",
+            (result_key(parameters, seed, self.version),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, parameters, seed, results):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                (result_key(parameters, seed, self.version), self.version,
+                 json.dumps(results)))
+
+    def stats(self):
+        """Returns hits, misses, hit rate and number of stored runs.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits/lookups if lookups else float("nan"),
+            "size": len(self),
+            }
+
+    def close(self):
+        self.connection.close()
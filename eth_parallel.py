@@ -0,0 +1,656 @@
+"""
+    copyright 2022 uzh
+    This file is part of ethereum-consensus-abm.
+
+    ethereum-consensus-abm is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    ethereum-consensus-abm is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public License
+    along with ethereum-consensus-abm.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import math
+import numpy as np
+from eth_base import (AliasTable, Block, AttestationGossipProcess,
+                      BlockGossipProcess, ChildrenHistogram, EpochBoundary,
+                      Gillespie, Model, Network, PropagationRecorder,
+                      SharedTopology, Simulation, calculate_mainchain_rate,
+                      calculate_branch_ratio, calculate_diameter,
+                      calculate_average_shortest_path,
+                      calculate_delayer_orphan_rate,
+                      calculate_coverage_percentiles,
+                      calculate_reorg_metrics)
+from eth_rounds import RoundPeer
+
+
+def partition_network(network, n_parts, labels=None):
+    """Split the peers into n_parts parts of about the same size, with
+    few edges between the parts.
+    If labels are given (e.g. the blocks of a SBM), whole communities are
+    assigned to parts, the largest first to the smallest part. Otherwise
+    the peers are ordered by a breadth-first search started far from the
+    peer 0, and the order is cut into n_parts contiguous chunks.
+    INPUT:
+    - network,  Network object
+    - labels,   array, community of each peer
+    OUTPUT:
+    - part,     array, part of each peer
+    """
+    N = len(network)
+    if not 0 < n_parts <= N:
+        raise ValueError("n_parts must be between 1 and the number of peers")
+    if labels is not None and len(np.unique(labels)) >= n_parts:
+        communities, sizes = np.unique(labels, return_counts=True)
+        part_size = np.zeros(n_parts, dtype=np.int64)
+        community_part = {}
+        for c in np.argsort(-sizes, kind="stable"):
+            community_part[communities[c]] = part_size.argmin()
+            part_size[community_part[communities[c]]] += sizes[c]
+        return np.array([community_part[label] for label in labels],
+                        dtype=np.int64)
+    # the last peer reached from peer 0 is on the periphery
+    order = _breadth_first_order(network, _breadth_first_order(network, 0)[-1])
+    part = np.empty(N, dtype=np.int64)
+    part[order] = np.arange(N)*n_parts//N
+    return part
+
+
+def _breadth_first_order(network, source):
+    """Peers in breadth-first order from source, the other connected
+    components follow.
+    """
+    N = len(network)
+    seen = np.zeros(N, dtype=bool)
+    order = []
+    for start in [source] + list(range(N)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        order.append(start)
+        i = len(order) - 1
+        while i < len(order):
+            neighbors = network.neighbors(order[i])
+            neighbors = neighbors[~seen[neighbors]]
+            seen[neighbors] = True
+            order.extend(neighbors.tolist())
+            i += 1
+    return np.array(order, dtype=np.int64)
+
+
+class PartitionRecorder(PropagationRecorder):
+    """Recorder of a partition worker, arrivals happen at its own peers
+    only. The attestations of a peer of another partition are tracked
+    from their first arrival. The times at which all the own peers
+    received an attestation are logged in covered, and combined over the
+    partitions by ParallelModel.
+    INPUT:
+    - n_nodes,  int, number of peers
+    - n_own,    int, number of peers of the partition
+    """
+
+    def __init__(self, n_nodes, n_own):
+        super().__init__(n_nodes)
+        self.n_own = n_own
+        # (issuer, slot): time of issue, of coverage of the partition
+        self.issued = {}
+        self.covered = {}
+
+    def record_attestation_issue(self, node_id, slot, time):
+        if self.attestation_slot[node_id] != slot:
+            self.issued[(node_id, slot)] = time
+        super().record_attestation_issue(node_id, slot, time)
+
+    def record_attestation_arrivals(self, issuers, slots, node_id, time):
+        slots = np.broadcast_to(slots, issuers.shape)
+        new = self.attestation_slot[issuers] < slots
+        if new.any():
+            self.attestation_slot[issuers[new]] = slots[new]
+            self.attestation_arrival[issuers[new]] = np.nan
+            self.attestation_reached[issuers[new]] = 0
+        issuers = issuers[self.attestation_slot[issuers] == slots]
+        issuers = np.unique(issuers)
+        issuers = issuers[np.isnan(self.attestation_arrival[issuers, node_id])]
+        if len(issuers) == 0:
+            return
+        self.attestation_arrival[issuers, node_id] = time
+        self.attestation_reached[issuers] += 1
+        for m in issuers[self.attestation_reached[issuers] == self.n_own]:
+            self.covered[(int(m), int(self.attestation_slot[m]))] = time
+
+
+class PartitionWorker:
+    """Simulates the peers of one partition on a full Model. Only the
+    gossip over the edges inside the partition is sampled. Slot events
+    and the schedule of the gossip over the edges between partitions are
+    commands of ParallelModel, see window.
+    The peers of the other partitions are never simulated: the Model
+    copy of a remote peer holds its blocks and latest messages as of its
+    last message to this partition, which are sent as deltas over links.
+    INPUT:
+    - params,       dict, keyword arguments of Model
+    - part,         array, part of each peer
+    - partition,    int, the partition simulated
+    - links,        dict, Connection to the worker of each other partition
+    """
+
+    def __init__(self, params, part, partition, links=None):
+        self.model = Model(**params)
+        model = self.model
+        self.part = part
+        self.partition = partition
+        self.links = links or {}
+        self.own = np.flatnonzero(part == partition)
+        self.own_validators = np.flatnonzero(part[model.validator_node] == partition)
+        # directed edges with both peers in the partition
+        network = model.network
+        sources = np.repeat(np.arange(model.N), np.diff(network.indptr))
+        inner = (part[sources] == partition) & (part[network.indices] == partition)
+        indptr = np.zeros(model.N + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(sources[inner], minlength=model.N))
+        self.inner = Network.from_csr(
+            indptr, network.indices[inner],
+            None if network.latencies is None else network.latencies[inner])
+
+    def reset(self, seed, delayers):
+        model = self.model
+        model.reset(seed)
+        for node in model.nodes:
+            node.delayer = False
+        for i in delayers:
+            model.nodes[i].delayer = True
+        model.recorder = PartitionRecorder(model.N, len(self.own))
+        model.recorder.record_block_creation(model.blockchain[0], 0, model.time)
+        model.recorder.block_arrival[0] = model.time
+        # (peer, partition): blocks and latest messages of the own peer
+        # as of its last message to the partition, see export_delta
+        self.sent_blocks = {}
+        self.sent_table = {}
+        self.initial_table = (model.nodes[0].attestation_block.copy(),
+                              model.nodes[0].attestation_slot.copy())
+        self.gillespie = None
+        if len(self.inner.indices) > 0:
+            self.gillespie = Gillespie(
+                [BlockGossipProcess(model.tau_block, self.inner, model.nodes,
+                                    model.rng),
+                 AttestationGossipProcess(model.tau_attest, self.inner,
+                                          model.nodes, model.rng)],
+                model.rng)
+
+    def agree(self):
+        """True if all the own peers have the same view."""
+        model = self.model
+        own = self.own
+        n_rows = len(model.blockchain) - model.block_offset
+        return ((model.fingerprints[own] == model.fingerprints[own[0]]).all()
+                and (model.views[:n_rows, own] == model.views[:n_rows, own[:1]]).all()
+                and (model.table_row[own] == model.table_row[own[0]]).all())
+
+    def advance(self, time):
+        """Simulate the gossip inside the partition up to time. The
+        exponential waiting time crossing time is dropped, which is exact
+        as the gossip processes are memoryless.
+        """
+        model = self.model
+        while self.gillespie is not None and not self.agree():
+            next_time = model.time + self.gillespie.calculate_time_increment()
+            if next_time >= time:
+                break
+            model.time = next_time
+            self.gillespie.select_event().event()
+        model.time = time
+
+    def epoch(self):
+        self.model.is_attesting[:] = False
+
+    def slot(self, counter, committee):
+        model = self.model
+        model.slot_boundary.counter = counter
+        model.is_attesting[committee] = True
+        model.expire_cached_attestations()
+
+    def propose(self, node_id):
+        """The peer node_id proposes a block, returns the parent id."""
+        self.model.nodes[node_id].propose_block()
+        return self.model.blockchain[-1].parent.id
+
+    def mirror(self, block_id, parent_id, slot, emitter):
+        """Append a block proposed in another partition to the blocktree."""
+        model = self.model
+        proposer = model.nodes[emitter]
+        model.add_block(Block(emitter=proposer,
+                              parent=model.blockchain[parent_id],
+                              slot_no=slot, id=block_id), proposer)
+
+    def attest(self):
+        model = self.model
+        validators = self.own_validators[model.is_attesting[self.own_validators]]
+        for i in np.unique(model.validator_node[validators]):
+            model.nodes[i].issue_attestation()
+
+    def export_blocks(self, node_id):
+        model = self.model
+        n_rows = len(model.blockchain) - model.block_offset
+        return np.flatnonzero(model.views[:n_rows, node_id]) + model.block_offset
+
+    def export_delta(self, kind, node_id, partition):
+        """Blocks (kind 0) or latest messages (kind 1) of the own peer
+        node_id changed since its last message of that kind to partition.
+        OUTPUT:
+        - delta,    array of block ids, or (validators, blocks, slots)
+        """
+        key = (node_id, partition)
+        if kind == 0:
+            blocks = self.export_blocks(node_id)
+            new = np.setdiff1d(blocks, self.sent_blocks.get(key, [0]),
+                               assume_unique=True)
+            self.sent_blocks[key] = blocks
+            return new
+        node = self.model.nodes[node_id]
+        blocks, slots = node.attestation_block, node.attestation_slot
+        sent_block, sent_slot = self.sent_table.get(key, self.initial_table)
+        validators = np.flatnonzero((blocks != sent_block) | (slots != sent_slot))
+        self.sent_table[key] = (blocks.copy(), slots.copy())
+        return validators, blocks[validators], slots[validators]
+
+    def receive_delta(self, kind, gossiping, listening, delta):
+        """Apply the delta of the remote peer gossiping to its copy, which
+        then gossips to the own peer listening as in Model."""
+        model = self.model
+        node = model.nodes[gossiping]
+        if kind == 0:
+            if len(delta) > 0:
+                node.update_local_blockchain({model.blockchain[b]
+                                              for b in delta.tolist()})
+            node.gossip(model.nodes[listening])
+        else:
+            validators, blocks, slots = delta
+            if len(validators) > 0:
+                model.write_attestations(gossiping, validators, blocks, slots)
+            node.gossip_attestations(model.nodes[listening])
+
+    def window(self, times, kinds, gossiping, listening):
+        """Run the gossip events over the edges between partitions of a
+        window, sorted by time, involving the partition. The own peer of
+        each event sends its delta to the other partition at its time, or
+        waits for it, simulating the inner gossip in between. The other
+        partitions are only waited for at the events they share.
+        """
+        for time, kind, g, l in zip(times.tolist(), kinds.tolist(),
+                                    gossiping.tolist(), listening.tolist()):
+            self.advance(time)
+            if self.part[g] == self.partition:
+                self.links[self.part[l]].send(
+                    self.export_delta(kind, g, self.part[l]))
+            else:
+                self.receive_delta(kind, g, l, self.links[self.part[g]].recv())
+
+    def results(self):
+        model = self.model
+        recorder = model.recorder
+        n_blocks = len(model.blockchain)
+        validators = self.own_validators
+        rows = model.table_row[model.validator_node[validators]]
+        return {
+            "own": self.own,
+            "block_created": recorder.block_created[:n_blocks],
+            "block_arrival": recorder.block_arrival[:n_blocks][:, self.own],
+            "issued": recorder.issued,
+            "covered": recorder.covered,
+            "validators": validators,
+            "attestation_block": model.table_blocks[rows, validators],
+            "attestation_slot": model.table_slots[rows, validators],
+            # only the own peers run fork choice in the partition
+            "reorg_depths": model.reorg_recorder.depth_counts,
+            }
+
+
+def _partition_worker(connection, params, part, partition, links):
+    """Process loop of a PartitionWorker. Messages are (time, command,
+    args, reply): the worker advances to time, runs the command and sends
+    its output back if reply.
+    """
+    worker = PartitionWorker(params, part, partition, links)
+    while True:
+        time, command, args, reply = connection.recv()
+        if command == "stop":
+            break
+        if time is not None:
+            worker.advance(time)
+        output = getattr(worker, command)(*args)
+        if reply:
+            connection.send(output)
+    connection.close()
+
+
+class ParallelModel(Simulation):
+    '''Model spread over processes, conservative parallel discrete-event
+    simulation. The peers are split into partitions (see
+    partition_network), each simulated by a PartitionWorker process on
+    the topology in shared memory.
+    The gossip events over the edges between partitions are Poisson
+    processes independent of the state: the coordinator samples all of
+    them up to the next slot, attestation, epoch or late proposal
+    boundary in advance, and sends each worker the schedule of the
+    events of its peers (see PartitionWorker.window). The workers run
+    the window in parallel: at an event the partition of the gossiping
+    peer sends the changes of its blocks or latest messages since its
+    last message to the other partition straight to that worker, which
+    waits for them only when it reaches the event. The coordinator then
+    broadcasts the boundary. The dynamics are the ones of Model, runs
+    match in distribution.
+    The coordinator waits on the workers once per proposal, the workers
+    on each other at the events they share, hence the engine pays off
+    with several cores and few edges between partitions. On one core it
+    is about 1.6x slower than Model on a 16-peer SBM ensemble.
+    Finality and tau-leaping are not supported. Edge latencies are, the
+    edges between partitions are drawn proportionally to their rates.
+    INPUT:
+    - partitions,   int, number of worker processes
+    - partition,    array, part of each peer. If None, the "block"
+                    attribute of the graph nodes (SBM) is used if present
+    '''
+
+    def __init__(self,
+                 graph=None,
+                 tau_block=None,
+                 tau_attest=None,
+                 delay_share=0,
+                 delay_time=0,
+                 stake=None,
+                 validators_per_node=1,
+                 slots_per_epoch=1,
+                 attestation_cache_expiry=None,
+                 edge_latency=None,
+                 partitions=2,
+                 partition=None,
+                 seed=None):
+        import multiprocessing
+        self.tau_block = tau_block
+        self.tau_attest = tau_attest
+        self.delay_share = delay_share
+        self.delay_time = delay_time
+        self.slots_per_epoch = slots_per_epoch
+        # edge_latency scales the gossip latency of each edge, see Network
+        self.network = Network(graph, edge_latency)
+        self.N = len(self.network)
+        self.validators_per_node = validators_per_node
+        self.validators = list(range(self.N*self.validators_per_node))
+        self.validator_node = np.repeat(np.arange(self.N),
+                                        self.validators_per_node)
+        if stake is None:
+            self.stake = np.ones(len(self.validators))
+        else:
+            self.stake = np.asarray(stake, dtype=np.float64)
+            if self.stake.shape != (len(self.validators),):
+                raise ValueError("stake must have one entry per validator")
+        if partition is None:
+            labels = None
+            if not isinstance(graph, SharedTopology):
+                blocks = [data.get("block") for _, data in graph.nodes(data=True)]
+                if None not in blocks:
+                    labels = np.array(blocks)
+            partition = partition_network(self.network, partitions, labels)
+        self.part = np.asarray(partition, dtype=np.int64)
+        self.partitions = self.part.max() + 1
+        if len(np.unique(self.part)) != self.partitions:
+            raise ValueError("every partition must have a peer")
+        # directed edges between partitions
+        sources = np.repeat(np.arange(self.N), np.diff(self.network.indptr))
+        cross = self.part[sources] != self.part[self.network.indices]
+        self.cross_sources = sources[cross]
+        self.cross_targets = self.network.indices[cross]
+        self.cross_alias_table = None
+        self.cross_rate_sum = len(self.cross_sources)
+        if self.network.latencies is not None and cross.any():
+            rates = 1/self.network.latencies[cross]
+            self.cross_alias_table = AliasTable(rates)
+            self.cross_rate_sum = rates.sum()
+        self.network_metrics = None
+        # workers build their Model on the topology in shared memory
+        self.topology = graph
+        if not isinstance(graph, SharedTopology):
+            self.topology = SharedTopology(self.network.indptr,
+                                           self.network.indices)
+        params = dict(graph=self.topology, tau_block=tau_block,
+                      tau_attest=tau_attest, stake=stake,
+                      validators_per_node=validators_per_node,
+                      slots_per_epoch=slots_per_epoch,
+                      attestation_cache_expiry=attestation_cache_expiry,
+                      edge_latency=self.network.latencies)
+        # links[p][q]: pipe between the workers of partitions p and q
+        links = [{} for p in range(self.partitions)]
+        for p in range(self.partitions):
+            for q in range(p + 1, self.partitions):
+                links[p][q], links[q][p] = multiprocessing.Pipe()
+        self.connections = []
+        self.workers = []
+        for p in range(self.partitions):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=_partition_worker,
+                args=(worker_connection, params, self.part, p, links[p]),
+                daemon=True)
+            worker.start()
+            self.connections.append(connection)
+            self.workers.append(worker)
+        self.reset(seed)
+
+    def post(self, partition, command, *args):
+        """Send a command to a worker, to run at the current time."""
+        self.connections[partition].send((self.time, command, args, False))
+
+    def call(self, partition, command, *args):
+        """Run a command on a worker at the current time, returns its
+        output."""
+        self.connections[partition].send((self.time, command, args, True))
+        return self.connections[partition].recv()
+
+    def broadcast(self, command, *args):
+        for p in range(self.partitions):
+            self.post(p, command, *args)
+
+    def reset(self, seed=None):
+        """Reset the dynamic state of the coordinator and of the
+        workers for a new run, keeping the topology and the workers.
+        """
+        seeds = np.random.SeedSequence(seed).spawn(self.partitions + 1)
+        self.rng = np.random.default_rng(seeds[0])
+        self.time = 0
+        self.delayer = np.zeros(self.N, dtype=bool)
+        if self.delay_share > 0:
+            self.delayer[self.rng.choice(self.N, size=math.floor(self.N*self.delay_share))] = True
+        self.peers = [RoundPeer(i, d) for i, d in enumerate(self.delayer.tolist())]
+        delayers = np.flatnonzero(self.delayer)
+        for p in range(self.partitions):
+            self.connections[p].send((None, "reset", (seeds[p + 1], delayers),
+                                      False))
+        self.blockchain = [Block()]
+        self.children_histogram = ChildrenHistogram()
+        self.children_histogram.add_block(self.blockchain[0])
+        self.is_attesting = np.ones(len(self.validators), dtype=bool)
+        self.epoch_boundary = EpochBoundary(slot_interval=12,
+                                            validators=self.validators,
+                                            slots_per_epoch=self.slots_per_epoch,
+                                            is_attesting=self.is_attesting,
+                                            rng=self.rng)
+        self.slot = 0
+        self.next_slot = 0
+        self.next_attestation = 4
+        self.next_late = np.inf
+        self.late_proposer = None
+        self.cross_rates = (self.cross_rate_sum/self.tau_block,
+                            self.cross_rate_sum/self.tau_attest)
+        self.next_cross = [self.rng.exponential(1/rate) if rate > 0 else np.inf
+                           for rate in self.cross_rates]
+
+    def run(self, stoping_time):
+        """Method to run the model. Needs stopping time.
+        """
+        while True:
+            # boundaries come first on ties, as in Model.run
+            events = (self.epoch_boundary.next_event, self.next_slot,
+                      self.next_attestation, self.next_late)
+            event = int(np.argmin(events))
+            self.cross_gossip(min(events[event], stoping_time))
+            if events[event] >= stoping_time:
+                break
+            self.time = events[event]
+            # every partition can simulate up to the event
+            self.broadcast("advance", self.time)
+            if event == 0:
+                self.epoch_boundary.trigger(self.time)
+                self.broadcast("epoch")
+            elif event == 1:
+                self.start_slot()
+            elif event == 2:
+                self.broadcast("attest")
+                self.next_attestation += 12
+            else:
+                self.propose(self.late_proposer)
+                self.next_late = np.inf
+        self.time = max(self.time, stoping_time)
+        self.broadcast("advance", self.time)
+
+    def start_slot(self):
+        """Slot boundary, see SlotBoundary."""
+        self.slot += 1
+        committee = self.epoch_boundary.committee(self.slot % self.slots_per_epoch)
+        self.is_attesting[committee] = True
+        self.broadcast("slot", self.slot, committee)
+        validator = self.rng.choice(len(self.validators),
+                                    p=self.stake/self.stake.sum())
+        proposer = self.validator_node[validator]
+        if self.delayer[proposer]:
+            self.late_proposer = proposer
+            self.next_late = self.next_slot + self.delay_time
+        else:
+            self.propose(proposer)
+        self.next_slot += 12
+
+    def propose(self, proposer):
+        """The block is made by the worker of the proposer, and appended
+        to the blocktree of the others."""
+        owner = self.part[proposer]
+        parent_id = self.call(owner, "propose", proposer)
+        block = Block(emitter=self.peers[proposer],
+                      parent=self.blockchain[parent_id],
+                      slot_no=self.slot, id=len(self.blockchain))
+        self.blockchain.append(block)
+        self.children_histogram.add_block(block)
+        for p in range(self.partitions):
+            if p != owner:
+                self.post(p, "mirror", block.id, parent_id, self.slot, proposer)
+
+    def cross_gossip(self, end):
+        """Draw the gossip of blocks (kind 0) and attestations (kind 1)
+        over the edges between partitions up to end, each edge drawn
+        proportionally to its rate, and post to each worker the events of
+        its peers as a window."""
+        times, kinds = [], []
+        for kind, rate in enumerate(self.cross_rates):
+            while self.next_cross[kind] < end:
+                times.append(self.next_cross[kind])
+                kinds.append(kind)
+                self.next_cross[kind] += self.rng.exponential(1/rate)
+        if not times:
+            return
+        order = np.argsort(times)
+        times, kinds = np.array(times)[order], np.array(kinds)[order]
+        if self.cross_alias_table is None:
+            edges = self.rng.integers(len(self.cross_sources), size=len(times))
+        else:
+            edges = self.cross_alias_table.sample(self.rng, len(times))
+        gossiping = self.cross_sources[edges]
+        listening = self.cross_targets[edges]
+        for p in range(self.partitions):
+            shared = (self.part[gossiping] == p) | (self.part[listening] == p)
+            if shared.any():
+                self.post(p, "window", times[shared], kinds[shared],
+                          gossiping[shared], listening[shared])
+
+    def close(self):
+        """Stop the workers and free the shared topology."""
+        for connection, worker in zip(self.connections, self.workers):
+            connection.send((None, "stop", (), False))
+            worker.join()
+            connection.close()
+        self.connections = []
+        self.workers = []
+        if self.topology is not None and self.topology.owner:
+            self.topology.unlink()
+        self.topology = None
+
+    @classmethod
+    def ensemble_runs(cls, params, seeds, stoping_time, processes=None):
+        """The runs are sequential, each one spread over the partitions.
+        """
+        model = cls(**params)
+        try:
+            return [model.run_seed(seed, stoping_time) for seed in seeds]
+        finally:
+            model.close()
+
+    def results(self):
+        """Same metrics as Model.results.
+
+        Returns:
+        --------
+        results : dictionary
+        """
+        partitions = [self.call(p, "results") for p in range(self.partitions)]
+        n_blocks = len(self.blockchain)
+        attestation_block = np.zeros(len(self.validators), dtype=np.int64)
+        attestation_slot = np.zeros(len(self.validators), dtype=np.int64)
+        recorder = PropagationRecorder(self.N, capacity=n_blocks)
+        recorder.block_created[:n_blocks] = partitions[0]["block_created"]
+        for p in partitions:
+            recorder.block_arrival[:n_blocks][:, p["own"]] = p["block_arrival"]
+            attestation_block[p["validators"]] = p["attestation_block"]
+            attestation_slot[p["validators"]] = p["attestation_slot"]
+        # an attestation covers the network once it covers every partition,
+        # before its issuer issues the next one (see PropagationRecorder)
+        issued = {}
+        for p in partitions:
+            issued.update(p["issued"])
+        attestation_coverage = []
+        keys = sorted(issued)
+        for key, next_key in zip(keys, keys[1:] + [None]):
+            covered = [q["covered"].get(key) for q in partitions]
+            if None in covered:
+                continue
+            if next_key is not None and next_key[0] == key[0] and max(covered) >= issued[next_key]:
+                continue
+            attestation_coverage.append(max(covered) - issued[key])
+        god_view_attestations = {
+            v: (self.blockchain[b], s) for v, b, s in
+            zip(self.validators, attestation_block.tolist(),
+                attestation_slot.tolist())}
+        if self.network_metrics is None:
+            self.network_metrics = {
+                "diameter": calculate_diameter(self.network),
+                "average_shortest_path": calculate_average_shortest_path(self.network),
+                }
+        results_dict = {
+            "mainchain_rate": calculate_mainchain_rate(self.blockchain, god_view_attestations, self.stake),
+            "branch_ratio": calculate_branch_ratio(self.blockchain, god_view_attestations, self.stake),
+            "blocktree_entropy": self.children_histogram.entropy(),
+            **self.network_metrics,
+            "delayer_orphan_rate": calculate_delayer_orphan_rate(self.blockchain, god_view_attestations, self.stake),
+            }
+        results_dict.update(calculate_coverage_percentiles(
+            recorder.block_coverage_times(n_blocks), "block"))
+        results_dict.update(calculate_coverage_percentiles(
+            np.array(attestation_coverage), "attestation"))
+        reorg_depths = np.zeros(max(len(p["reorg_depths"]) for p in partitions),
+                                dtype=np.int64)
+        for p in partitions:
+            reorg_depths[:len(p["reorg_depths"])] += p["reorg_depths"]
+        results_dict.update(calculate_reorg_metrics(reorg_depths, self.N,
+                                                    self.slot))
+        return results_dict
@@ -0,0 +1,872 @@
+"""
+    copyright 2022 uzh
+    This file is part of ethereum-consensus-abm.
+
+    ethereum-consensus-abm is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Lesser General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    ethereum-consensus-abm is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public License
+    along with ethereum-consensus-abm.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import math
+import time
+import numpy as np
+from eth_base import (Block, ChildrenHistogram, Network, Simulation, Model,
+                      ReorgRecorder,
+                      calculate_mainchain_rate, calculate_branch_ratio,
+                      calculate_entropy,
+                      calculate_diameter,
+                      calculate_average_shortest_path,
+                      calculate_delayer_orphan_rate,
+                      calculate_coverage_percentiles,
+                      calculate_reorg_metrics)
+
+# latest messages are encoded as slot << SLOT_SHIFT | block id,
+# the newest slot (then the highest block id) wins a merge
+SLOT_SHIFT = 32
+BLOCK_MASK = (1 << SLOT_SHIFT) - 1
+
+
+class RoundPeer:
+    """Emitter of the blocks of a RoundModel, stands for the peer id."""
+
+    def __init__(self, id, delayer=False):
+        self.id = id
+        self.delayer = delayer
+
+    def __repr__(self):
+        return '<RoundPeer {}>'.format(self.id)
+
+
+class RoundModel(Simulation):
+    '''Fast approximation of Model for parameter sweeps: the peers advance
+    in synchronous rounds of round_time seconds. In each round a directed
+    edge gossips blocks with probability 1 - exp(-round_time/tau_block)
+    and attestations with probability 1 - exp(-round_time/tau_attest).
+    The merges of a round read the views of the previous round and are
+    applied as sparse products over the CSR adjacency.
+    There are no Node objects: peer views are rows of a block-view matrix
+    and of a latest-messages matrix, and LMD-GHOST is evaluated for all
+    the peers at once. Rounds are skipped while all the views agree.
+
+    Differences with Model:
+    - messages travel at most one hop per round,
+    - attestations to blocks not received yet are applied right away,
+    - fork-choice ties go to the lowest block id,
+    - the committee of slot s is the validators v with
+      v % slots_per_epoch == s % slots_per_epoch,
+    - no finality.
+    See calibration_report for where the two engines agree.
+    '''
+
+    def __init__(self,
+                 graph=None,
+                 tau_block=None,
+                 tau_attest=None,
+                 delay_share=0,
+                 delay_time=0,
+                 stake=None,
+                 validators_per_node=1,
+                 slots_per_epoch=1,
+                 round_time=1.,
+                 seed=None):
+        self.tau_block = tau_block
+        self.tau_attest = tau_attest
+        self.delay_share = delay_share
+        self.delay_time = delay_time
+        self.slots_per_epoch = slots_per_epoch
+        self.round_time = round_time
+        self.p_block = 1 - math.exp(-round_time/tau_block)
+        self.p_attest = 1 - math.exp(-round_time/tau_attest)
+        # set up peers
+        self.network = Network(graph)
+        self.N = len(self.network)
+        self.validators_per_node = validators_per_node
+        self.validators = list(range(self.N*self.validators_per_node))
+        self.validator_node = np.repeat(np.arange(self.N),
+                                        self.validators_per_node)
+        if stake is None:
+            self.stake = np.ones(len(self.validators))
+        else:
+            self.stake = np.asarray(stake, dtype=np.float64)
+            if self.stake.shape != (len(self.validators),):
+                raise ValueError("stake must have one entry per validator")
+        self.peers = [RoundPeer(i) for i in range(self.N)]
+        self.network_metrics = None
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """Reset the dynamic state for a new run, keeping the topology."""
+        self.rng = np.random.default_rng(seed)
+        self.blockchain = [Block()]
+        self.children_histogram = ChildrenHistogram()
+        self.children_histogram.add_block(self.blockchain[0])
+        # views[n, b]: True if peer n received block b
+        self.views = np.zeros((self.N, 64), dtype=bool)
+        self.views[:, 0] = True
+        self.block_parent = np.full(64, -1, dtype=np.int64)
+        self.block_created = np.full(64, np.nan)
+        self.block_covered = np.full(64, np.nan)
+        self.block_covered[0] = self.block_created[0] = 0
+        # votes[n, v]: latest message of validator v seen by peer n,
+        # encoded as slot << SLOT_SHIFT | block id. Genesis at slot -1
+        self.votes = np.full((self.N, len(self.validators)),
+                             -1 << SLOT_SHIFT, dtype=np.int64)
+        # latest attestations issued by each peer, until they reach every
+        # peer: slot, time, and one of the validators that attested
+        self.issue_slot = np.full(self.N, -1, dtype=np.int64)
+        self.issue_time = np.full(self.N, np.nan)
+        self.issue_validator = np.zeros(self.N, dtype=np.int64)
+        self.issue_pending = np.zeros(self.N, dtype=bool)
+        self.attestation_coverage = []
+        self.reorg_recorder = ReorgRecorder(self.N)
+        for peer in self.peers:
+            peer.delayer = False
+        if self.delay_share > 0:
+            for i in self.rng.choice(self.N, size=math.floor(self.N*self.delay_share)):
+                self.peers[i].delayer = True
+        self.time = 0
+        self.rounds = 0
+        self.slot = 0
+        self.next_slot = 0
+        self.next_attestation = 4
+        self.next_late = np.inf
+        self.late_proposer = None
+        # False once all the views agree, until the next block or
+        # attestation
+        self.active = False
+
+    def run(self, stoping_time):
+        """Method to run the model. Needs stopping time.
+        """
+        while self.time < stoping_time:
+            self.fire_events()
+            if self.active:
+                self.gossip_round()
+                self.rounds += 1
+            else:
+                # nothing to propagate, skip to the round of the next event
+                next_event = min(self.next_slot, self.next_attestation,
+                                 self.next_late)
+                self.rounds = max(self.rounds + 1,
+                                  math.ceil(next_event/self.round_time))
+            self.time = self.rounds*self.round_time
+
+    def fire_events(self):
+        """Slot boundaries, late proposals and attestation boundaries up to
+        the current round, in time order.
+        """
+        while True:
+            event_time = min(self.next_slot, self.next_attestation,
+                             self.next_late)
+            if event_time > self.time:
+                return
+            if event_time == self.next_slot:
+                self.slot += 1
+                validator = self.rng.choice(len(self.validators),
+                                            p=self.stake/self.stake.sum())
+                proposer = self.validator_node[validator]
+                if self.peers[proposer].delayer:
+                    self.late_proposer = proposer
+                    self.next_late = event_time + self.delay_time
+                else:
+                    self.propose_block(proposer, event_time)
+                self.next_slot += 12
+            elif event_time == self.next_attestation:
+                self.issue_attestations(event_time)
+                self.next_attestation += 12
+            else:
+                self.propose_block(self.late_proposer, event_time)
+                self.next_late = np.inf
+
+    def propose_block(self, proposer, event_time):
+        head = self.fork_choice(np.array([proposer]))[0]
+        self.reorg_recorder.observe(proposer, self.blockchain[head],
+                                    self.blockchain)
+        block_id = len(self.blockchain)
+        if block_id == self.views.shape[1]:
+            self._grow_blocks()
+        self.blockchain.append(Block(emitter=self.peers[proposer],
+                                     parent=self.blockchain[head],
+                                     slot_no=self.slot, id=block_id))
+        self.children_histogram.add_block(self.blockchain[-1])
+        self.block_parent[block_id] = head
+        self.block_created[block_id] = event_time
+        self.views[proposer, block_id] = True
+        self.active = True
+
+    def _grow_blocks(self):
+        capacity = self.views.shape[1]
+        views = np.zeros((self.N, 2*capacity), dtype=bool)
+        views[:, :capacity] = self.views
+        self.views = views
+        self.block_parent = np.concatenate(
+            (self.block_parent, np.full(capacity, -1, dtype=np.int64)))
+        self.block_created = np.concatenate(
+            (self.block_created, np.full(capacity, np.nan)))
+        self.block_covered = np.concatenate(
+            (self.block_covered, np.full(capacity, np.nan)))
+
+    def issue_attestations(self, event_time):
+        committee = np.flatnonzero(np.arange(len(self.validators))
+                                   % self.slots_per_epoch
+                                   == self.slot % self.slots_per_epoch)
+        issuers = np.unique(self.validator_node[committee])
+        heads = np.zeros(self.N, dtype=np.int64)
+        heads[issuers] = self.fork_choice(issuers)
+        for peer, head in zip(issuers.tolist(), heads[issuers].tolist()):
+            self.reorg_recorder.observe(peer, self.blockchain[head],
+                                        self.blockchain)
+        peers = self.validator_node[committee]
+        self.votes[peers, committee] = (self.slot << SLOT_SHIFT) | heads[peers]
+        self.issue_slot[issuers] = self.slot
+        self.issue_time[issuers] = event_time
+        self.issue_validator[peers] = committee
+        self.issue_pending[issuers] = True
+        self.active = True
+
+    def fork_choice(self, peers):
+        """LMD-GHOST heads of the views of peers, all evaluated at once.
+        OUTPUT:
+        - heads,    array of block ids
+        """
+        n_blocks = len(self.blockchain)
+        n_peers = len(peers)
+        # weights[i, b]: stake of the votes seen by peers[i] in the
+        # subtree of b, children are pushed into parents
+        blocks = self.votes[peers] & BLOCK_MASK
+        rows = np.repeat(np.arange(n_peers), len(self.validators))
+        weights = np.bincount(rows*n_blocks + blocks.ravel(),
+                              weights=np.tile(self.stake, n_peers),
+                              minlength=n_peers*n_blocks).reshape(n_peers, n_blocks)
+        parent = self.block_parent[:n_blocks]
+        for b in range(n_blocks - 1, 0, -1):
+            weights[:, parent[b]] += weights[:, b]
+        # blocks out of the view are never followed
+        weights[~self.views[peers, :n_blocks]] = -1
+        # children of each block, padded with the genesis (never a child)
+        child_ids = np.argsort(parent[1:], kind="stable") + 1
+        n_children = np.bincount(parent[1:], minlength=n_blocks)
+        children = np.zeros((n_blocks, max(n_children.max(initial=0), 1)),
+                            dtype=np.int64)
+        first = np.cumsum(n_children) - n_children
+        position = np.arange(n_blocks - 1) - np.repeat(first, n_children)
+        children[parent[child_ids], position] = child_ids
+        # walk down from genesis, following the heaviest known child
+        heads = np.zeros(n_peers, dtype=np.int64)
+        walking = np.arange(n_peers)
+        while len(walking) > 0:
+            candidates = children[heads[walking]]
+            candidate_weights = weights[walking[:, None], candidates]
+            candidate_weights[candidates == 0] = -1
+            best = candidate_weights.argmax(axis=1)
+            known = candidate_weights[np.arange(len(walking)), best] >= 0
+            walking = walking[known]
+            heads[walking] = candidates[known, best[known]]
+        return heads
+
+    def _merge(self, fired, table, reduce):
+        """Reduce the rows of table gossiped over the fired edges into
+        each listening peer. Only the rows of the fired edges are
+        gathered, the edges of a listening peer are contiguous in the
+        CSR adjacency."""
+        edges = np.flatnonzero(fired)
+        listening = self.network.sources[edges]
+        start = np.flatnonzero(np.r_[True, listening[1:] != listening[:-1]])
+        incoming = reduce.reduceat(table[self.network.indices[edges]], start,
+                                   axis=0)
+        received = table.copy()
+        listening = listening[start]
+        received[listening] = reduce(received[listening], incoming)
+        return received
+
+    def gossip_round(self):
+        n_edges = len(self.network.indices)
+        changed = False
+        n_blocks = len(self.blockchain)
+        fired = self.rng.random(n_edges) < self.p_block
+        if fired.any():
+            views = self.views[:, :n_blocks]
+            received = self._merge(fired, views, np.logical_or)
+            if (received & ~views).any():
+                changed = True
+                views |= received
+                covered = views.all(axis=0) & np.isnan(self.block_covered[:n_blocks])
+                self.block_covered[:n_blocks][covered] = self.time
+        fired = self.rng.random(n_edges) < self.p_attest
+        if fired.any():
+            received = self._merge(fired, self.votes, np.maximum)
+            if (received > self.votes).any():
+                changed = True
+                np.maximum(self.votes, received, out=self.votes)
+                pending = np.flatnonzero(self.issue_pending)
+                slots = self.votes[:, self.issue_validator[pending]] >> SLOT_SHIFT
+                covered = pending[(slots >= self.issue_slot[pending]).all(axis=0)]
+                self.issue_pending[covered] = False
+                self.attestation_coverage.extend(self.time - self.issue_time[covered])
+        if not changed:
+            self.active = not (
+                (self.views[:, :n_blocks] == self.views[:1, :n_blocks]).all()
+                and (self.votes == self.votes[:1]).all())
+
+    def god_view_attestations(self):
+        """Returns the latest attestation of each validator, as seen by
+        the peer hosting it.
+        OUTPUT:
+        - attestations, dict {validator id: (Block, slot)}
+        """
+        own = self.votes[self.validator_node, np.arange(len(self.validators))]
+        return {v: (self.blockchain[own[v] & BLOCK_MASK], own[v] >> SLOT_SHIFT)
+                for v in self.validators}
+
+    def results(self):
+        """Same metrics as Model.results.
+
+        Returns:
+        --------
+        results : dictionary
+        """
+        god_view_attestations = self.god_view_attestations()
+        if self.network_metrics is None:
+            self.network_metrics = {
+                "diameter": calculate_diameter(self.network),
+                "average_shortest_path": calculate_average_shortest_path(self.network),
+                }
+        results_dict = {
+            "mainchain_rate": calculate_mainchain_rate(self.blockchain, god_view_attestations, self.stake),
+            "branch_ratio": calculate_branch_ratio(self.blockchain, god_view_attestations, self.stake),
+            "blocktree_entropy": self.children_histogram.entropy(),
+            **self.network_metrics,
+            "delayer_orphan_rate": calculate_delayer_orphan_rate(self.blockchain, god_view_attestations, self.stake),
+            }
+        # the genesis block is excluded, as in Model
+        n_blocks = len(self.blockchain)
+        block_coverage = (self.block_covered[1:n_blocks]
+                          - self.block_created[1:n_blocks])
+        results_dict.update(calculate_coverage_percentiles(
+            block_coverage[~np.isnan(block_coverage)], "block"))
+        results_dict.update(calculate_coverage_percentiles(
+            np.array(self.attestation_coverage), "attestation"))
+        results_dict.update(calculate_reorg_metrics(
+            self.reorg_recorder.depth_counts, self.N, self.slot))
+        return results_dict
+
+
+class BatchSimulation(Simulation):
+    '''Base class of the engines simulating replicas independent runs at
+    once on the same topology. The blocktrees and the peer views gain a
+    leading replica axis: block b of replica r has parent
+    block_parent[r, b] (-1 for the genesis and unused ids) and
+    views[r, n, b] is True if peer n of replica r received block b.
+    Subclasses hold the latest messages of the peers, see vote_blocks and
+    replica_attestations, and results() returns one dictionary per
+    replica.
+    '''
+
+    def reset_blocktrees(self):
+        """Genesis-only blocktrees, views and reorg counts of the
+        replicas."""
+        R = self.replicas
+        self.n_blocks = np.ones(R, dtype=np.int64)
+        self.block_parent = np.full((R, 64), -1, dtype=np.int64)
+        self.block_height = np.zeros((R, 64), dtype=np.int64)
+        self.block_slot = np.zeros((R, 64), dtype=np.int64)
+        self.block_emitter = np.full((R, 64), -1, dtype=np.int64)
+        self.block_created = np.full((R, 64), np.nan)
+        self.block_covered = np.full((R, 64), np.nan)
+        self.block_covered[:, 0] = self.block_created[:, 0] = 0
+        # nested intervals of the subtrees: the subtree of b holds the
+        # blocks d with block_enter[r, b] <= block_enter[r, d] < block_exit[r, b]
+        # (-1 for unused ids), see add_blocks
+        self.block_enter = np.full((R, 64), -1, dtype=np.int64)
+        self.block_exit = np.full((R, 64), -1, dtype=np.int64)
+        self.block_enter[:, 0] = 0
+        self.block_exit[:, 0] = 1
+        # fork-choice ties go to the lowest rank, see rank_blocks
+        self.block_rank = np.zeros((R, 64))
+        self.views = np.zeros((R, self.N, 64), dtype=bool)
+        self.views[:, :, 0] = True
+        # last head of each peer and histogram of the reorg depths of
+        # each replica, see ReorgRecorder
+        self.heads = np.zeros((R, self.N), dtype=np.int64)
+        self.reorg_depths = np.zeros((R, 8), dtype=np.int64)
+        self.delayer = np.zeros((R, self.N), dtype=bool)
+        if self.delay_share > 0:
+            picks = self.rng.choice(self.N, size=(R, math.floor(self.N*self.delay_share)))
+            self.delayer[np.arange(R)[:, None], picks] = True
+
+    def run_seed(self, seed, stoping_time):
+        """Run one replica per seed of the list seed, returns the list of
+        their results.
+        """
+        self.reset(seed, replicas=len(seed))
+        self.run(stoping_time)
+        return self.results()
+
+    @classmethod
+    def ensemble_runs(cls, params, seeds, stoping_time, processes=None):
+        """The seeds are split into one batch per process, the runs of a
+        batch are the replicas of a model.
+        """
+        batches = [batch.tolist() for batch in
+                   np.array_split(np.asarray(seeds), max(processes or 1, 1))
+                   if len(batch) > 0]
+        runs = super().ensemble_runs(params, batches, stoping_time, processes)
+        return [run for batch in runs for run in batch]
+
+    def propose_block(self, replica, proposer, event_time):
+        """proposer proposes a block in replica, see propose_blocks."""
+        self.propose_blocks(np.array([replica]), np.array([proposer]),
+                            event_time)
+
+    def add_blocks(self, replicas, parents, proposers, event_time):
+        """Append a block of the current slot on top of parents[i],
+        proposed by proposers[i], to the blocktree of replicas[i].
+        OUTPUT:
+        - block_ids,    array of the ids of the new blocks
+        """
+        block_ids = self.n_blocks[replicas]
+        if block_ids.max() >= self.views.shape[2]:
+            self._grow_blocks()
+        self.block_parent[replicas, block_ids] = parents
+        self.block_height[replicas, block_ids] = self.block_height[replicas, parents] + 1
+        self.block_slot[replicas, block_ids] = self.slot
+        self.block_emitter[replicas, block_ids] = proposers
+        self.block_created[replicas, block_ids] = event_time
+        self.block_rank[replicas, block_ids] = self.rank_blocks(block_ids)
+        self.views[replicas, proposers, block_ids] = True
+        # the new block enters at the end of the subtree of its parent,
+        # the labels after it and the exits of its ancestors move by one
+        n_blocks = self.n_blocks[replicas].max()
+        enter = self.block_enter[replicas, :n_blocks]
+        exit = self.block_exit[replicas, :n_blocks]
+        position = self.block_exit[replicas, parents][:, None]
+        ancestor = ((enter <= self.block_enter[replicas, parents][:, None])
+                    & (exit >= position))
+        self.block_exit[replicas, :n_blocks] = exit + ((enter >= position) | ancestor)
+        self.block_enter[replicas, :n_blocks] = enter + (enter >= position)
+        self.block_enter[replicas, block_ids] = position[:, 0]
+        self.block_exit[replicas, block_ids] = position[:, 0] + 1
+        self.n_blocks[replicas] += 1
+        return block_ids
+
+    def _grow_blocks(self):
+        capacity = self.views.shape[2]
+        views = np.zeros((self.replicas, self.N, 2*capacity), dtype=bool)
+        views[:, :, :capacity] = self.views
+        self.views = views
+        for name, fill in (("block_parent", -1), ("block_height", 0),
+                           ("block_slot", 0), ("block_enter", -1),
+                           ("block_exit", -1), ("block_rank", 0.),
+                           ("block_emitter", -1), ("block_created", np.nan),
+                           ("block_covered", np.nan)):
+            array = getattr(self, name)
+            grown = np.full((self.replicas, 2*capacity), fill,
+                            dtype=array.dtype)
+            grown[:, :capacity] = array
+            setattr(self, name, grown)
+
+    def rank_blocks(self, block_ids):
+        """Fork-choice ranks of new blocks, ties go to the lowest block id."""
+        return block_ids
+
+    def vote_blocks(self, replicas, peers):
+        """Block attested by each validator in the table of peers[i] in
+        replicas[i], one row per view."""
+        raise NotImplementedError
+
+    def fork_choice(self, replicas, peers):
+        """LMD-GHOST heads of the views of peers[i] in replicas[i], all
+        evaluated at once.
+        OUTPUT:
+        - heads,    array of block ids
+        """
+        n_blocks = self.n_blocks.max()
+        n_views = len(peers)
+        rows = np.arange(n_views)
+        parent = self.block_parent[replicas, :n_blocks]
+        # direct[i, b]: stake of the votes of view i on block b
+        blocks = self.vote_blocks(replicas, peers)
+        direct = np.bincount(
+            np.repeat(rows*n_blocks, len(self.validators)) + blocks.ravel(),
+            weights=np.tile(self.stake, n_views),
+            minlength=n_views*n_blocks).reshape(n_views, n_blocks)
+        # weights[i, b]: stake of the votes of view i in the subtree of b,
+        # sums over the nested intervals. Unused ids are placed in the
+        # extra last column and carry no weight
+        enter = self.block_enter[replicas, :n_blocks]
+        exit = self.block_exit[replicas, :n_blocks]
+        placed = np.zeros((n_views, n_blocks + 1))
+        placed[rows[:, None], enter] = direct
+        cumulative = np.zeros((n_views, n_blocks + 2))
+        np.cumsum(placed, axis=1, out=cumulative[:, 1:])
+        weights = (np.take_along_axis(cumulative, exit, axis=1)
+                   - np.take_along_axis(cumulative, enter, axis=1))
+        # best[i, b]: heaviest child of b in view i, ties go to the lowest
+        # rank, b itself if b has no child in the view
+        view_rows, children = np.nonzero(self.views[replicas, peers, 1:n_blocks])
+        children += 1
+        groups = view_rows*n_blocks + parent[view_rows, children]
+        order = np.lexsort((self.block_rank[replicas[view_rows], children],
+                            -weights[view_rows, children], groups))
+        groups = groups[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = groups[1:] != groups[:-1]
+        best = np.tile(np.arange(n_blocks), n_views)
+        best[groups[first]] = children[order][first]
+        best = best.reshape(n_views, n_blocks)
+        # walk down from genesis by pointer jumping: after k steps best
+        # points 2**k blocks down the heaviest path
+        for _ in range(int(max(n_blocks - 1, 1)).bit_length()):
+            best = np.take_along_axis(best, best, axis=1)
+        return best[:, 0]
+
+    def observe_heads(self, replicas, peers, heads):
+        """Count the reorgs of peers[i] in replicas[i] moving to heads[i],
+        see ReorgRecorder. The common ancestors of all the head changes
+        are found together, the higher block of each pair stepping to its
+        parent.
+        """
+        old = self.heads[replicas, peers]
+        changed = old != heads
+        if not changed.any():
+            return
+        self.heads[replicas, peers] = heads
+        replicas, old = replicas[changed], old[changed]
+        ancestor, other = old.copy(), heads[changed]
+        while True:
+            apart = np.flatnonzero(ancestor != other)
+            if len(apart) == 0:
+                break
+            height = self.block_height[replicas[apart], ancestor[apart]]
+            other_height = self.block_height[replicas[apart], other[apart]]
+            up = apart[height >= other_height]
+            ancestor[up] = self.block_parent[replicas[up], ancestor[up]]
+            up = apart[other_height >= height]
+            other[up] = self.block_parent[replicas[up], other[up]]
+        depths = (self.block_height[replicas, old]
+                  - self.block_height[replicas, ancestor])
+        reorg = depths > 0
+        if not reorg.any():
+            return
+        capacity = self.reorg_depths.shape[1]
+        if depths.max() >= capacity:
+            grown = np.zeros((self.replicas, 2*max(capacity, depths.max())),
+                             dtype=np.int64)
+            grown[:, :capacity] = self.reorg_depths
+            self.reorg_depths = grown
+        np.add.at(self.reorg_depths, (replicas[reorg], depths[reorg]), 1)
+
+    def replica_blockchain(self, r):
+        """Block objects of the blocktree of replica r."""
+        peers = [RoundPeer(i, delayer) for i, delayer
+                 in enumerate(self.delayer[r].tolist())]
+        blockchain = [Block()]
+        for b in range(1, self.n_blocks[r]):
+            blockchain.append(Block(emitter=peers[self.block_emitter[r, b]],
+                                    parent=blockchain[self.block_parent[r, b]],
+                                    slot_no=self.block_slot[r, b], id=b))
+        return blockchain
+
+    def replica_attestations(self, r):
+        """Latest attestation of each validator of replica r, as seen by
+        the peer hosting it.
+        OUTPUT:
+        - blocks,   array of block ids
+        - slots,    array of slots
+        """
+        raise NotImplementedError
+
+    def god_view_attestations(self, r, blockchain=None):
+        """Returns the latest attestation of each validator of replica r,
+        as seen by the peer hosting it.
+        OUTPUT:
+        - attestations, dict {validator id: (Block, slot)}
+        """
+        if blockchain is None:
+            blockchain = self.replica_blockchain(r)
+        blocks, slots = self.replica_attestations(r)
+        return {v: (blockchain[b], s) for v, b, s in
+                zip(self.validators, blocks.tolist(), slots.tolist())}
+
+    def results(self):
+        """Same metrics as Model.results, one dictionary per replica.
+
+        Returns:
+        --------
+        results : list
+        """
+        if self.network_metrics is None:
+            self.network_metrics = {
+                "diameter": calculate_diameter(self.network),
+                "average_shortest_path": calculate_average_shortest_path(self.network),
+                }
+        return [self.replica_results(r) for r in range(self.replicas)]
+
+    def replica_results(self, r):
+        blockchain = self.replica_blockchain(r)
+        god_view_attestations = self.god_view_attestations(r, blockchain)
+        results_dict = {
+            "mainchain_rate": calculate_mainchain_rate(blockchain, god_view_attestations, self.stake),
+            "branch_ratio": calculate_branch_ratio(blockchain, god_view_attestations, self.stake),
+            "blocktree_entropy": calculate_entropy(blockchain),
+            **self.network_metrics,
+            "delayer_orphan_rate": calculate_delayer_orphan_rate(blockchain, god_view_attestations, self.stake),
+            }
+        # the genesis block is excluded, as in Model
+        n_blocks = self.n_blocks[r]
+        block_coverage = (self.block_covered[r, 1:n_blocks]
+                          - self.block_created[r, 1:n_blocks])
+        results_dict.update(calculate_coverage_percentiles(
+            block_coverage[~np.isnan(block_coverage)], "block"))
+        results_dict.update(calculate_coverage_percentiles(
+            np.array(self.attestation_coverage[r]), "attestation"))
+        results_dict.update(calculate_reorg_metrics(
+            self.reorg_depths[r], self.N, self.slot))
+        return results_dict
+
+
+class BatchRoundModel(BatchSimulation, RoundModel):
+    '''RoundModel simulating replicas independent runs in lock-step on the
+    same topology. The state of RoundModel gains a leading replica axis
+    (views[r, n, b], votes[r, n, v], ...) and the gossip merges, the fork
+    choice and the slot events are array operations over all the replicas
+    at once. Rounds are skipped while the views agree in every replica.
+    The replicas draw from a single random generator: replica r does not
+    reproduce a RoundModel run, but has the same distribution.
+    This batches the round approximation, see BatchModel (eth_batch) for
+    the batched exact engine.
+    results() returns one dictionary per replica.
+    '''
+
+    def __init__(self, *args, replicas=1, seed=None, **kwargs):
+        self.replicas = replicas
+        super().__init__(*args, seed=seed, **kwargs)
+
+    def reset(self, seed=None, replicas=None):
+        """Reset the dynamic state for a new run of replicas replicas
+        (unchanged if None), keeping the topology.
+        """
+        if replicas is not None:
+            self.replicas = replicas
+        R = self.replicas
+        self.rng = np.random.default_rng(seed)
+        self.reset_blocktrees()
+        # votes[r, n, v], see RoundModel
+        self.votes = np.full((R, self.N, len(self.validators)),
+                             -1 << SLOT_SHIFT, dtype=np.int64)
+        self.issue_slot = np.full((R, self.N), -1, dtype=np.int64)
+        self.issue_time = np.full((R, self.N), np.nan)
+        self.issue_validator = np.zeros((R, self.N), dtype=np.int64)
+        self.issue_pending = np.zeros((R, self.N), dtype=bool)
+        self.attestation_coverage = [[] for _ in range(R)]
+        self.time = 0
+        self.rounds = 0
+        self.slot = 0
+        self.next_slot = 0
+        self.next_attestation = 4
+        # late proposals are pending in some replicas only
+        self.next_late = np.full(R, np.inf)
+        self.late_proposer = np.zeros(R, dtype=np.int64)
+        self.active = np.zeros(R, dtype=bool)
+
+    def run(self, stoping_time):
+        """Method to run the model. Needs stopping time.
+        """
+        while self.time < stoping_time:
+            self.fire_events()
+            if self.active.any():
+                self.gossip_round()
+                self.rounds += 1
+            else:
+                # nothing to propagate, skip to the round of the next event
+                next_event = min(self.next_slot, self.next_attestation,
+                                 self.next_late.min())
+                self.rounds = max(self.rounds + 1,
+                                  math.ceil(next_event/self.round_time))
+            self.time = self.rounds*self.round_time
+
+    def fire_events(self):
+        """Slot boundaries, late proposals and attestation boundaries up to
+        the current round, in time order.
+        """
+        replicas = np.arange(self.replicas)
+        while True:
+            event_time = min(self.next_slot, self.next_attestation,
+                             self.next_late.min())
+            if event_time > self.time:
+                return
+            if event_time == self.next_slot:
+                self.slot += 1
+                validators = self.rng.choice(len(self.validators),
+                                             size=self.replicas,
+                                             p=self.stake/self.stake.sum())
+                proposers = self.validator_node[validators]
+                late = self.delayer[replicas, proposers]
+                self.late_proposer[late] = proposers[late]
+                self.next_late[late] = event_time + self.delay_time
+                self.propose_blocks(replicas[~late], proposers[~late],
+                                    event_time)
+                self.next_slot += 12
+            elif event_time == self.next_attestation:
+                self.issue_attestations(event_time)
+                self.next_attestation += 12
+            else:
+                late = np.flatnonzero(self.next_late == event_time)
+                self.propose_blocks(late, self.late_proposer[late], event_time)
+                self.next_late[late] = np.inf
+
+    def propose_blocks(self, replicas, proposers, event_time):
+        """proposers[i] proposes a block in replica replicas[i]."""
+        if len(replicas) == 0:
+            return
+        heads = self.fork_choice(replicas, proposers)
+        self.observe_heads(replicas, proposers, heads)
+        self.add_blocks(replicas, heads, proposers, event_time)
+        self.active[replicas] = True
+
+    def issue_attestations(self, event_time):
+        committee = np.flatnonzero(np.arange(len(self.validators))
+                                   % self.slots_per_epoch
+                                   == self.slot % self.slots_per_epoch)
+        issuers = np.unique(self.validator_node[committee])
+        peers = self.validator_node[committee]
+        replicas = np.repeat(np.arange(self.replicas), len(issuers))
+        issuing = np.tile(issuers, self.replicas)
+        heads = np.zeros((self.replicas, self.N), dtype=np.int64)
+        heads[replicas, issuing] = self.fork_choice(replicas, issuing)
+        self.observe_heads(replicas, issuing, heads[replicas, issuing])
+        self.votes[:, peers, committee] = (self.slot << SLOT_SHIFT) | heads[:, peers]
+        self.issue_slot[:, issuers] = self.slot
+        self.issue_time[:, issuers] = event_time
+        self.issue_validator[:, peers] = committee
+        self.issue_pending[:, issuers] = True
+        self.active[:] = True
+
+    def vote_blocks(self, replicas, peers):
+        return self.votes[replicas, peers] & BLOCK_MASK
+
+    def _merge(self, fired, table, reduce):
+        """Reduce the rows of table gossiped over the fired edges into
+        each listening peer, in every replica."""
+        replicas, edges = np.nonzero(fired)
+        listening = self.network.sources[edges]
+        key = replicas*self.N + listening
+        start = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        incoming = reduce.reduceat(table[replicas, self.network.indices[edges]],
+                                   start, axis=0)
+        received = table.copy()
+        replicas, listening = replicas[start], listening[start]
+        received[replicas, listening] = reduce(received[replicas, listening],
+                                               incoming)
+        return received
+
+    def gossip_round(self):
+        """Gossip round of the active replicas, the others agree on
+        every view and have nothing to propagate.
+        """
+        live = np.flatnonzero(self.active)
+        # basic slicing avoids copying the tables when all are active
+        rows = slice(None) if len(live) == self.replicas else live
+        n_edges = len(self.network.indices)
+        n_blocks = self.n_blocks.max()
+        changed = np.zeros(len(live), dtype=bool)
+        fired = self.rng.random((len(live), n_edges)) < self.p_block
+        if fired.any():
+            views = self.views[rows, :, :n_blocks]
+            received = self._merge(fired, views, np.logical_or)
+            new = (received & ~views).any(axis=(1, 2))
+            if new.any():
+                changed |= new
+                views |= received
+                self.views[rows, :, :n_blocks] = views
+                covered = views.all(axis=1) & np.isnan(self.block_covered[rows, :n_blocks])
+                replicas, blocks = np.nonzero(covered)
+                self.block_covered[live[replicas], blocks] = self.time
+        fired = self.rng.random((len(live), n_edges)) < self.p_attest
+        if fired.any():
+            votes = self.votes[rows]
+            received = self._merge(fired, votes, np.maximum)
+            new = (received > votes).any(axis=(1, 2))
+            if new.any():
+                changed |= new
+                np.maximum(votes, received, out=votes)
+                self.votes[rows] = votes
+                replicas, pending = np.nonzero(self.issue_pending)
+                slots = self.votes[replicas[:, None], np.arange(self.N),
+                                   self.issue_validator[replicas, pending][:, None]] >> SLOT_SHIFT
+                covered = (slots >= self.issue_slot[replicas, pending][:, None]).all(axis=1)
+                replicas, pending = replicas[covered], pending[covered]
+                self.issue_pending[replicas, pending] = False
+                for r, t in zip(replicas, self.time - self.issue_time[replicas, pending]):
+                    self.attestation_coverage[r].append(t)
+        idle = live[~changed]
+        views = self.views[idle, :, :n_blocks]
+        votes = self.votes[idle]
+        self.active[idle] = ~((views == views[:, :1]).all(axis=(1, 2))
+                              & (votes == votes[:, :1]).all(axis=(1, 2)))
+
+    def replica_attestations(self, r):
+        own = self.votes[r, self.validator_node, np.arange(len(self.validators))]
+        return own & BLOCK_MASK, own >> SLOT_SHIFT
+
+
+def calibration_report(points, seeds, stoping_time, round_time=1.,
+                       metrics=("mainchain_rate", "branch_ratio"),
+                       confidence=0.95, processes=None):
+    """Compare RoundModel with the exact Model over parameter points.
+
+    Parameters:
+    -----------
+    points : list
+        dicts of keyword arguments common to Model and RoundModel
+    seeds : list
+        seeds of each ensemble
+    stoping_time : float
+        simulation time of each run
+    round_time : float
+        round length of RoundModel
+
+    Returns:
+    --------
+    report : list
+        one dictionary per point and metric, with the point parameters
+        (but graph), the exact and rounds means and confidence interval
+        half widths, their difference, "agrees" if the confidence
+        intervals overlap, and the wall time "speedup" of RoundModel
+    """
+    report = []
+    for point in points:
+        start = time.perf_counter()
+        exact = Model.run_ensemble(point, seeds, stoping_time,
+                                   processes=processes, confidence=confidence)
+        exact_time = time.perf_counter() - start
+        start = time.perf_counter()
+        rounds = RoundModel.run_ensemble({**point, "round_time": round_time},
+                                         seeds, stoping_time,
+                                         processes=processes,
+                                         confidence=confidence)
+        rounds_time = time.perf_counter() - start
+        label = {key: value for key, value in point.items() if key != "graph"}
+        for metric in metrics:
+            e, r = exact[metric], rounds[metric]
+            report.append({
+                **label,
+                "metric": metric,
+                "exact_mean": e["mean"],
+                "exact_ci": e["ci_high"] - e["mean"],
+                "rounds_mean": r["mean"],
+                "rounds_ci": r["ci_high"] - r["mean"],
+                "difference": r["mean"] - e["mean"],
+                "agrees": (r["ci_low"] <= e["ci_high"]
+                           and e["ci_low"] <= r["ci_high"]),
+                "speedup": exact_time/rounds_time,
+                })
+    return report
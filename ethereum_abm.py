@@ -15,15 +15,22 @@
     You should have received a copy of the GNU Lesser General Public License
     along with ethereum-consensus-abm.  If not, see <http://www.gnu.org/licenses/>.
 """
-from spg.runner import SingleRunner
-from eth_base import Model
-import networkx as nx
+import sys
+import json
+import math
+import optparse
+import subprocess
+from eth_base import Model, aggregate_results, student_t_quantile
+from eth_rounds import RoundModel
 
+# modules whose import time is reported by --profile-startup
+STARTUP_MODULES = ["numpy", "eth_base", "eth_rounds", "networkx", "spg.runner"]
 
-def parse_command_line():
-    import sys
-    import optparse
+# metrics whose confidence intervals stop the adaptive repetitions
+ADAPTIVE_METRICS = ["mainchain_rate", "branch_ratio", "delayer_orphan_rate"]
 
+
+def parse_command_line(argv=None):
     parser = optparse.OptionParser()
 
     parser.add_option("--repeat", action='store', dest="repeat", type='int',
@@ -38,15 +45,62 @@ def parse_command_line():
             dest="rewrite",
             help="if the csv file - if existing - should be rewritten. If not added, append operation is performed"
             )
+    parser.add_option("--profile-startup", action='store_true',
+                      dest="profile_startup",
+                      help="report the import time of the modules")
+    parser.add_option("--cache", action='store', dest="cache", type='str',
+                      default=None,
+                      help="sqlite file caching the results of the runs, "
+                      "repetitions are then seeded by their index")
+    parser.add_option("--ci-width", action='store', dest="ci_width",
+                      type='float', default=None,
+                      help="adaptive repetitions: run each parameter set "
+                      "until the confidence intervals of the metrics are "
+                      "at most this wide, --repeat is then ignored")
+    parser.add_option("--min-repeat", action='store', dest="min_repeat",
+                      type='int', default=3,
+                      help="minimum number of adaptive repetitions")
+    parser.add_option("--max-repeat", action='store', dest="max_repeat",
+                      type='int', default=100,
+                      help="maximum number of adaptive repetitions")
+    parser.add_option("--metrics", action='store', dest="metrics",
+                      type='str', default=",".join(ADAPTIVE_METRICS),
+                      help="comma separated metrics of the adaptive "
+                      "repetitions")
+    parser.add_option("--confidence", action='store', dest="confidence",
+                      type='float', default=0.95,
+                      help="confidence level of the adaptive repetitions")
 
-    command = sys.argv[0]
-    options, args = parser.parse_args()
+    if argv is None:
+        argv = sys.argv
+    command = argv[0]
+    options, args = parser.parse_args(argv[1:])
 
     return command, options, args
 
 
+def profile_startup(modules=STARTUP_MODULES):
+    """Import time of each module, dependencies included, each in a
+    fresh interpreter so that modules already imported here are timed too.
+    OUTPUTS:
+    - times,    dict {module: seconds}, None if the import failed
+    """
+    script = ("import time; t = time.perf_counter(); import {}; "
+              "print(time.perf_counter() - t)")
+    times = {}
+    for module in modules:
+        process = subprocess.run([sys.executable, "-c", script.format(module)],
+                                 capture_output=True, text=True)
+        times[module] = (float(process.stdout) if process.returncode == 0
+                         else None)
+    return times
+
+
 def __set_up_topology(parameters):
+    import networkx as nx
+
     topology = parameters['network_topology']
+    seed = parameters.get('seed')
     number_of_nodes = parameters['no_nodes']
     desired_avg_degree = parameters['no_neighs']
     ba_m = parameters['no_neighs']
@@ -54,14 +108,14 @@ def __set_up_topology(parameters):
     # generate network depending on topology parameter
     if topology == "UNIFORM":
         net_p2p = nx.random_degree_sequence_graph(
-            [desired_avg_degree for i in range(number_of_nodes)])
+            [desired_avg_degree for i in range(number_of_nodes)], seed=seed)
 
     elif topology == "ER":
         p = desired_avg_degree / (number_of_nodes - 1)
-        net_p2p = nx.fast_gnp_random_graph(number_of_nodes, p)
+        net_p2p = nx.fast_gnp_random_graph(number_of_nodes, p, seed=seed)
 
     elif topology == "BA":
-        net_p2p = nx.barabasi_albert_graph(number_of_nodes, ba_m)
+        net_p2p = nx.barabasi_albert_graph(number_of_nodes, ba_m, seed=seed)
 
     elif topology == "SBM":
         sbm_p_inter = parameters['p_sbm_inter']
@@ -75,7 +129,8 @@ def __set_up_topology(parameters):
                 [
                     [p_intra, p_inter],
                     [p_inter, p_intra]
-                ]
+                ],
+                seed=seed
                     )
 
     elif topology == "TREE":
@@ -99,32 +154,227 @@ def __set_up_topology(parameters):
     return net_p2p
 
 
+def __partition_schedule(graph, parameters):
+    """Split the network in two at partition_time and heal it
+    partition_length seconds later. SBM blocks are kept together.
+    """
+    import numpy as np
+    from eth_base import Network
+    from eth_parallel import partition_network
+
+    blocks = [data.get("block") for _, data in graph.nodes(data=True)]
+    labels = partition_network(Network(graph), 2,
+                               None if None in blocks else np.array(blocks))
+    start = parameters['partition_time']
+    return [(start, "partition", labels),
+            (start + parameters.get('partition_length', 0), "heal")]
+
+
 def run_simulation(parameters):
     """Simulation wrapper
     INPUTS:
     OUTPUTS:
     - results,  dict
     """
-    model = Model(
+    common = dict(
             graph=__set_up_topology(parameters),
             tau_block=parameters['tau_block'],
             tau_attest=parameters['tau_attestation'],
             delay_share=parameters['delay_share'],
             delay_time=parameters['delay_time'],
+            validators_per_node=parameters.get('validators_per_node', 1),
+            slots_per_epoch=parameters.get('slots_per_epoch', 1),
+            seed=parameters.get('seed'),
             )
+    if parameters.get('engine', 'EXACT') == 'ROUNDS':
+        model = RoundModel(
+                **common,
+                round_time=parameters.get('round_time', 1.),
+                )
+    elif parameters.get('engine', 'EXACT') == 'PARALLEL':
+        from eth_parallel import ParallelModel
+        model = ParallelModel(
+                **common,
+                attestation_cache_expiry=parameters.get('attestation_cache_expiry', 0) or None,
+                partitions=parameters.get('partitions', 2),
+                )
+        try:
+            model.run(parameters["simulation_time"])
+            return model.results()
+        finally:
+            model.close()
+    else:
+        fault_schedule = None
+        if parameters.get('partition_time', 0) > 0:
+            fault_schedule = __partition_schedule(common['graph'], parameters)
+        model = Model(
+                **common,
+                finality=parameters.get('finality', 'NONE'),
+                finality_depth=parameters.get('finality_depth', 32),
+                attestation_cache_expiry=parameters.get('attestation_cache_expiry', 0) or None,
+                attestation_tolerance=parameters.get('attestation_tolerance', 0) or None,
+                tau_online=parameters.get('tau_online', 0) or None,
+                tau_offline=parameters.get('tau_offline', 0) or None,
+                fault_schedule=fault_schedule,
+                )
     model.run(parameters["simulation_time"])
     return model.results()
 
 
-command, options, args = parse_command_line()
+def run_tasks(runner, tasks, workers=None, cache=None):
+    """Run (parameters, seed) tasks through a SingleRunner, skipping the
+    ones whose results are in the cache if one is given.
+    OUTPUTS:
+    - results,  list of results dicts, one per task
+    """
+    if cache is None:
+        results = [None for _ in tasks]
+    else:
+        results = [cache.get(p, seed) for p, seed in tasks]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if cache is not None:
+        print("cache {}: {} hits, {} misses".format(
+            cache.path, len(tasks) - len(missing), len(missing)))
+    if missing:
+        parameters = runner.parameters
+        runner.parameters = [{**tasks[i][0], 'seed': tasks[i][1]}
+                             for i in missing]
+        try:
+            runner.run(run_simulation, workers)
+        finally:
+            runner.parameters = parameters
+        for i, r in zip(missing, runner.results):
+            if cache is not None:
+                cache.put(*tasks[i], r)
+            results[i] = r
+    return results
 
 
-if __name__ == "__main__":
+def run_cached(runner, cache, workers=None):
+    """Run the tasks of a SingleRunner, skipping the ones whose results
+    are in the cache. The k-th repetition of a parameter set runs with
+    seed k, so that the same run has the same key across sweeps.
+    INPUTS:
+    - runner,   spg.runner.SingleRunner, its results are set
+    - cache,    eth_cache.ResultCache
+    """
+    repetitions = {}
+    seeds = []
+    for p in runner.parameters:
+        key = json.dumps(p, sort_keys=True)
+        seeds.append(repetitions.get(key, 0))
+        repetitions[key] = seeds[-1] + 1
+    runner.results = run_tasks(runner, list(zip(runner.parameters, seeds)),
+                               workers, cache)
+
+
+def repetitions_needed(runs, metrics, ci_width, max_repeat, confidence=0.95):
+    """Number of runs of a parameter set needed for the confidence
+    intervals of the metrics to be at most ci_width wide. The intervals
+    use the Student t quantile (see aggregate_results), so the few runs
+    of the first rounds give wide intervals and noisy parameter sets are
+    not stopped early. The number is the smallest n whose interval,
+    with the standard deviation of the runs so far, fits in ci_width.
+    Metrics without any value (e.g. no delayer block) are left out.
+    OUTPUTS:
+    - n,    int, between len(runs) and max_repeat
+    """
+    n = len(runs)
+    wanted = n
+    table = aggregate_results(runs, confidence)
+    for metric in metrics:
+        row = table[metric]
+        width = row["ci_high"] - row["ci_low"]
+        if row["n"] == 0 or width <= ci_width:
+            continue
+        if row["n"] < 2:
+            wanted = max(wanted, n + 1)
+            continue
+        # runs without a value of the metric are not counted
+        missing = n - row["n"]
+        needed = row["n"] + 1
+        while (needed + missing < max_repeat
+               and 2*student_t_quantile(confidence, needed - 1)*row["std"]
+               > ci_width*math.sqrt(needed)):
+            needed += 1
+        wanted = max(wanted, needed + missing)
+    return min(wanted, max_repeat)
+
+
+def run_adaptive(runner, ci_width, metrics=ADAPTIVE_METRICS, min_repeat=3,
+                 max_repeat=100, workers=None, cache=None, confidence=0.95):
+    """Run each parameter set of a SingleRunner until the confidence
+    intervals of the metrics are at most ci_width wide, see
+    repetitions_needed. Every round runs the missing repetitions of all
+    the parameter sets at once. The k-th repetition runs with seed k.
+    INPUTS:
+    - runner,   spg.runner.SingleRunner, built with repeat=1. Its parameters
+                and results are set to one entry per run
+    - cache,    eth_cache.ResultCache or None
+    """
+    points = runner.parameters
+    runs = [[] for _ in points]
+    wanted = [min(min_repeat, max_repeat) for _ in points]
+    while True:
+        tasks = [(i, seed) for i in range(len(points))
+                 for seed in range(len(runs[i]), wanted[i])]
+        if not tasks:
+            break
+        results = run_tasks(runner, [(points[i], seed) for i, seed in tasks],
+                            workers, cache)
+        for (i, _), r in zip(tasks, results):
+            runs[i].append(r)
+        wanted = [repetitions_needed(point_runs, metrics, ci_width,
+                                     max_repeat, confidence)
+                  for point_runs in runs]
+    print("adaptive: {} parameter sets, {} runs, {} at --max-repeat".format(
+        len(points), sum(len(r) for r in runs),
+        sum(len(r) >= max_repeat for r in runs)))
+    runner.parameters = [p for p, point_runs in zip(points, runs)
+                         for _ in point_runs]
+    runner.results = [r for point_runs in runs for r in point_runs]
+
+
+def main(argv=None):
+    command, options, args = parse_command_line(argv)
+
+    if options.profile_startup:
+        for module, seconds in profile_startup().items():
+            if seconds is None:
+                print("{:<12} not available".format(module), file=sys.stderr)
+            else:
+                print("{:<12} {:8.1f} ms".format(module, 1e3*seconds),
+                      file=sys.stderr)
+
+    if args:
+        from spg.runner import SingleRunner
+    cache = None
+    if args and options.cache is not None:
+        from eth_cache import ResultCache
+        cache = ResultCache(options.cache)
 
     for arg in args:
 
-        runner = SingleRunner(arg, options.repeat)
+        if options.ci_width is not None:
+            runner = SingleRunner(arg, 1)
+        else:
+            runner = SingleRunner(arg, options.repeat)
         if options.filter is not None:
             runner.filter(options.filter)
-        runner.run(run_simulation, options.workers)
+        if options.ci_width is not None:
+            run_adaptive(runner, options.ci_width,
+                         options.metrics.split(","), options.min_repeat,
+                         options.max_repeat, options.workers, cache,
+                         options.confidence)
+        elif cache is None:
+            runner.run(run_simulation, options.workers)
+        else:
+            run_cached(runner, cache, options.workers)
         runner.save_results(options.rewrite)
+
+    if cache is not None:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from eth_base import *
+import networkx as nx
 
 def __set_up_topology(parameters):
     topology = parameters['network_topology']
@@ -0,0 +1,87 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+def set_up(**kwargs):
+    """A block proposed by peer 0 and attested by all the validators,
+    gossiped to peer 2 before the block itself
+    """
+    net_p2p = nx.path_graph(3)
+    model = sample.Model(graph=net_p2p, tau_block=1, tau_attest=1,
+                         validators_per_node=2, seed=1, **kwargs)
+    model.nodes[0].propose_block()
+    block = model.blockchain[1]
+    n_validators = len(model.validators)
+    model.nodes[2].receive_attestations(np.full(n_validators, block.id),
+                                        np.zeros(n_validators, dtype=np.int64))
+    return model, block
+
+
+##################
+# actual testing
+
+def test_0():
+    """Attestations wait for their block, and are released on arrival
+    """
+    model, block = set_up()
+    node = model.nodes[2]
+    assert(node.n_cached == 6)
+    assert(list(node.cached_attestations) == [block.id])
+    assert(np.all(node.attestation_block == 0))
+
+    node.update_local_blockchain({block})
+    # testing
+    assert(node.n_cached == 0)
+    assert(node.cached_attestations == {})
+    assert(np.all(node.attestation_block == block.id))
+    assert(np.all(node.attestation_slot == 0))
+
+
+def test_1():
+    """Attestations to blocks not received in time are dropped
+    """
+    model, block = set_up(attestation_cache_expiry=4)
+    node = model.nodes[2]
+    model.slot_boundary.counter = 4
+    node.expire_cached_attestations()
+    assert(node.n_cached == 6)
+    model.slot_boundary.counter = 5
+    node.expire_cached_attestations()
+
+    node.update_local_blockchain({block})
+    # testing
+    assert(node.n_cached == 0)
+    assert(np.all(node.attestation_block == 0))
+
+
+def test_2():
+    """The cache is bounded
+    """
+    model, block = set_up(attestation_cache_size=4)
+    node = model.nodes[2]
+    # testing
+    assert(node.n_cached == 0)
+    assert(node.cached_attestations == {})
+
+
+def test_3():
+    """Slot boundaries expire the caches from the per-slot index, the
+    cache does not expire by default
+    """
+    model, block = set_up()
+    assert(model.cache_index == {})
+    model.slot_boundary.counter = 100
+    model.expire_cached_attestations()
+    assert(model.nodes[2].n_cached == 6)
+
+    model, block = set_up(attestation_cache_expiry=4)
+    # testing
+    assert(model.cache_index == {block.slot_no: {2}})
+    model.slot_boundary.counter = 5
+    model.expire_cached_attestations()
+    assert(model.cache_index == {} and model.nodes[2].n_cached == 0)
+    assert(model.nodes[2].cached_attestations == {})
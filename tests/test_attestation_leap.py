@@ -0,0 +1,89 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """Tau-leaped attestation gossip agrees with the exact engine, its
+    bias shrinks with the tolerance
+    """
+    net_p2p = nx.random_regular_graph(3, 12, seed=1)
+    params = dict(graph=net_p2p, tau_block=6, tau_attest=0.5,
+                  delay_share=0.25, delay_time=4)
+    seeds = range(64, 96)
+    exact = sample.Model.run_ensemble(params, seeds, stoping_time=120)
+    coarse = sample.Model.run_ensemble({**params, "attestation_tolerance": 0.8},
+                                       seeds, stoping_time=120)
+    fine = sample.Model.run_ensemble({**params, "attestation_tolerance": 0.2},
+                                     seeds, stoping_time=120)
+    # testing
+    for metric in ["mainchain_rate", "branch_ratio", "attestation_coverage_p50"]:
+        # the confidence intervals overlap
+        assert(fine[metric]["ci_low"] <= exact[metric]["ci_high"])
+        assert(exact[metric]["ci_low"] <= fine[metric]["ci_high"])
+        assert(exact[metric]["ci_low"] < exact[metric]["ci_high"])
+    # attestations cross one hop per leap: coarse leaps are late
+    metric = "attestation_coverage_p50"
+    assert(coarse[metric]["ci_low"] > exact[metric]["ci_high"])
+    assert(abs(fine[metric]["mean"] - exact[metric]["mean"])
+           < abs(coarse[metric]["mean"] - exact[metric]["mean"])/2)
+
+
+def test_1():
+    """Attestation gossip leaves the Gillespie processes
+    """
+    net_p2p = nx.cycle_graph(4)
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=0.1,
+                         attestation_tolerance=0.2, seed=1)
+    model.run(30)
+    # testing
+    assert(model.processes == [model.block_gossip_process])
+    assert(model.attestation_leap.max_step == 0.1*0.2)
+    assert(0 < model.attestation_leap.interval <= 0.1*0.2)
+    assert((model.attestation_slots == model.attestation_slots[0]).all())
+
+
+def test_2():
+    """An attestation crosses at most one hop per leap, leaps are skipped
+    while the tables agree
+    """
+    net_p2p = nx.path_graph(4)
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=1,
+                         attestation_tolerance=50, seed=1)
+    leap = model.attestation_leap
+    state = model.rng.bit_generator.state
+    leap.event()
+    assert(model.rng.bit_generator.state == state)
+    model.nodes[0].attest(np.array([0]), 0, 0)
+    reached = []
+    for _ in range(3):
+        leap.event()
+        reached.append(model.attestation_slots[:, 0].tolist())
+    # testing
+    assert(reached == [[0, 0, -1, -1], [0, 0, 0, -1], [0, 0, 0, 0]])
+    assert(model.attestations_agree())
+    leap.skip_to(1.)
+    assert(leap.next_event >= 1. > leap.next_event - leap.interval)
+
+
+def test_3():
+    """The step is the tolerance over the largest rate at which a peer
+    hears gossip from peers with a different table
+    """
+    net_p2p = nx.star_graph(4)
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=1,
+                         attestation_tolerance=0.5, seed=1)
+    leap = model.attestation_leap
+    # testing
+    assert(leap.step(leap.edge_rates()) == 0.5)
+    model.nodes[1].attest(np.array([1]), 0, 0)
+    assert(leap.step(leap.edge_rates()) == 0.5)
+    # the hub hears two peers with a different table
+    model.nodes[2].attest(np.array([2]), 0, 0)
+    assert(leap.step(leap.edge_rates()) == 0.25)
@@ -0,0 +1,104 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import eth_batch
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """View and table keys follow the views and tables of the replicas,
+    agree matches a direct comparison
+    """
+    net_p2p = nx.cycle_graph(6)
+    model = eth_batch.BatchModel(graph=net_p2p, tau_block=1, tau_attest=1,
+                                 validators_per_node=2, slots_per_epoch=2,
+                                 delay_share=0.5, delay_time=4,
+                                 replicas=3, seed=1)
+    model.run(100)
+    validators = np.arange(len(model.validators))
+    for r in range(model.replicas):
+        n_blocks = model.n_blocks[r]
+        for n in range(model.N):
+            known = np.flatnonzero(model.views[r, n, :n_blocks])
+            # testing
+            assert(model.view_keys[r, n]
+                   == np.bitwise_xor.reduce(model.block_keys[known]))
+            assert(model.table_keys[r, n] == np.bitwise_xor.reduce(
+                model.entry_keys(validators, model.table_blocks[r, n],
+                                 model.table_slots[r, n])))
+    views = model.views[:, :, :model.n_blocks.max()]
+    same = ((views == views[:, :1]).all(axis=(1, 2))
+            & (model.table_blocks == model.table_blocks[:, :1]).all(axis=(1, 2))
+            & (model.table_slots == model.table_slots[:, :1]).all(axis=(1, 2)))
+    assert(np.array_equal(model.agree(np.arange(3)), same))
+    model.run(200)
+    assert((model.block_reached[:, :model.n_blocks.max()]
+            == model.views[:, :, :model.n_blocks.max()].sum(axis=1)).all())
+    # the fork choice matches a walk over the subtree weights
+    replicas, peers = np.divmod(np.arange(3*model.N), model.N)
+    heads = model.fork_choice(replicas, peers)
+    for r, n, head in zip(replicas, peers, heads):
+        n_blocks = model.n_blocks[r]
+        parent = model.block_parent[r, :n_blocks]
+        weight = np.bincount(model.table_blocks[r, n], weights=model.stake,
+                             minlength=n_blocks)
+        for b in range(n_blocks - 1, 0, -1):
+            weight[parent[b]] += weight[b]
+        block = 0
+        while True:
+            children = [c for c in np.flatnonzero(parent == block)
+                        if model.views[r, n, c]]
+            if not children:
+                break
+            block = min(children, key=lambda c: (-weight[c], model.block_rank[r, c]))
+        assert(head == block)
+
+
+def test_1():
+    """Attestations to blocks not received yet wait for the block, the
+    replica methods act on one replica
+    """
+    net_p2p = nx.path_graph(3)
+    model = eth_batch.BatchModel(graph=net_p2p, tau_block=1, tau_attest=1,
+                                 replicas=2, seed=1)
+    model.slot = 1
+    model.propose_block(1, 0, 0.)
+    assert(model.n_blocks.tolist() == [1, 2])
+    model.attest(np.array([1]), np.array([0]), 0.)
+    model.gossip_attestations(np.array([1]), np.array([0]), np.array([1]),
+                              np.array([1.]))
+    # testing
+    assert(model.cached_block[1, 1, 0] == 1 and model.cached_slot[1, 1, 0] == 1)
+    assert(model.table_slots[1, 1, 0] == -1)
+    model.gossip_blocks(np.array([1]), np.array([0]), np.array([1]),
+                        np.array([2.]))
+    assert(model.cached_slot[1, 1, 0] == -1)
+    assert(model.table_blocks[1, 1, 0] == 1 and model.table_slots[1, 1, 0] == 1)
+    # peer 1 attests once the block of the slot arrives
+    assert(model.table_blocks[1, 1, 1] == 1)
+    attestations = model.god_view_attestations(1)
+    assert([attestations[v][0].id for v in range(3)] == [1, 1, 0])
+    assert(model.god_view_attestations(0)[0][0].id == 0)
+
+
+def test_2():
+    """Replicas have the distribution of separate Model runs
+    """
+    net_p2p = nx.random_regular_graph(4, 12, seed=1)
+    params = dict(graph=net_p2p, tau_block=4, tau_attest=2,
+                  delay_share=0.25, delay_time=4)
+    seeds = list(range(24))
+    runs = sample.Model.run_ensemble(params, seeds, 300)
+    batch = eth_batch.BatchModel.run_ensemble(params, seeds, 300)
+    # testing
+    assert(batch.keys() == runs.keys())
+    assert(batch["mainchain_rate"]["n"] == 24)
+    for metric in ("mainchain_rate", "branch_ratio", "block_coverage_p50",
+                   "attestation_coverage_p50", "reorg_rate"):
+        assert(batch[metric]["ci_low"] <= runs[metric]["ci_high"])
+        assert(runs[metric]["ci_low"] <= batch[metric]["ci_high"])
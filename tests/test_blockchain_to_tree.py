@@ -0,0 +1,59 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import visualizations
+
+
+##################
+# actual testing
+
+def test_0():
+    """Simple test
+    """
+    #################
+    # mock blockchain
+    genesis = sample.Block()
+    block_1 = sample.Block(parent=genesis, slot_no=1)
+    block_2 = sample.Block(parent=block_1, slot_no=2)
+    block_3 = sample.Block(parent=block_2, slot_no=3)
+    fork_2 = sample.Block(parent=block_1, slot_no=2)
+    mock_blockchain = [genesis, block_1, block_2, fork_2, block_3]
+
+    tree = sample.blockchain_to_tree(mock_blockchain)
+    edges = {(tree.blocks[c], tree.blocks[p]) for c, p in tree.edges()}
+    graph = sample.blockchain_to_digraph(mock_blockchain)
+
+    # testing
+    assert(edges == {(block_1, genesis), (block_2, block_1),
+                     (fork_2, block_1), (block_3, block_2)})
+    assert(set(graph.edges()) == edges)
+    # no spurious None node
+    assert(set(graph.nodes()) == set(mock_blockchain))
+    assert(tree.to_networkx() is tree.to_networkx())
+
+
+def test_1():
+    """Layout of the blocktree on the sparse form
+    """
+    genesis = sample.Block()
+    block_1 = sample.Block(parent=genesis, slot_no=1)
+    block_2 = sample.Block(parent=block_1, slot_no=2)
+    block_3 = sample.Block(parent=block_2, slot_no=3)
+    fork_2 = sample.Block(parent=block_1, slot_no=2)
+    fork_4 = sample.Block(parent=block_3, slot_no=4)
+    tree = sample.blockchain_to_tree([genesis, block_1, block_2, block_3,
+                                      fork_2, fork_4])
+
+    position = visualizations.blockchain_layout(tree)
+    # testing
+    assert(np.array_equal(position[fork_4], [4, 0]))
+    assert(np.array_equal(position[genesis], [0, 0]))
+    assert(np.array_equal(position[fork_2], [2, 1]))
+    relative = visualizations.blockchain_layout_slot(tree, relative=True)
+    assert(np.array_equal(relative[fork_2], [0.5, 1]))
+    # the networkx DiGraph of the blocks is still accepted
+    graph = sample.blockchain_to_digraph(tree.blocks)
+    from_graph = visualizations.blockchain_layout(graph)
+    assert(all(np.array_equal(from_graph[b], position[b]) for b in tree.blocks))
@@ -0,0 +1,55 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+
+
+##################
+# actual testing
+
+def test_0():
+    """Simple test
+    """
+    #################
+    # mock arrivals: 3 blocks after genesis on 3 nodes
+    recorder = sample.PropagationRecorder(n_nodes=3, capacity=2)
+    blocks = [sample.Block(id=i) for i in range(4)]
+    for b, t in zip(blocks, [0., 12., 24., 36.]):
+        recorder.record_block_creation(b, 0, t)
+        recorder.record_block_arrival({b}, 1, t + 1.)
+    # only the first two blocks reach the third node
+    recorder.record_block_arrival({blocks[1]}, 2, 15.)
+    recorder.record_block_arrival({blocks[2]}, 2, 26.)
+
+    coverage = recorder.block_coverage_times(4)
+
+    # testing
+    assert(np.allclose(np.sort(coverage), [2., 3.]))
+    res = sample.calculate_coverage_percentiles(coverage, "block")
+    assert(res["block_coverage_p50"] == 2.5)
+    assert(set(res) == {"block_coverage_p50",
+                        "block_coverage_p90",
+                        "block_coverage_p99"})
+
+
+def test_1():
+    "test attestations"
+    recorder = sample.PropagationRecorder(n_nodes=2)
+    recorder.record_attestation_issue(0, 1, 4.)
+    recorder.record_attestation_arrivals(np.array([0, 0]), np.array([1, 1]),
+                                         1, 4.5)
+    # a newer attestation replaces the tracked one
+    recorder.record_attestation_issue(0, 2, 16.)
+    # late arrival of the old attestation is ignored
+    recorder.record_attestation_arrivals(np.array([0]), np.array([1]),
+                                         1, 16.5)
+
+    coverage = recorder.attestation_coverage_times()
+    assert(np.allclose(coverage, [0.5]))
+
+
+def test_2():
+    "test nothing covered"
+    res = sample.calculate_coverage_percentiles(np.array([]), "attestation")
+    assert(all(np.isnan(v) for v in res.values()))
@@ -3,6 +3,7 @@ import sys
 import numpy as np
 sys.path.append("../")
 import eth_base as sample
+import networkx as nx
 
 
 ##################
@@ -49,3 +50,16 @@ def test_0():
 
     # testing
     assert(sample.calculate_entropy(mock_blockchain) == np.log(5)-(4/5)*np.log(4))
+
+
+def test_1():
+    """The children histogram of a run gives the entropy of its blocktree
+    """
+    net_p2p = nx.cycle_graph(8)
+    model = sample.Model(graph=net_p2p, tau_block=8, tau_attest=1, seed=1)
+    model.run(300)
+    counts = np.bincount([len(block.children) for block in model.blockchain])
+    # testing
+    assert(np.array_equal(model.children_histogram.counts[:len(counts)], counts))
+    assert(np.isclose(model.children_histogram.entropy(),
+                      sample.calculate_entropy(model.blockchain)))
@@ -0,0 +1,92 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+def live_edges(network):
+    n = network.num_edges
+    return set(zip(network.sources[:n].tolist(), network.indices[:n].tolist()))
+
+
+##################
+# actual testing
+
+def test_0():
+    """Edge arrays and neighbour sets follow leaves, joins and rewiring
+    """
+    net_p2p = nx.cycle_graph(5)
+    network = sample.DynamicNetwork(net_p2p)
+    network.leave(0)
+    assert(live_edges(network) == {(1, 2), (2, 1), (2, 3), (3, 2), (3, 4), (4, 3)})
+    network.add_edge(1, 3, latency=2.)
+    network.remove_edge(3, 4)
+    network.add_edge(0, 2)
+    # testing
+    assert(sorted(network.neighbors(3).tolist()) == [1, 2])
+    assert(set(network.edge_index) == live_edges(network))
+    assert(network.rate_sum == 5)
+    assert(sorted(network.online_order[:network.n_online].tolist()) == [1, 2, 3, 4])
+    network.join(0)
+    assert(sorted(network.neighbors(0).tolist()) == [1, 4])
+    assert(network.n_online == 5)
+    network.reset()
+    assert(len(live_edges(network)) == 10)
+
+
+def test_1():
+    """Gossip rates follow the live edges, offline peers neither propose
+    nor receive blocks
+    """
+    net_p2p = nx.cycle_graph(6)
+    model = sample.Model(graph=net_p2p, tau_block=1, tau_attest=1, offline=[3],
+                         churn_schedule=[(30, "leave", 0), (30, "join", 3)],
+                         seed=1)
+    assert(model.block_gossip_process.lam == 8)
+    model.run(25)
+    assert(not model.views[1:len(model.blockchain), 3].any())
+    assert(all(block.emitter.id != 3 for block in model.blockchain[1:]))
+    model.run(60)
+    # testing
+    assert(model.block_gossip_process.lam == 8)
+    assert(model.gillespie.lambda_sum == 16)
+    assert(model.network.online.tolist() == [False] + [True]*5)
+    assert(model.views[1:len(model.blockchain) - 1, 3].all())
+
+
+def test_2():
+    """Stochastic churn keeps the edges among the online peers
+    """
+    net_p2p = nx.random_regular_graph(4, 20, seed=1)
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=1,
+                         tau_online=100, tau_offline=50, seed=2)
+    model.run(600)
+    network = model.network
+    online = set(np.flatnonzero(network.online).tolist())
+    expected = {(u, v) for u, v in net_p2p.edges() if {u, v} <= online}
+    # testing
+    assert(0 < network.n_online < 20)
+    assert(live_edges(network) == expected | {(v, u) for u, v in expected})
+    assert(model.churn_process.lam == network.n_online/100 + (20 - network.n_online)/50)
+    model.reset(2)
+    assert(network.n_online == 20 and network.num_edges == 80)
+
+
+def test_3():
+    """Without live edges only the fixed events move the time
+    """
+    model = sample.Model(graph=nx.star_graph(3), tau_block=2, tau_attest=1,
+                         offline=[0], seed=1)
+    model.run(100)
+    # testing
+    assert(model.gillespie.lambda_sum == 0)
+    assert(model.time == 100)
+    assert(len(model.blockchain) > 1)
+    assert((model.views[1:len(model.blockchain)].sum(axis=1) == 1).all())
+    model = sample.Model(graph=nx.path_graph(2), tau_block=2, tau_attest=1,
+                         churn_schedule=[(10, "remove_edge", 0, 1)], seed=1)
+    model.run(100)
+    assert(model.network.num_edges == 0)
+    assert(model.time == 100)
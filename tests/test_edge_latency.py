@@ -0,0 +1,72 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """The alias table draws outcomes proportionally to their weights
+    """
+    rng = np.random.default_rng(1)
+    table = sample.AliasTable([1, 0, 3, 4])
+    counts = np.bincount([table.sample(rng) for _ in range(40000)], minlength=4)
+    # testing
+    assert(counts[1] == 0)
+    assert(np.allclose(counts/40000, [0.125, 0, 0.375, 0.5], atol=0.01))
+
+
+def test_1():
+    """Latencies are read from an edge attribute or a latency matrix
+    """
+    net_p2p = nx.path_graph(3)
+    net_p2p[0][1]["latency"] = 2.
+    network = sample.Network(net_p2p, "latency")
+    matrix = np.array([[1, 2, 1], [4, 1, 5], [1, 6, 1]])
+    # testing
+    # directed edges 0-1, 1-0, 1-2, 2-1
+    assert(network.latencies.tolist() == [2, 2, 1, 1])
+    assert(sample.Network(net_p2p, matrix).latencies.tolist() == [2, 4, 5, 6])
+
+
+def test_2():
+    """Edges gossip at rates inversely proportional to their latencies
+    """
+    net_p2p = nx.path_graph(3)
+    model = sample.Model(graph=net_p2p, tau_block=1, tau_attest=1,
+                         edge_latency=[1, 1, 4, 4], seed=1)
+    process = model.block_gossip_process
+    edges = [tuple(n.id for n in process.sample_edge()) for _ in range(10000)]
+    slow = sum(edge in ((1, 2), (2, 1)) for edge in edges)
+    # testing
+    assert(process.lam == 2.5)
+    assert(abs(slow/10000 - 0.2) < 0.02)
+
+
+def test_3():
+    """Edge attributes are read before the topology is shared
+    """
+    net_p2p = nx.cycle_graph(6)
+    for u, v in net_p2p.edges():
+        net_p2p[u][v]["latency"] = 1. + u
+    params = dict(graph=net_p2p, tau_block=2, tau_attest=1,
+                  edge_latency="latency")
+    runs = sample.Model.ensemble_runs(params, [1, 2], 60)
+    shared = sample.Model.ensemble_runs(params, [1, 2], 60, processes=2)
+    topology = sample.SharedTopology.from_graph(net_p2p)
+    try:
+        sample.Network(topology, "latency")
+        raised = False
+    except ValueError:
+        raised = True
+    finally:
+        topology.unlink()
+    # testing
+    for run, shared_run in zip(runs, shared):
+        assert(np.array_equal([run[k] for k in run],
+                              [shared_run[k] for k in run], equal_nan=True))
+    assert(raised)
@@ -0,0 +1,33 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+
+
+##################
+# actual testing
+
+def test_0():
+    """Simple test
+    """
+    validators = list(range(70))
+    is_attesting = np.ones(70, dtype=bool)
+    epoch = sample.EpochBoundary(slot_interval=12,
+                                 validators=validators,
+                                 slots_per_epoch=32,
+                                 is_attesting=is_attesting,
+                                 rng=np.random.default_rng(0))
+    epoch.event()
+
+    committees = [epoch.committee(c) for c in range(32)]
+
+    # testing
+    # committees partition the validators
+    assert(sorted(np.concatenate(committees).tolist()) == validators)
+    # 70 = 2*32 + 6: six committees get a leftover validator
+    assert(sorted(len(c) for c in committees) == [2]*26 + [3]*6)
+    # the model validators are not reordered
+    assert(validators == list(range(70)))
+    # attesters are disabled
+    assert(not is_attesting.any())
@@ -0,0 +1,103 @@
+"""Module providing Function to change path"""
+import sys
+sys.path.append("../")
+import ethereum_abm
+
+
+##################
+# actual testing
+
+def test_0():
+    """Command line is parsed by main only
+    """
+    command, options, args = ethereum_abm.parse_command_line(
+        ["ethereum_abm.py", "--repeat=2", "--profile-startup", "main.spg"])
+    # testing
+    assert(options.repeat == 2)
+    assert(options.profile_startup)
+    assert(args == ["main.spg"])
+
+
+def test_1():
+    """Import times of the modules
+    """
+    times = ethereum_abm.profile_startup(["numpy", "no_such_module"])
+    # testing
+    assert(times["numpy"] > 0)
+    assert(times["no_such_module"] is None)
+
+
+def test_2():
+    """Simulation wrapper, for both engines
+    """
+    parameters = {'network_topology': "TREE", 'no_nodes': 7, 'no_neighs': 2,
+                  'tree_r': 2, 'tau_block': 1, 'tau_attestation': 1,
+                  'delay_share': 0, 'delay_time': 0, 'simulation_time': 30}
+    exact = ethereum_abm.run_simulation(parameters)
+    rounds = ethereum_abm.run_simulation({**parameters, 'engine': "ROUNDS"})
+    # testing
+    assert(exact.keys() == rounds.keys())
+    assert(exact["diameter"] == rounds["diameter"] == 4)
+
+
+class Runner:
+    """Stands for spg.runner.SingleRunner."""
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.runs = 0
+
+    def run(self, run_simulation, workers=None):
+        self.runs += len(self.parameters)
+        self.results = [run_simulation(p) for p in self.parameters]
+
+
+def test_3():
+    """Sweeps only run the tasks missing from the cache
+    """
+    import eth_cache
+    parameters = {'network_topology': "ER", 'no_nodes': 8, 'no_neighs': 3,
+                  'tau_block': 1, 'tau_attestation': 1, 'delay_share': 0,
+                  'delay_time': 0, 'simulation_time': 30}
+    cache = eth_cache.ResultCache(":memory:", version="test")
+    runner = Runner([parameters, parameters])
+    ethereum_abm.run_cached(runner, cache)
+    first = runner.results
+    runner = Runner([parameters, parameters, parameters])
+    ethereum_abm.run_cached(runner, cache)
+    # testing
+    assert(runner.runs == 1)
+    assert([r["block_coverage_p50"] for r in runner.results[:2]]
+           == [r["block_coverage_p50"] for r in first])
+    assert(len(runner.parameters) == 3)
+    assert(cache.stats()["hits"] == 2)
+    assert(cache.stats()["misses"] == 3)
+
+
+def test_4():
+    """Repetitions needed for the confidence intervals to converge
+    """
+    constant = [{"x": 1., "y": float("nan")} for _ in range(3)]
+    noisy = [{"x": x, "y": float("nan")} for x in (0., 1., 0., 1.)]
+    # testing
+    assert(ethereum_abm.repetitions_needed(constant, ["x", "y"], 0.1, 50) == 3)
+    # width 2*t(n - 1)*0.577/sqrt(n) <= 0.5 from n = 23 on, capped
+    assert(ethereum_abm.repetitions_needed(noisy, ["x"], 0.1, 50) == 50)
+    assert(ethereum_abm.repetitions_needed(noisy, ["x"], 0.5, 100) == 23)
+    # the normal interval at n = 3 is only 1.31 wide, the t one 2.87
+    assert(ethereum_abm.repetitions_needed(noisy[:3], ["x"], 1.7, 100) == 5)
+
+
+def test_5():
+    """Adaptive sweeps spend the runs on the noisy parameter sets
+    """
+    parameters = {'network_topology': "TREE", 'no_nodes': 7, 'no_neighs': 2,
+                  'tree_r': 2, 'tau_block': 1, 'tau_attestation': 1,
+                  'delay_share': 0, 'delay_time': 0, 'simulation_time': 120}
+    noisy = {**parameters, 'tau_block': 20, 'tau_attestation': 20}
+    runner = Runner([parameters, noisy])
+    ethereum_abm.run_adaptive(runner, 0.01, min_repeat=2, max_repeat=6)
+    # testing
+    assert(runner.parameters.count(parameters) == 2)
+    assert(runner.parameters.count(noisy) == 6)
+    assert(len(runner.results) == 8)
@@ -0,0 +1,61 @@
+"""Module providing Function to change path"""
+import os
+import sys
+import tempfile
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """Replaying a trace rebuilds the views and the attestation tables
+    """
+    params = dict(graph=nx.random_regular_graph(4, 20, seed=1), tau_block=3,
+                  tau_attest=2, validators_per_node=2, slots_per_epoch=4,
+                  delay_share=0.2, delay_time=4, finality="ffg")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run.trace")
+        model = sample.Model(**params, seed=3)
+        model.run(300, trace=path)
+        replay = sample.Model(**params, seed=3)
+        sample.replay_trace(path, replay)
+    # testing
+    assert(len(replay.blockchain) == len(model.blockchain))
+    assert(replay.block_parent.tolist() == model.block_parent.tolist())
+    assert((replay.views == model.views).all())
+    assert((replay.attestation_blocks == model.attestation_blocks).all())
+    assert((replay.attestation_slots == model.attestation_slots).all())
+    assert(replay.finalized.id == model.finalized.id)
+    assert(replay.results()["mainchain_rate"] == model.results()["mainchain_rate"])
+
+
+def test_1():
+    """Replay stops at the given time, records are fixed-width
+    """
+    params = dict(graph=nx.cycle_graph(6), tau_block=2, tau_attest=1,
+                  attestation_tolerance=0.5)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run.trace")
+        model = sample.Model(**params, seed=1)
+        with sample.EventTrace(path, model, buffer_size=16) as trace:
+            model.run(60, trace=trace)
+            partial = sample.Model(**params, seed=1)
+            partial.run(30)
+        header, records = sample.read_trace(path)
+        replay = sample.Model(**params, seed=1)
+        sample.replay_trace(path, replay, until=partial.time)
+        size = os.path.getsize(path)
+    # testing
+    assert(header["n_nodes"] == 6)
+    assert(size == sample.EventTrace.HEADER_DTYPE.itemsize
+           + len(records)*sample.EventTrace.TRACE_DTYPE.itemsize)
+    assert(np.all(np.diff(records["time"]) >= 0))
+    assert((records["kind"] == sample.TRACE_SLOT).sum() == 5)
+    assert(len(replay.blockchain) == len(partial.blockchain))
+    assert((replay.views == partial.views[:len(replay.views)]).all())
+    # leaps merge the tables of the start of the leap in the replay too
+    assert((replay.attestation_slots == partial.attestation_slots).all())
@@ -0,0 +1,77 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """Partitions mask the edges between groups, heal clears every fault
+    """
+    net_p2p = nx.cycle_graph(6)
+    network = sample.Network(net_p2p)
+    network.partition([[0, 1, 2], [3, 4, 5]])
+    cut = {(int(network.sources[e]), int(network.indices[e]))
+           for e in np.flatnonzero(~network.enabled)}
+    # testing
+    assert(cut == {(0, 5), (5, 0), (2, 3), (3, 2)})
+    network.drop([(0, 1)], 0.5)
+    network.delay([(1, 2)], 4)
+    probability = dict(zip(zip(network.sources.tolist(), network.indices.tolist()),
+                           network.delivery_probability().tolist()))
+    assert(probability[(1, 0)] == 0.5 and probability[(2, 1)] == 0.25)
+    assert(probability[(0, 5)] == 0 and probability[(4, 5)] == 1)
+    network.heal()
+    assert(not network.faulty and network.delivery_probability().min() == 1)
+    # the unlisted peers form one group, still connected to each other
+    network.partition([[0]])
+    cut = {(int(network.sources[e]), int(network.indices[e]))
+           for e in np.flatnonzero(~network.enabled)}
+    assert(network.part.tolist() == [0, -1, -1, -1, -1, -1])
+    assert(cut == {(0, 1), (1, 0), (0, 5), (5, 0)})
+
+
+def test_1():
+    """Blocks do not cross a partition until it heals
+    """
+    net_p2p = nx.path_graph(6)
+    model = sample.Model(graph=net_p2p, tau_block=0.5, tau_attest=0.5,
+                         fault_schedule=[(0, "partition", [0, 0, 0, 1, 1, 1]),
+                                         (60, "heal")],
+                         seed=1)
+    model.run(59)
+    n_blocks = len(model.blockchain)
+    emitted = np.array([block.emitter.id < 3 for block in model.blockchain[1:]])
+    views = model.views[1:n_blocks]
+    # testing
+    assert(not (views[emitted][:, 3:]).any())
+    assert(not (views[~emitted][:, :3]).any())
+    model.run(120)
+    assert(model.views[:n_blocks].all())
+
+
+def test_2():
+    """Lost gossip thins the events of an edge, new edges across a
+    partition of a dynamic network are cut
+    """
+    net_p2p = nx.path_graph(3)
+    model = sample.Model(graph=net_p2p, tau_block=1, tau_attest=1, seed=1)
+    model.network.drop([(0, 1)], 0.75)
+    process = model.block_gossip_process
+    delivered = [process.deliver() for _ in range(8000)]
+    lost = sum(edge is None for edge in delivered)
+    # testing
+    assert(abs(lost/8000 - 0.375) < 0.02)
+    network = sample.DynamicNetwork(nx.path_graph(4))
+    network.partition([[0, 1], [2, 3]])
+    network.add_edge(0, 3)
+    network.add_edge(0, 2)
+    network.remove_edge(1, 2)
+    enabled = {(int(network.sources[e]), int(network.indices[e])): network.enabled[e]
+               for e in range(network.num_edges)}
+    assert(enabled == {(0, 1): True, (1, 0): True, (2, 3): True, (3, 2): True,
+                       (0, 3): False, (3, 0): False, (0, 2): False, (2, 0): False})
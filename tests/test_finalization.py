@@ -0,0 +1,36 @@
+"""Module providing Function to change path"""
+import sys
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """Simple test
+    """
+    net_p2p = nx.cycle_graph(8)
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=1,
+                         finality="ffg", seed=2)
+    model.run(300)
+
+    checkpoints = model.finalized_checkpoints
+    finalized = model.finalized
+
+    # testing
+    assert(finalized.height > 0)
+    # checkpoints form a chain
+    for previous, checkpoint in zip(checkpoints[:-1], checkpoints[1:]):
+        assert(previous in sample.get_main_chain(checkpoint))
+    # views only keep the finalized checkpoint and its descendants
+    for node in model.nodes:
+        assert(finalized in node.local_blockchain)
+        for block in node.local_blockchain:
+            assert(finalized in sample.get_main_chain(block))
+    # the archive still holds every block
+    assert(len(model.blockchain) == model.blockchain[-1].id + 1)
+    assert(finalized in sample.get_main_chain(
+        sample.lmd_ghost(set(model.blockchain), model.god_view_attestations(),
+                         root=finalized)))
@@ -0,0 +1,31 @@
+"""Module providing Function to change path"""
+import sys
+sys.path.append("../")
+import eth_base as sample
+
+
+##################
+# actual testing
+
+def test_0():
+    """Simple test
+    """
+    B0 = sample.Block(emitter="genesis", parent=None, slot_no=0)
+    B1 = sample.Block(emitter="genesis", parent=B0, slot_no=1)
+
+    cache = sample.HeadCache(maxsize=2)
+    assert(cache.get(1) is None)
+    cache.put(1, B0)
+    cache.put(2, B1)
+    assert(cache.get(1) is B0)
+    # 2 is the least recently used entry
+    cache.put(3, B1)
+    assert(cache.get(2) is None)
+    assert(cache.get(3) is B1)
+
+    # testing
+    stats = cache.stats()
+    assert(stats["hits"] == 2)
+    assert(stats["misses"] == 2)
+    assert(stats["hit_rate"] == 0.5)
+    assert(stats["size"] == 2)
@@ -0,0 +1,44 @@
+"""Module providing Function to change path"""
+import sys
+sys.path.append("../")
+import eth_base as sample
+
+
+##################
+# actual testing
+
+def test_0():
+    """Simple test
+    """
+    #################
+    # mock blockchain
+    genesis = sample.Block()
+    block_1 = sample.Block(parent=genesis, slot_no=1)
+    block_2 = sample.Block(parent=block_1, slot_no=2)
+    block_3 = sample.Block(parent=block_2, slot_no=4)
+    fork_3 = sample.Block(parent=block_2, slot_no=3)
+
+    # testing
+    assert(list(block_3) == [block_3, block_2, block_1, genesis])
+    assert(list(sample.iter_chain(block_3, stop_at=block_1))
+           == [block_3, block_2, block_1])
+    assert(sample.chain_slice(block_3, 1, 4) == [block_1, block_2])
+    assert(sample.chain_slice(block_3, 3, 10) == [block_3])
+    assert(sample.get_ancestor(block_3, 1) is block_1)
+    assert(sample.get_ancestor(block_1, 2) is None)
+    assert(sample.is_ancestor(block_2, fork_3))
+    assert(not sample.is_ancestor(block_3, fork_3))
+    assert(block_3.predecessors == {block_3, block_2, block_1, genesis})
+
+
+def test_1():
+    """The walk stops with the caller
+    """
+    genesis = sample.Block()
+    block_1 = sample.Block(parent=genesis, slot_no=1)
+    chain = sample.iter_chain(block_1)
+    next(chain)
+    # the parent is only read when the walk resumes
+    block_1.parent = None
+    # testing
+    assert(list(chain) == [])
@@ -1,5 +1,6 @@
 """Module providing Function to change path"""
 import sys
+import numpy as np
 sys.path.append("../")
 import eth_base as sample
 
@@ -150,3 +151,25 @@ def test_6():
         test.append(sample.lmd_ghost(blockchain, attestations))
     for l in range(10):
         assert(test[l] is test[0])
+
+
+def test_7():
+    "test stake weighted fork choice"
+    B0 = sample.Block(emitter="genesis", parent=None, slot_no=0)
+    B1 = sample.Block(emitter="genesis", parent=B0, slot_no=1)
+    B2 = sample.Block(emitter="genesis", parent=B0, slot_no=2)
+
+    blockchain = {B0, B1, B2}
+
+    attestations = {0: [B1],
+                    1: [B2],
+                    2: [B2],
+                    3: [B2]}
+
+    assert(sample.lmd_ghost(blockchain, attestations) is B2)
+
+    # a whale attesting B1 outweighs the other validators
+    stake = np.array([32., 1., 1., 1.])
+    assert(sample.lmd_ghost(blockchain, attestations, stake) is B1)
+    weight = sample.calculate_blocks_weight([B0, B1, B2], attestations, stake)
+    assert(weight == [35., 32., 3.])
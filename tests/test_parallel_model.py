@@ -0,0 +1,133 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import eth_parallel
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """Partitions keep the communities, or contiguous chunks, together
+    """
+    network = sample.Network(nx.path_graph(9))
+    part = eth_parallel.partition_network(network, 3)
+    # testing
+    assert(sorted(np.bincount(part).tolist()) == [3, 3, 3])
+    assert(np.count_nonzero(np.diff(part)) == 2)
+    labels = np.array([0, 0, 0, 0, 1, 1, 2, 2, 2])
+    part = eth_parallel.partition_network(network, 2, labels)
+    assert(part.tolist() == [0, 0, 0, 0, 1, 1, 1, 1, 1])
+
+
+def test_1():
+    """Coverage of an attestation within a partition
+    """
+    recorder = eth_parallel.PartitionRecorder(4, n_own=2)
+    recorder.record_attestation_issue(0, 1, 1.)
+    # the attestation of peer 3 is tracked from its first arrival
+    recorder.record_attestation_arrivals(np.array([0, 3]), np.array([1, 2]), 1, 2.)
+    recorder.record_attestation_arrivals(np.array([3]), np.array([2]), 0, 5.)
+    # testing
+    assert(recorder.issued == {(0, 1): 1.})
+    assert(recorder.covered == {(0, 1): 2., (3, 2): 5.})
+
+
+def test_2():
+    """The parallel engine returns the metrics of the exact engine
+    """
+    net_p2p = nx.cycle_graph(8)
+    params = dict(graph=net_p2p, tau_block=2, tau_attest=1,
+                  delay_share=0.25, delay_time=4)
+    model = sample.Model(**params, seed=1)
+    model.run(100)
+    parallel = eth_parallel.ParallelModel(**params, partitions=2, seed=1)
+    try:
+        parallel.run(100)
+        results = parallel.results()
+        n_blocks = len(parallel.blockchain)
+        views = [parallel.call(p, "export_blocks", i)
+                 for i, p in enumerate(parallel.part)]
+    finally:
+        parallel.close()
+    # testing
+    assert(results.keys() == model.results().keys())
+    assert(results["diameter"] == 4)
+    assert(np.all(np.diff([b.slot_no for b in parallel.blockchain]) >= 0))
+    # blocks older than a slot reached every peer
+    old = [b.id for b in parallel.blockchain if b.slot_no < parallel.slot - 1]
+    assert(all(set(old) <= set(view.tolist()) for view in views))
+    assert(n_blocks > 1)
+
+
+def test_3():
+    """Runs of the parallel engine have the distribution of exact runs
+    """
+    net_p2p = nx.cycle_graph(8)
+    params = dict(graph=net_p2p, tau_block=4, tau_attest=2,
+                  delay_share=0.25, delay_time=4)
+    seeds = list(range(20))
+    exact = sample.Model.run_ensemble(params, seeds, 300)
+    parallel = eth_parallel.ParallelModel.run_ensemble(
+        dict(params, partitions=2), seeds, 300)
+    # testing
+    assert(parallel.keys() == exact.keys())
+    for metric in ("mainchain_rate", "blocktree_entropy", "block_coverage_p50",
+                   "attestation_coverage_p50"):
+        assert(parallel[metric]["ci_low"] <= exact[metric]["ci_high"])
+        assert(exact[metric]["ci_low"] <= parallel[metric]["ci_high"])
+
+
+def test_4():
+    """Edge latencies reach the workers and weight the edges between
+    partitions
+    """
+    net_p2p = nx.path_graph(4)
+    latencies = [1, 1, 4, 4, 1, 1]
+    model = eth_parallel.ParallelModel(graph=net_p2p, tau_block=2,
+                                       tau_attest=1, edge_latency=latencies,
+                                       partition=[0, 0, 1, 1], seed=1)
+    try:
+        model.run(50)
+        results = model.results()
+    finally:
+        model.close()
+    # testing
+    # edges 1-2 and 2-1 cross the partitions
+    assert(model.cross_rate_sum == 0.5)
+    assert(model.cross_rates == (0.25, 0.5))
+    assert(results["diameter"] == 3)
+
+
+def test_5():
+    """Workers send the changes since the last message to the partition,
+    the copy of the remote peer gossips them to the own peer
+    """
+    import multiprocessing
+    params = dict(graph=nx.path_graph(4), tau_block=1, tau_attest=1)
+    part = np.array([0, 0, 1, 1])
+    link, other_link = multiprocessing.Pipe()
+    worker = eth_parallel.PartitionWorker(params, part, 0, {1: link})
+    other = eth_parallel.PartitionWorker(params, part, 1, {0: other_link})
+    worker.reset(1, [])
+    other.reset(2, [])
+    worker.propose(1)
+    other.mirror(1, 0, 0, 1)
+    # peer 1 gossips its blocks to peer 2 at time 1
+    event = (np.array([1.]), np.array([0]), np.array([1]), np.array([2]))
+    worker.window(*event)
+    other.window(*event)
+    # testing
+    assert(1 in other.export_blocks(2).tolist())
+    assert(len(worker.export_delta(0, 1, 1)) == 0)
+    worker.model.nodes[1].issue_attestation()
+    validators, blocks, slots = worker.export_delta(1, 1, 1)
+    assert(validators.tolist() == [1] and blocks.tolist() == [1])
+    assert(len(worker.export_delta(1, 1, 1)[0]) == 0)
+    other.receive_delta(1, 1, 2, (validators, blocks, slots))
+    assert(other.model.nodes[2].attestation_block[1] == 1)
+    link.close()
+    other_link.close()
@@ -0,0 +1,77 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import eth_rounds
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """Reorg depth is the height of the old head above the common ancestor
+    """
+    genesis = sample.Block()
+    a1 = sample.Block(parent=genesis, id=1)
+    a2 = sample.Block(parent=a1, id=2)
+    b1 = sample.Block(parent=genesis, id=3)
+    b2 = sample.Block(parent=b1, id=4)
+    b3 = sample.Block(parent=b2, id=5)
+    blockchain = [genesis, a1, a2, b1, b2, b3]
+    # testing
+    assert(sample.common_ancestor(a2, b3) is genesis)
+    assert(sample.common_ancestor(b3, b1) is b1)
+    recorder = sample.ReorgRecorder(2, capacity=2)
+    for head in (a1, a2, b3):
+        recorder.observe(0, head, blockchain)
+    recorder.observe(1, b2, blockchain)
+    recorder.observe(1, a1, blockchain)
+    assert(recorder.depth_counts.tolist() == [0, 0, 2, 0])
+    assert(recorder.heads.tolist() == [5, 1])
+    metrics = sample.calculate_reorg_metrics(recorder.depth_counts, 2, 4)
+    assert(metrics["reorg_rate"] == 0.25)
+    assert(metrics["reorg_depth_2"] == 2 and metrics["reorg_depth_max"] == 2)
+
+
+def test_1():
+    """Batched head tracking counts the reorgs of every replica
+    """
+    net_p2p = nx.path_graph(2)
+    model = eth_rounds.BatchRoundModel(graph=net_p2p, tau_block=1,
+                                       tau_attest=1, replicas=2, seed=1)
+    # replica 0: 0 <- 1 <- 2 and 0 <- 3, replica 1: 0 <- 1 <- 2 <- 3
+    model.propose_blocks(np.array([0, 1]), np.array([0, 0]), 0)
+    model.propose_blocks(np.array([0, 1]), np.array([0, 0]), 0)
+    model.propose_blocks(np.array([0, 1]), np.array([1, 0]), 0)
+    assert(model.block_height[:, :4].tolist() == [[0, 1, 2, 1], [0, 1, 2, 3]])
+    # proposers observed the parents of their blocks
+    assert(model.heads.tolist() == [[1, 0], [2, 0]])
+    model.observe_heads(np.array([0, 1]), np.array([0, 0]), np.array([3, 1]))
+    # testing
+    assert(model.reorg_depths[:, 1].tolist() == [1, 1])
+    # extensions of the old head are not reorgs
+    model.observe_heads(np.array([0, 1]), np.array([1, 1]), np.array([3, 3]))
+    assert(model.reorg_depths.sum() == 2)
+    assert(model.heads.tolist() == [[3, 3], [1, 3]])
+
+
+def test_2():
+    """Every engine reports the reorgs seen by the peers
+    """
+    net_p2p = nx.random_regular_graph(4, 20, seed=1)
+    params = dict(graph=net_p2p, tau_block=4, tau_attest=2, delay_share=0.2,
+                  delay_time=6)
+    model = sample.Model(**params, seed=2)
+    model.run(600)
+    results = model.results()
+    depth_counts = model.reorg_recorder.depth_counts
+    # testing
+    assert(depth_counts.sum() > 0)
+    assert(results["reorg_rate"] == depth_counts.sum()/(20*model.slot_boundary.counter))
+    assert(sum(results["reorg_depth_{}".format(d)] for d in (1, 2, 3))
+           + results["reorg_depth_4plus"] == depth_counts.sum())
+    rounds = eth_rounds.RoundModel(**params, seed=2)
+    rounds.run(600)
+    assert(rounds.results().keys() == results.keys())
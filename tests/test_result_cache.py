@@ -0,0 +1,55 @@
+"""Module providing Function to change path"""
+import sys
+import os
+sys.path.append("../")
+import eth_cache as sample
+
+
+##################
+# actual testing
+
+def test_0():
+    """Simple test
+    """
+    cache = sample.ResultCache(":memory:", version="a")
+    assert(cache.get({"x": 1}, 0) is None)
+    cache.put({"x": 1}, 0, {"mainchain_rate": 1.0})
+    # testing
+    assert(cache.get({"x": 1}, 0) == {"mainchain_rate": 1.0})
+    assert(cache.get({"x": 1}, 1) is None)
+    assert(cache.get({"x": 2}, 0) is None)
+    stats = cache.stats()
+    assert(stats["hits"] == 1)
+    assert(stats["misses"] == 3)
+    assert(stats["size"] == 1)
+
+
+def test_1():
+    """Entries of another model version are dropped
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "test_result_cache.sqlite")
+    try:
+        cache = sample.ResultCache(path, version="a")
+        cache.put({"x": 1}, 0, {"mainchain_rate": 1.0})
+        cache.close()
+        cache = sample.ResultCache(path, version="a")
+        assert(len(cache) == 1)
+        cache.close()
+        cache = sample.ResultCache(path, version="b")
+        # testing
+        assert(len(cache) == 0)
+        cache.close()
+    finally:
+        os.remove(path)
+
+
+def test_2():
+    """Keys do not depend on the order of the parameters
+    """
+    # testing
+    assert(sample.result_key({"x": 1, "y": 2}, 0, "a")
+           == sample.result_key({"y": 2, "x": 1}, 0, "a"))
+    assert(sample.result_key({"x": 1}, 0, "a")
+           != sample.result_key({"x": 1}, 0, "b"))
+    assert(len(sample.model_version()) == 64)
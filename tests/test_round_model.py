@@ -0,0 +1,101 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import eth_rounds
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """The round engine returns the metrics of the exact engine
+    """
+    net_p2p = nx.cycle_graph(8)
+    params = dict(graph=net_p2p, tau_block=2, tau_attest=1,
+                  delay_share=0.25, delay_time=4)
+    model = sample.Model(**params, seed=1)
+    model.run(100)
+    rounds = eth_rounds.RoundModel(**params, seed=1)
+    rounds.run(100)
+    # testing
+    assert(rounds.results().keys() == model.results().keys())
+
+
+def test_1():
+    """Peers with the same view have the same LMD-GHOST head
+    """
+    net_p2p = nx.path_graph(2)
+    model = eth_rounds.RoundModel(graph=net_p2p, tau_block=1, tau_attest=1,
+                                  validators_per_node=2, seed=1)
+    model.propose_block(0, 0)
+    model.propose_block(0, 0)
+    model.propose_block(1, 0)
+    # block 1 and block 3 are children of genesis, block 2 of block 1
+    assert(model.block_parent[1:4].tolist() == [0, 1, 0])
+    model.views[:, :4] = True
+    model.votes[:, :3] = 3
+    heads = model.fork_choice(np.array([0, 1]))
+    # testing
+    assert(heads.tolist() == [3, 3])
+    model.votes[:, :3] = 2
+    assert(model.fork_choice(np.array([0, 1])).tolist() == [2, 2])
+    # blocks out of the view are not followed
+    model.views[1, 2] = False
+    assert(model.fork_choice(np.array([0, 1])).tolist() == [2, 1])
+
+
+def test_2():
+    """Blocks reach every peer of a connected network
+    """
+    net_p2p = nx.cycle_graph(6)
+    model = eth_rounds.RoundModel(graph=net_p2p, tau_block=1, tau_attest=1,
+                                  seed=1)
+    model.run(120)
+    n_blocks = len(model.blockchain)
+    # testing
+    assert(model.views[:, :n_blocks - 1].all())
+    assert(np.all(np.diff(model.block_created[1:n_blocks]) == 12))
+
+
+def test_3():
+    """Batched fork choice, one view per (replica, peer) pair
+    """
+    net_p2p = nx.path_graph(2)
+    model = eth_rounds.BatchRoundModel(graph=net_p2p, tau_block=1,
+                                       tau_attest=1, validators_per_node=2,
+                                       replicas=2, seed=1)
+    # replica 0: block 1 and block 2 are children of genesis
+    # replica 1: block 2 is a child of block 1
+    model.propose_blocks(np.array([0, 1]), np.array([0, 0]), 0)
+    model.propose_blocks(np.array([0]), np.array([1]), 0)
+    model.propose_blocks(np.array([1]), np.array([0]), 0)
+    assert(model.block_parent[:, 1:3].tolist() == [[0, 0], [0, 1]])
+    model.views[:, :, :3] = True
+    model.votes[:, :, :3] = 2
+    heads = model.fork_choice(np.array([0, 0, 1, 1]), np.array([0, 1, 0, 1]))
+    # testing
+    assert(heads.tolist() == [2, 2, 2, 2])
+    model.votes[0, :, :3] = 1
+    model.views[1, 1, 2] = False
+    heads = model.fork_choice(np.array([0, 0, 1, 1]), np.array([0, 1, 0, 1]))
+    assert(heads.tolist() == [1, 1, 2, 1])
+
+
+def test_4():
+    """Replicas have the distribution of separate round engine runs
+    """
+    net_p2p = nx.cycle_graph(8)
+    params = dict(graph=net_p2p, tau_block=4, tau_attest=2,
+                  delay_share=0.25, delay_time=4)
+    seeds = list(range(24))
+    runs = eth_rounds.RoundModel.run_ensemble(params, seeds, 300)
+    batch = eth_rounds.BatchRoundModel.run_ensemble(params, seeds, 300)
+    # testing
+    assert(batch.keys() == runs.keys())
+    assert(batch["mainchain_rate"]["n"] == 24)
+    for metric in ("mainchain_rate", "blocktree_entropy", "block_coverage_p50"):
+        assert(batch[metric]["ci_low"] <= runs[metric]["ci_high"])
+        assert(runs[metric]["ci_low"] <= batch[metric]["ci_high"])
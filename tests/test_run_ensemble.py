@@ -0,0 +1,53 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """A reset model reproduces a model built from scratch
+    """
+    net_p2p = nx.cycle_graph(8)
+    params = dict(graph=net_p2p, tau_block=2, tau_attest=1,
+                  validators_per_node=2, delay_share=0.25, delay_time=4)
+    model = sample.Model(**params, seed=1)
+    model.run(100)
+    results = model.results()
+
+    model.run_seed(2, 100)
+    # testing
+    assert(model.run_seed(1, 100) == results)
+
+
+def test_1():
+    """Results of an ensemble are aggregated per metric
+    """
+    net_p2p = nx.cycle_graph(8)
+    params = dict(graph=net_p2p, tau_block=2, tau_attest=1)
+    table = sample.Model.run_ensemble(params, seeds=[1, 2, 3],
+                                      stoping_time=60)
+    # testing
+    assert(table["diameter"] == {"mean": 4.0, "std": 0.0, "ci_low": 4.0,
+                                 "ci_high": 4.0, "n": 3})
+    assert(table["delayer_orphan_rate"]["n"] == 0)
+    assert(table["mainchain_rate"]["ci_low"] <= table["mainchain_rate"]["mean"]
+           <= table["mainchain_rate"]["ci_high"])
+
+
+def test_2():
+    """Confidence intervals use the Student t quantile
+    """
+    runs = [{"x": 1.}, {"x": 3.}, {"x": np.nan}]
+    table = sample.aggregate_results(runs, confidence=0.95)
+    # testing
+    assert(table["x"]["n"] == 2)
+    assert(table["x"]["mean"] == 2.)
+    assert(np.isclose(table["x"]["ci_high"] - 2., 12.706205))
+    assert(np.isclose(sample.student_t_quantile(0.95, 2), 4.302653))
+    assert(np.isclose(sample.student_t_quantile(0.99, 5), 4.032143))
+    assert(np.isclose(sample.student_t_quantile(0.95, 1000), 1.962339))
@@ -0,0 +1,43 @@
+"""Module providing Function to change path"""
+import sys
+import pickle
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """CSR adjacency follows the order of the graph nodes
+    """
+    net_p2p = nx.Graph([("a", "b"), ("b", "c")])
+    indptr, indices = sample.Network.graph_to_csr(net_p2p)
+    # testing
+    assert(indptr.tolist() == [0, 1, 3, 4])
+    assert(indices.tolist() == [1, 0, 2, 1])
+
+
+def test_1():
+    """A model attached to a shared topology runs as on the graph
+    """
+    net_p2p = nx.random_regular_graph(3, 10, seed=1)
+    topology = sample.SharedTopology.from_graph(net_p2p)
+    attached = pickle.loads(pickle.dumps(topology))
+    assert(np.array_equal(attached.indices, topology.indices))
+
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=1, seed=1)
+    model.run(100)
+    shared_model = sample.Model(graph=attached, tau_block=2, tau_attest=1,
+                                seed=1)
+    shared_model.run(100)
+    # testing
+    assert(shared_model.results() == model.results())
+    assert({n.id for n in shared_model.nodes[0].neighbors}
+           == set(net_p2p.neighbors(0)))
+
+    del shared_model
+    attached.close()
+    topology.unlink()
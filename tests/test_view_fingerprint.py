@@ -0,0 +1,69 @@
+"""Module providing Function to change path"""
+import sys
+import numpy as np
+sys.path.append("../")
+import eth_base as sample
+import networkx as nx
+
+
+##################
+# actual testing
+
+def test_0():
+    """Incremental fingerprints match the ones computed from scratch
+    """
+    net_p2p = nx.cycle_graph(8)
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=1,
+                         validators_per_node=3, seed=1)
+    model.run(100)
+
+    n_blocks = len(model.blockchain)
+    offset = model.block_offset
+    for node in model.nodes:
+        fingerprint = np.bitwise_xor.reduce(
+            model.block_keys[offset:n_blocks][model.views[:n_blocks - offset, node.id]])
+        fingerprint ^= np.bitwise_xor.reduce(
+            model.validator_keys*model.block_keys[node.attestation_block])
+        # testing
+        assert(fingerprint == model.fingerprints[node.id])
+
+
+def test_1():
+    """Fingerprints stay consistent when views are pruned
+    """
+    net_p2p = nx.cycle_graph(8)
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=1,
+                         finality="depth", finality_depth=2, seed=1)
+    model.run(200)
+
+    n_blocks = len(model.blockchain)
+    offset = model.block_offset
+    assert(offset > 0)
+    for node in model.nodes:
+        fingerprint = np.bitwise_xor.reduce(
+            model.block_keys[offset:n_blocks][model.views[:n_blocks - offset, node.id]])
+        fingerprint ^= np.bitwise_xor.reduce(
+            model.validator_keys*model.block_keys[node.attestation_block])
+        # testing
+        assert(fingerprint == model.fingerprints[node.id])
+
+
+def test_2():
+    """Peers with the same latest messages table share its row, one row
+    per distinct table
+    """
+    net_p2p = nx.cycle_graph(8)
+    model = sample.Model(graph=net_p2p, tau_block=2, tau_attest=1,
+                         validators_per_node=3, seed=1)
+    model.run(101)
+    tables = np.concatenate((model.attestation_blocks,
+                             model.attestation_slots), axis=1)
+    validators = np.arange(len(model.validators))
+    # testing
+    assert(len(model.hash_row) == len(np.unique(tables, axis=0)))
+    for i in range(model.N):
+        row = model.table_row[i]
+        assert(model.row_peers[row] == np.count_nonzero(model.table_row == row))
+        assert(model.row_hash[row] == model.entries_key(
+            validators, model.table_blocks[row], model.table_slots[row]))
+    assert(model.attestations_agree() == (len(np.unique(tables, axis=0)) == 1))
@@ -1,150 +1,94 @@
-import itertools
 import networkx as nx
-import matplotlib.pyplot as plt
 import numpy as np
 
-
-def blockchain_layout(G, relative = False):
-    F = G.reverse()
-    position = layout_algorithm(F)
-    position = inverse_position_dict(position)
-    
-    if relative:
-        max_x= max([v[0] for v in position.values()])
-        max_y= max([v[1] for v in position.values()])
-        if max_y==0:
-            max_y=1
-
-
-
-        for k,v in position.items():
-            position[k]=(v[0]/max_x,v[1]/max_y)
-
-    return position
-
-def blockchain_layout_slot(G, relative = False):
-    F = G.reverse()
-    
-    position = slot_algorithm(F)
-    position = inverse_position_dict(position)
-    
+from eth_base import BlockTree, blockchain_to_tree
+
+
+def blockchain_layout(tree, relative = False):
+    """Positions of the blocks for plotting:
+    x is the height of the block, y the lane of its branch.
+    The longest chain lies on lane 0, every other branch, longest first,
+    on the first lane above the ones used over its span.
+    INPUT:
+    - tree,         BlockTree object, or networkx.DiGraph of the blocks
+                    as built by blockchain_to_digraph (earlier versions
+                    only took the DiGraph)
+    - relative,     bool, scale both coordinates to [0, 1]
+    OUTPUT:
+    - position,     dict {Block: np.array([x, y])}
+    """
+    tree = as_tree(tree)
+    return _position(tree, tree.height, relative)
+
+
+def blockchain_layout_slot(tree, relative = False):
+    """Same as blockchain_layout, but x is the slot of the block.
+    Earlier versions used the block id as x: blocks are now placed by
+    the slot they were proposed in, so empty slots leave gaps.
+    """
+    tree = as_tree(tree)
+    return _position(tree, tree.slot, relative)
+
+
+def as_tree(tree):
+    """BlockTree of a BlockTree or of a networkx.DiGraph of the blocks."""
+    if isinstance(tree, BlockTree):
+        return tree
+    if isinstance(tree, nx.DiGraph):
+        return blockchain_to_tree([b for b in tree.nodes() if b is not None])
+    raise TypeError("expected a BlockTree or a networkx.DiGraph of the blocks")
+
+
+def _position(tree, column, relative):
+    lane = branch_lanes(tree, column)
+    x = column.astype(np.float64)
+    y = lane.astype(np.float64)
     if relative:
-        max_x= max([v[0] for v in position.values()])
-        max_y= max([v[1] for v in position.values()])
-        if max_y==0:
-            max_y=1
-
-        for k,v in position.items():
-            position[k]=(v[0]/max_x,v[1]/max_y)
-
-    return position
-    
-def inverse_position_dict(pos):
-    inv = {}
-    for x, ys in pos.items():
-        for y, block in ys.items():
-            inv[block] = np.array([x,y])
-    return inv
-
-def layout_algorithm(G, pos = {}, K=None, inv={}):
-    if not K:   
-        K=G.copy()
-    if len(G)==0:
-        return pos
-
-    all_paths=[]
-    if len(G.edges()) != 0:
-        #could only check the leaves
-        for n in G.nodes():
-            for m in G.nodes():
-                if n == m:
-                    continue
-                else:
-                    for path in nx.all_simple_paths(G,n,m):
-                        all_paths.append(path)
-
-        all_paths.sort(key=len,reverse=True)
-
-        x=0
-        y=0
-        for i,n in enumerate(all_paths[0]):
-            if i==0 and K.in_degree(n) != 0:
-                for p in K.predecessors(n):
-                    if p in inv.keys():
-                        x+=inv[p][0]+1   
-                y = max([max(list(pos[x+j].keys())) for j in range(len(all_paths[0]))])+1 
-                pos[x][y]=n 
-
-            elif x in pos.keys():
-                pos[x][y]=n
-
-            else:
-                pos[x]={0:n}
-
-            x+=1
-
-    else:
-        for n in G.nodes():
-            for p in K.predecessors(n):
-                x = inv[p][0]+1
-                y = max(pos[x].keys())+1
-                pos[x][y] = n
-
-    inv = inverse_position_dict(pos)   
-    H = G.copy()
-    H.remove_nodes_from(list(inv.keys()))
-    pos = layout_algorithm(H, pos=pos,K=K,inv=inv)
-    
-    return pos
-
-def slot_algorithm(G, pos = {}, K=None, inv={}):
-    if not K:   
-        K=G.copy()
-    if len(G)==0:
-        return pos
-
-    all_paths=[]
-
-    if len(G.edges()) != 0:
-        #could only check the leaves
-        for n in G.nodes():
-            for m in G.nodes():
-                if n == m:
-                    continue
-                else:
-                    for path in nx.all_simple_paths(G,n,m):
-                        all_paths.append(path)
-
-        all_paths.sort(key=len,reverse=True)
-        y=0
-        for i,n in enumerate(all_paths[0]):
-            x=n.id
-            if i==0 and K.in_degree(n) != 0:
-                for j in all_paths[0]:
-                    if j.id in pos.keys():
-                        max_y = max(list(pos[j.id].keys()))
-                        if max_y > y:
-                            y = max_y
-                pos[x]={y:n} 
-            else:
-                pos[x]={y:n}
-
-            x+=1
-
-    else:
-        for n in G.nodes():
-            for p in K.predecessors(n):
-                x = n.id
-                y = -1
-                pos[x]={y:n}
-
-    inv = inverse_position_dict(pos)   
-    H = G.copy()
-    H.remove_nodes_from(list(inv.keys()))
-    pos = slot_algorithm(H, pos=pos,K=K,inv=inv)
-    
-    return pos
-
-    
-
-
+        max_x = x.max() if x.max() > 0 else 1
+        max_y = y.max() if y.max() > 0 else 1
+        x = x/max_x
+        y = y/max_y
+    return {block: np.array([x[i], y[i]]) for i, block in enumerate(tree.blocks)}
+
+
+def branch_lanes(tree, column):
+    """Assign the branches of a BlockTree to lanes.
+    A branch starts at a root or at a block which is not the child with
+    the longest descent of its parent, and follows such children down to
+    a leaf.
+    INPUT:
+    - tree,     BlockTree object
+    - column,   array, x coordinate of each block
+    OUTPUT:
+    - lane,     array, lane of each block
+    """
+    n = len(tree)
+    parent = tree.parent
+    # reach[i]: number of blocks on the longest descent from block i
+    reach = np.ones(n, dtype=np.int64)
+    for i in range(n - 1, -1, -1):
+        if parent[i] >= 0 and reach[i] + 1 > reach[parent[i]]:
+            reach[parent[i]] = reach[i] + 1
+    # heavy[i]: child of block i with the longest descent
+    heavy = np.full(n, -1, dtype=np.int64)
+    for i in range(n):
+        p = parent[i]
+        if p >= 0 and (heavy[p] < 0 or reach[i] > reach[heavy[p]]):
+            heavy[p] = i
+    is_heavy = np.zeros(n, dtype=bool)
+    is_heavy[heavy[heavy >= 0]] = True
+    starts = np.flatnonzero(~is_heavy)
+    starts = starts[np.argsort(-reach[starts], kind="stable")]
+
+    lane = np.zeros(n, dtype=np.int64)
+    column_start = column.min() if n > 0 else 0
+    top = np.full(int(column.max() - column_start) + 1 if n > 0 else 0, -1)
+    for start in starts:
+        branch = [start]
+        while heavy[branch[-1]] >= 0:
+            branch.append(heavy[branch[-1]])
+        span = slice(column[branch].min() - column_start,
+                     column[branch].max() - column_start + 1)
+        lane[branch] = top[span].max() + 1
+        top[span] = lane[branch[0]]
+    return lane